@@ -0,0 +1,251 @@
+"""Load test of API endpoints: requests per second and p50/p95/p99 latency per scenario.
+
+By default the app runs in-process behind ASGI transport, Postgres is replaced with SQLite
+and Redis with fakeredis, so only the app code is measured. With --target requests go
+to a running server, which must have its own database and Redis.
+
+Results are saved to JSON, a previous result may be passed to --compare to print the difference.
+
+Run from repository root: PYTHONPATH=src python benchmarks/api_load.py
+Against a server: PYTHONPATH=src python benchmarks/api_load.py --target http://127.0.0.1:8000
+"""
+import argparse
+import asyncio
+import json
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable, Iterator
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+import fakeredis
+import httpx
+from database import DBModel, env_settings, get_aioredis, get_async_session, get_async_sessionmaker
+from fastapi import FastAPI
+from main import create_app
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+
+RESULTS_DIR = Path(__file__).parent / "results"
+UPLOAD_SIZE = 64 * 1024
+REDIS_BATCH_SIZE = 100
+
+
+@dataclass
+class Scenario:
+    name: str
+    send: Callable[[httpx.AsyncClient, int], Awaitable[httpx.Response]]
+    expected_status: int = 200
+    setup: Callable[[httpx.AsyncClient], Awaitable[None]] | None = None
+
+
+# данные, созданные в setup сценариев, например id тотема для обновления
+state: dict[str, Any] = {}
+
+
+async def create_bench_totem(client: httpx.AsyncClient) -> None:
+    response = await client.post("/totems/", json={"name": "Bench", "description": "Bench totem", "price": 10})
+    response.raise_for_status()
+    state["totem_id"] = response.json()["totem"]["id"]
+
+
+async def create_bench_items(client: httpx.AsyncClient) -> None:
+    items = [{"name": f"Bench{number}", "price": number + 1} for number in range(REDIS_BATCH_SIZE)]
+    (await client.post("/items/redis_items/", json=items)).raise_for_status()
+
+
+SCENARIOS = [
+    Scenario("hello", lambda client, _: client.get("/hello/Vasya")),
+    # отказ в NameFormatMiddleware, до роутинга
+    Scenario("hello_rejected", lambda client, _: client.get("/hello/V"), expected_status=400),
+    Scenario("calc_add", lambda client, number: client.post("/calc/add/", json={"var1": number, "var2": 2})),
+    Scenario("calc_path", lambda client, number: client.get(f"/calc3/add/{number % 1000} 5")),
+    Scenario(
+        "totem_create",
+        lambda client, number: client.post("/totems/", json={"name": f"Totem {number}", "price": number + 0.5}),
+        expected_status=201,
+    ),
+    Scenario("totem_get", lambda client, _: client.get("/totems/Bench"), setup=create_bench_totem),
+    Scenario(
+        "totem_update",
+        lambda client, number: client.put(
+            f"/totems/{state['totem_id']}", json={"name": "Bench", "description": "Updated", "price": number + 1},
+        ),
+        setup=create_bench_totem,
+    ),
+    Scenario(
+        "redis_item_create",
+        lambda client, number: client.post("/items/create_redis_item/", json={"name": f"item{number}", "price": 1}),
+    ),
+    Scenario("redis_item_get", lambda client, _: client.get("/items/get_redis_item/Bench1"), setup=create_bench_items),
+    Scenario(
+        "redis_items_batch_get",
+        lambda client, _: client.post(
+            "/items/redis_items/get/", json=[f"Bench{number}" for number in range(REDIS_BATCH_SIZE)],
+        ),
+        setup=create_bench_items,
+    ),
+    Scenario(
+        "upload",
+        lambda client, number: client.post("/files/", files={"files": (f"{number}.bin", b"x" * UPLOAD_SIZE)}),
+    ),
+]
+
+
+@asynccontextmanager
+async def in_process_app() -> AsyncIterator[FastAPI]:
+    """App with SQLite instead of Postgres, fakeredis instead of Redis and uploads in temporary directory."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        engine = create_async_engine(f"sqlite+aiosqlite:///{temp_dir}/bench.sqlite3")
+        async with engine.begin() as connection:
+            await connection.run_sync(DBModel.metadata.create_all)
+        session_maker = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+        redis = fakeredis.FakeAsyncRedis()
+
+        async def get_session() -> AsyncIterator[AsyncSession]:
+            async with session_maker() as session:
+                yield session
+
+        env_settings.UPLOADS.DIR = Path(temp_dir) / "uploads"
+        app = create_app(False)
+        app.dependency_overrides[get_async_session] = get_session
+        app.dependency_overrides[get_async_sessionmaker] = lambda: session_maker
+        app.dependency_overrides[get_aioredis] = lambda: redis
+        try:
+            yield app
+        finally:
+            await redis.aclose()
+            await engine.dispose()
+
+
+def percentile(sorted_values: list[float], percent: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * percent / 100))]
+
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    scenario: Scenario,
+    requests: int,
+    concurrency: int,
+    warmup: int,
+) -> dict[str, Any]:
+    if scenario.setup is not None:
+        await scenario.setup(client)
+    latencies: list[float] = []
+    errors = 0
+
+    async def worker(numbers: Iterator[int], measured: bool) -> None:
+        # номера запросов берутся из общего итератора, поэтому всего отправляется ровно столько запросов
+        nonlocal errors
+        for number in numbers:
+            start = time.perf_counter()
+            response = await scenario.send(client, number)
+            if measured:
+                latencies.append(time.perf_counter() - start)
+                errors += response.status_code != scenario.expected_status
+
+    # первые запросы прогревают кэши и пулы и в результат не входят
+    warmup_numbers = iter(range(warmup))
+    await asyncio.gather(*(worker(warmup_numbers, measured=False) for _ in range(concurrency)))
+    numbers = iter(range(warmup, warmup + requests))
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(numbers, measured=True) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 3),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_comparison(results: dict[str, Any], previous: dict[str, Any]) -> None:
+    print(f"Compared with {previous['started']} ({previous['revision']}, {previous['target']}):")
+    for name, result in results["scenarios"].items():
+        old = previous["scenarios"].get(name)
+        if old is None:
+            continue
+        print(
+            f"  {name:>22}: rps {(result['rps'] / old['rps'] - 1) * 100:+6.1f}%, "
+            f"p95 {(result['p95_ms'] / old['p95_ms'] - 1) * 100:+6.1f}%, "
+            f"p99 {(result['p99_ms'] / old['p99_ms'] - 1) * 100:+6.1f}%",
+        )
+
+
+@asynccontextmanager
+async def bench_client(target: str | None, concurrency: int) -> AsyncIterator[httpx.AsyncClient]:
+    """Client of running server at target, or of in-process app if target is not given."""
+    if target:
+        limits = httpx.Limits(max_connections=concurrency)
+        async with httpx.AsyncClient(base_url=target, limits=limits, timeout=30) as client:
+            yield client
+        return
+    async with in_process_app() as app:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+            yield client
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", help="URL of running server, by default the app runs in-process")
+    parser.add_argument("--requests", type=int, default=2000, help="measured requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=100, help="requests per scenario before measuring")
+    parser.add_argument("--scenario", action="append", choices=[scenario.name for scenario in SCENARIOS],
+                        help="run only these scenarios, may be repeated")
+    parser.add_argument("--output", type=Path, help=f"JSON file for results, by default in {RESULTS_DIR}")
+    parser.add_argument("--compare", type=Path, help="JSON file of previous run to compare with")
+    args = parser.parse_args()
+
+    started = datetime.now(timezone.utc)
+    results: dict[str, Any] = {
+        "started": started.isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "target": args.target or "in-process",
+        "python": platform.python_version(),
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "scenarios": {},
+    }
+    scenarios = [scenario for scenario in SCENARIOS if not args.scenario or scenario.name in args.scenario]
+    print(f"{results['target']}, {args.requests} requests per scenario, concurrency {args.concurrency}")
+
+    async with bench_client(args.target, args.concurrency) as client:
+        for scenario in scenarios:
+            result = await run_scenario(client, scenario, args.requests, args.concurrency, args.warmup)
+            results["scenarios"][scenario.name] = result
+            print(
+                f"  {scenario.name:>22}: {result['rps']:8.1f} req/s, p50 {result['p50_ms']:7.2f} ms, "
+                f"p95 {result['p95_ms']:7.2f} ms, p99 {result['p99_ms']:7.2f} ms, errors {result['errors']}",
+            )
+
+    output = args.output or RESULTS_DIR / f"api_load-{started:%Y%m%dT%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2))
+    print(f"Results saved to {output}")
+    if args.compare:
+        print_comparison(results, json.loads(args.compare.read_text()))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,63 @@
+"""Pairs of numbers per second: a request per pair to /calc/add/ against /calc/batch/add with JSON and binary arrays.
+
+Run from repository root: PYTHONPATH=src python benchmarks/calc_batch_throughput.py
+"""
+import argparse
+import asyncio
+import time
+from collections.abc import Awaitable, Callable
+
+import httpx
+import numpy as np
+from fastapi import FastAPI
+from main import create_app
+
+
+async def measure(send: Callable[[], Awaitable[None]], pairs_per_request: int, requests: int) -> float:
+    for _ in range(3):  # прогрев
+        await send()
+    start = time.perf_counter()
+    for _ in range(requests):
+        await send()
+    return requests * pairs_per_request / (time.perf_counter() - start)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size", type=int, default=100_000, help="number of pairs in batch request")
+    parser.add_argument("--requests", type=int, default=20, help="batch requests per case")
+    parser.add_argument("--single-requests", type=int, default=2000, help="requests to /calc/add/")
+    args = parser.parse_args()
+
+    a = np.random.default_rng(0).random(args.size)
+    b = np.random.default_rng(1).random(args.size)
+    json_body = {"a": a.tolist(), "b": b.tolist()}
+    binary_body = a.astype("<f8").tobytes() + b.astype("<f8").tobytes()
+    app: FastAPI = create_app(False)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        async def send_single() -> None:
+            response = await client.post("/calc/add/", json={"var1": 1, "var2": 2})
+            assert response.status_code == 200, response.text
+
+        async def send_json() -> None:
+            response = await client.post("/calc/batch/add", json=json_body)
+            assert response.status_code == 200, response.text
+
+        async def send_binary() -> None:
+            response = await client.post(
+                "/calc/batch/add", content=binary_body, headers={"Content-Type": "application/octet-stream"},
+            )
+            assert response.status_code == 200, response.text
+
+        results = {
+            "POST /calc/add/ (pair per request)": await measure(send_single, 1, args.single_requests),
+            "POST /calc/batch/add (JSON)": await measure(send_json, args.size, args.requests),
+            "POST /calc/batch/add (float64)": await measure(send_binary, args.size, args.requests),
+        }
+    print(f"{args.size} pairs per batch request")
+    for name, pairs_per_second in results.items():
+        print(f"  {name:>36}: {pairs_per_second:14,.0f} pairs/s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,90 @@
+"""Throughput of large list endpoints with default JSONResponse against ORJSONResponse.
+
+Run from repository root: PYTHONPATH=src python benchmarks/json_responses.py
+"""
+import argparse
+import asyncio
+import time
+from typing import Any
+
+import httpx
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, ORJSONResponse
+from responses import orjson
+
+from views import totem_views
+from views.item_views import router as item_router
+from views.totem_views import router as totem_router
+
+
+RESPONSE_CLASSES = {"json": JSONResponse, "orjson": ORJSONResponse}
+
+
+def build_app(response_class: type[JSONResponse]) -> FastAPI:
+    app = FastAPI(default_response_class=response_class)
+    app.include_router(item_router, prefix="/items")
+    app.include_router(totem_router)
+    return app
+
+
+def make_offer(size: int) -> dict[str, Any]:
+    return {
+        "name": "Big offer",
+        "price": 0,
+        "items": [
+            {
+                "name": f"Item {number}",
+                "description": "Good item",
+                "price": number + 0.5,
+                "tax": 1.5,
+                "tags": ["tag1", "tag2"],
+                "image": [{"url": f"http://example.com/{number}.png", "name": f"Image {number}"}],
+            }
+            for number in range(size)
+        ],
+    }
+
+
+async def measure(app: FastAPI, method: str, path: str, body: Any, requests: int) -> float:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def send() -> None:
+            response = await client.request(method, path, json=body)
+            assert response.status_code == 200, response.text
+
+        for _ in range(10):  # прогрев
+            await send()
+        start = time.perf_counter()
+        for _ in range(requests):
+            await send()
+        return requests / (time.perf_counter() - start)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size", type=int, default=1000, help="number of objects in response")
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    totem_views.new_totems[:] = [
+        {"name": f"Totem {number}", "description": "The bartenders totem", "price": number + 0.2, "tax": 10.5}
+        for number in range(args.size)
+    ]
+    cases = {
+        "GET /new-totems/ (read_totems)": ("GET", "/new-totems/", None),
+        "POST /items/offers/ (create_offer)": ("POST", "/items/offers/", make_offer(args.size)),
+    }
+    print(f"{args.size} objects per response, {args.requests} requests, orjson installed: {orjson is not None}")
+    for name, (method, path, body) in cases.items():
+        results = {
+            class_name: await measure(build_app(response_class), method, path, body, args.requests)
+            for class_name, response_class in RESPONSE_CLASSES.items()
+        }
+        print(
+            f"  {name}: " + ", ".join(f"{class_name} {rps:6.0f} req/s" for class_name, rps in results.items())
+            + f", x{results['orjson'] / results['json']:.2f}",
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,71 @@
+"""Records per second formatted by LocalTimeFormatter: per-record time rendering against cached per second.
+
+Run from repository root: PYTHONPATH=src python benchmarks/log_time_formatter.py
+"""
+import argparse
+import logging
+import time
+from datetime import datetime, timezone
+from logging import LogRecord
+from zoneinfo import ZoneInfo
+
+from time_formatter import LocalTimeFormatter
+
+
+FORMAT = "%(asctime)s %(levelname)s %(message)s"
+DATEFMT = "%Y-%m-%d %H:%M:%S %Z"
+TZ_NAME = "Europe/Moscow"
+
+
+# прежняя реализация: перевод в местное время и strftime на каждую запись (pytz заменен на zoneinfo)
+class LegacyLocalTimeFormatter(logging.Formatter):
+    def __init__(self, fmt: str | None = None, datefmt: str | None = None, tz_name: str = 'UTC') -> None:
+        super().__init__(fmt=fmt, datefmt=datefmt)
+        self.local_tz = ZoneInfo(tz_name)
+
+    def formatTime(self, record: LogRecord, datefmt: str | None = None) -> str:  # noqa N802
+        utc_dt = datetime.fromtimestamp(record.created, tz=timezone.utc)
+        local_dt = utc_dt.astimezone(self.local_tz)
+        return local_dt.strftime(datefmt or "%Y-%m-%d %H:%M:%S %Z%z")
+
+
+def make_records(count: int, per_second: int) -> list[LogRecord]:
+    start = time.time()
+    records = []
+    for number in range(count):
+        record = LogRecord("bench", logging.INFO, __file__, 0, "Key '%s' has been deleted.", (number,), None)
+        record.created = start + number / per_second
+        record.msecs = (record.created - int(record.created)) * 1000
+        records.append(record)
+    return records
+
+
+def measure(formatter: logging.Formatter, records: list[LogRecord], rounds: int) -> float:
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for record in records:
+            formatter.format(record)
+        best = min(best, time.perf_counter() - start)
+    return len(records) / best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=100_000)
+    parser.add_argument("--per-second", type=int, default=1000, help="log records within one second of time")
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    records = make_records(args.records, args.per_second)
+    formatters = {
+        "legacy": LegacyLocalTimeFormatter(FORMAT, DATEFMT, TZ_NAME),
+        "cached": LocalTimeFormatter(FORMAT, DATEFMT, TZ_NAME),
+        "cached+msecs": LocalTimeFormatter(FORMAT, DATEFMT.replace("%S", "%S.{msecs}"), TZ_NAME),
+    }
+    for name, formatter in formatters.items():
+        print(f"{name:>14}: {measure(formatter, records, args.rounds):>12,.0f} records/s")
+
+
+if __name__ == "__main__":
+    main()
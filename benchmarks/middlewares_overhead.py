@@ -0,0 +1,134 @@
+"""Per-request overhead of the middleware stack: BaseHTTPMiddleware version against pure ASGI one.
+
+Run from repository root: PYTHONPATH=src python benchmarks/middlewares_overhead.py
+"""
+import argparse
+import asyncio
+import re
+import statistics
+import time
+from typing import Callable
+
+import httpx
+from fastapi import FastAPI, Request, Response
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from middlewares import CustomMiddleware, NameFormatMiddleware, ProcessTimeHeaderMiddleware
+from starlette.middleware import Middleware
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import JSONResponse
+
+
+CORS_OPTIONS = {
+    "allow_origins": ["http://example.com"],
+    "allow_credentials": True,
+    "allow_methods": ["POST"],
+    "allow_headers": ["*"],
+}
+
+
+# прежняя реализация мидлварей, для сравнения
+async def legacy_check_name_format(request: Request, call_next: Callable) -> Response:
+    path_parts = request.scope["path"].split("/")
+    if path_parts[-2] == "hello":
+        if not re.match("^[a-zA-Zа-яА-Я]{2,30}$", path_parts[-1]):
+            return JSONResponse(
+                status_code=400,
+                content={"detail": "Name must be in regex ^[a-zA-Zа-яА-Я]{2,30}$"},
+            )
+    return await call_next(request)
+
+
+async def legacy_add_process_time_header(request: Request, call_next: Callable) -> Response:
+    start_time = time.perf_counter()
+    response = await call_next(request)
+    response.headers["X-Process-Time"] = str(time.perf_counter() - start_time)
+    response.headers["X-Root-Path"] = request.scope.get("root_path")
+    return response
+
+
+class LegacyCustomMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next: Callable) -> Response:
+        return await call_next(request)
+
+
+STACKS = {
+    "none": [],
+    "base_http": [
+        Middleware(LegacyCustomMiddleware),
+        Middleware(BaseHTTPMiddleware, dispatch=legacy_add_process_time_header),
+        Middleware(CORSMiddleware, **CORS_OPTIONS),
+        Middleware(BaseHTTPMiddleware, dispatch=legacy_check_name_format),
+    ],
+    "pure_asgi": [
+        Middleware(CustomMiddleware),
+        Middleware(ProcessTimeHeaderMiddleware),
+        Middleware(CORSMiddleware, **CORS_OPTIONS),
+        Middleware(NameFormatMiddleware),
+    ],
+}
+
+
+def build_app(middleware: list[Middleware]) -> FastAPI:
+    app = FastAPI(middleware=middleware)
+
+    @app.get("/hello/{name}")
+    async def hello(name: str) -> dict[str, str]:
+        return {"message": f"Hello, {name.title()}"}
+
+    @app.get("/stream")
+    async def stream() -> StreamingResponse:
+        async def chunks():  # type: ignore[no-untyped-def]
+            for _ in range(100):
+                yield b"x" * 1024
+        return StreamingResponse(chunks())
+
+    return app
+
+
+async def measure(app: FastAPI, path: str, requests: int, concurrency: int) -> tuple[float, float]:
+    """Return median latency of sequential requests and throughput under concurrent load."""
+    latencies: list[float] = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def worker(count: int) -> None:
+            for _ in range(count):
+                start = time.perf_counter()
+                response = await client.get(path)
+                latencies.append(time.perf_counter() - start)
+                assert response.status_code == 200, response.text
+
+        await worker(100)  # прогрев
+        latencies.clear()
+        await worker(requests // 10)
+        median_latency = statistics.median(latencies)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(requests // concurrency) for _ in range(concurrency)))
+        throughput = requests // concurrency * concurrency / (time.perf_counter() - start)
+    return median_latency, throughput
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    for path in ("/hello/Vasya", "/stream"):
+        print(f"{path}, {args.requests} requests, concurrency {args.concurrency}")
+        await measure(build_app([]), path, args.requests, args.concurrency)  # прогрев интерпретатора и httpx
+        results = {
+            name: await measure(build_app(middleware), path, args.requests, args.concurrency)
+            for name, middleware in STACKS.items()
+        }
+        baseline = results["none"][0]
+        for name, (median_latency, throughput) in results.items():
+            print(
+                f"  {name:>10}: median {median_latency * 1e6:8.1f} us, "
+                f"overhead {(median_latency - baseline) * 1e6:8.1f} us/request, {throughput:8.0f} req/s under load",
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
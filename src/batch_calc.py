@@ -0,0 +1,135 @@
+import asyncio
+import json
+import math
+from collections.abc import Callable
+from enum import Enum
+from typing import Any, TypeVar
+
+import numpy as np
+from fastapi import Request
+from responses import dumps, orjson
+
+
+THREAD_MIN_BODY_SIZE = 64 * 1024
+
+T = TypeVar("T")
+
+
+class BatchOperation(str, Enum):
+    add = "add"
+    sub = "sub"
+    mul = "mul"
+    div = "div"
+    min = "min"  # noqa A003
+    max = "max"  # noqa A003
+
+
+class BinaryDtype(str, Enum):
+    float64 = "float64"
+    float32 = "float32"
+    int64 = "int64"
+    int32 = "int32"
+
+
+UFUNCS = {
+    BatchOperation.add: np.add,
+    BatchOperation.sub: np.subtract,
+    BatchOperation.mul: np.multiply,
+    BatchOperation.div: np.true_divide,
+    BatchOperation.min: np.minimum,
+    BatchOperation.max: np.maximum,
+}
+
+
+class BatchCalcError(ValueError):
+    status_code = 400
+
+
+class BatchTooLargeError(BatchCalcError):
+    status_code = 413
+
+
+async def read_body(request: Request, max_size: int) -> bytearray:
+    """Read body up to max_size bytes, larger body is rejected without reading it to the end."""
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > max_size:
+        raise BatchTooLargeError(f"Body is larger than {max_size} bytes")
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > max_size:
+            raise BatchTooLargeError(f"Body is larger than {max_size} bytes")
+    return body
+
+
+async def run_calc(func: Callable[..., T], body: bytearray, *args: Any) -> T:
+    if len(body) < THREAD_MIN_BODY_SIZE:
+        return func(body, *args)
+    # большие массивы разбираются и считаются в потоке, numpy и json при этом не держат цикл событий
+    return await asyncio.to_thread(func, body, *args)
+
+
+def apply(operation: BatchOperation, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    # деление на ноль дает inf и nan, как в IEEE 754, а целые переполняются по модулю, как в numpy
+    with np.errstate(all="ignore"):
+        return UFUNCS[operation](a, b)
+
+
+def check_length(length: int, max_length: int) -> None:
+    if length > max_length:
+        raise BatchTooLargeError(f"Arrays are longer than {max_length} elements")
+
+
+def calc_binary(body: bytearray, operation: BatchOperation, dtype: BinaryDtype, max_length: int) -> tuple[bytes, str]:
+    """Apply operation to arrays a and b of little-endian dtype, concatenated in body.
+
+    Return little-endian result and its dtype, e.g. division of integers gives float64.
+    """
+    item_type = np.dtype(dtype.value).newbyteorder("<")
+    if len(body) % (2 * item_type.itemsize):
+        raise BatchCalcError(f"Body must contain two {dtype.value} arrays of equal length")
+    # массивы - представления тела запроса, без копирования
+    a, b = np.frombuffer(body, dtype=item_type).reshape(2, -1)
+    check_length(len(a), max_length)
+    result = apply(operation, a, b)
+    return result.astype(result.dtype.newbyteorder("<"), copy=False).tobytes(), result.dtype.name
+
+
+def to_array(values: Any, name: str) -> np.ndarray:
+    if not isinstance(values, list):
+        raise BatchCalcError(f"{name} must be a list of numbers")
+    try:
+        array = np.asarray(values)
+    except ValueError:
+        raise BatchCalcError(f"{name} must be a list of numbers") from None
+    # bool, строки и вложенные списки отклоняются, как и целые больше int64 у json (orjson читает их как float)
+    if array.ndim != 1 or array.dtype.kind not in "iuf":
+        raise BatchCalcError(f"{name} must be a list of numbers")
+    return array
+
+
+def parse_json_arrays(body: bytearray, max_length: int) -> tuple[np.ndarray, np.ndarray]:
+    try:
+        data = orjson.loads(body) if orjson is not None else json.loads(body)
+    except ValueError as error:  # orjson.JSONDecodeError тоже наследует ValueError
+        raise BatchCalcError(f"Invalid JSON: {error}") from None
+    if not isinstance(data, dict):
+        raise BatchCalcError("Body must be JSON object with lists a and b")
+    a, b = to_array(data.get("a"), "a"), to_array(data.get("b"), "b")
+    if len(a) != len(b):
+        raise BatchCalcError("Lists a and b must have equal length")
+    check_length(len(a), max_length)
+    return a, b
+
+
+def calc_json(body: bytearray, operation: BatchOperation, max_length: int) -> bytes:
+    """Apply operation to lists a and b of JSON object, return JSON object with result list.
+
+    Infinity and NaN, e.g. from division by zero, are returned as null.
+    """
+    a, b = parse_json_arrays(body, max_length)
+    result = apply(operation, a, b)
+    values = result.tolist()
+    if result.dtype.kind == "f" and not np.isfinite(result).all():
+        values = [value if math.isfinite(value) else None for value in values]
+    return dumps({"result": values})
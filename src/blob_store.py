@@ -0,0 +1,92 @@
+import asyncio
+import os
+import re
+from pathlib import Path
+
+from redis import asyncio as aioredis
+from uploads import StoredFile, remove_file
+
+
+SHA256_PATTERN = re.compile("^[0-9a-f]{64}$")
+LOCK_TIMEOUT = 10
+
+
+def parse_content_hashes(header: str) -> list[tuple[str, str]]:
+    """Parse X-Content-SHA256 header of `field=sha256` pairs separated by commas."""
+    hashes = []
+    for item in filter(None, (item.strip() for item in header.split(","))):
+        field_name, _, sha256 = item.partition("=")
+        sha256 = sha256.strip().lower()
+        if not field_name or not SHA256_PATTERN.match(sha256):
+            raise ValueError(f"Invalid X-Content-SHA256 item {item!r}, expected field=sha256")
+        hashes.append((field_name.strip(), sha256))
+    return hashes
+
+
+def place_blob(temp_path: Path, blob_path: Path) -> bool:
+    """Move uploaded file to blob path, return True if the same content was already stored."""
+    if blob_path.exists():
+        remove_file(temp_path)
+        return True
+    blob_path.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(temp_path, blob_path)
+    return False
+
+
+class BlobStore:
+    """Files stored under their sha256, the same content is kept on disk once.
+
+    Number of references to each blob and its size are kept in Redis. Changes of one blob
+    are serialized with Redis lock, so blob is not removed while another request references it.
+    """
+
+    def __init__(self, directory: Path) -> None:
+        self.directory = directory
+
+    def blob_path(self, sha256: str) -> Path:
+        # два уровня подкаталогов, чтобы в одном каталоге не оказались миллионы файлов
+        path = self.directory / sha256[:2] / sha256[2:4] / sha256
+        # пустой хэш дал бы путь к самому каталогу хранилища
+        assert path.parent.parent.parent == self.directory, f"Invalid sha256 {sha256!r}"
+        return path
+
+    @staticmethod
+    def index_key(sha256: str) -> str:
+        return f"blobs:{sha256}"
+
+    def lock(self, redis: aioredis.Redis, sha256: str) -> aioredis.lock.Lock:
+        return redis.lock(f"blobs:lock:{sha256}", timeout=LOCK_TIMEOUT, blocking_timeout=LOCK_TIMEOUT)
+
+    async def store(self, redis: aioredis.Redis, stored_file: StoredFile) -> bool:
+        """Store uploaded file and add reference to it, return True if content was deduplicated."""
+        if not SHA256_PATTERN.match(stored_file.sha256):
+            raise ValueError(f"Invalid sha256 {stored_file.sha256!r} of {stored_file.filename}")
+        async with self.lock(redis, stored_file.sha256):
+            deduplicated = await asyncio.to_thread(
+                place_blob, stored_file.path, self.blob_path(stored_file.sha256),
+            )
+            async with redis.pipeline(transaction=True) as pipe:
+                pipe.hincrby(self.index_key(stored_file.sha256), "refs", 1)
+                pipe.hset(self.index_key(stored_file.sha256), "size", str(stored_file.size))
+                await pipe.execute()
+        stored_file.path = self.blob_path(stored_file.sha256)
+        return deduplicated
+
+    async def add_reference(self, redis: aioredis.Redis, sha256: str) -> int | None:
+        """Add reference to already stored content and return its size, None if it is not stored."""
+        async with self.lock(redis, sha256):
+            size = await redis.hget(self.index_key(sha256), "size")  # type: ignore[misc]
+            if size is None:
+                return None
+            await redis.hincrby(self.index_key(sha256), "refs", 1)  # type: ignore[misc]
+        return int(size)
+
+    async def release(self, redis: aioredis.Redis, sha256: str) -> bool:
+        """Remove reference to content, the blob is deleted with the last one. Return False if it is not stored."""
+        async with self.lock(redis, sha256):
+            if not await redis.exists(self.index_key(sha256)):
+                return False
+            if await redis.hincrby(self.index_key(sha256), "refs", -1) <= 0:  # type: ignore[misc]
+                await redis.delete(self.index_key(sha256))
+                await asyncio.to_thread(remove_file, self.blob_path(sha256))
+        return True
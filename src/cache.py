@@ -0,0 +1,254 @@
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from dataclasses import asdict, dataclass
+from functools import wraps
+from typing import Any
+
+from redis import asyncio as aioredis
+from redis.exceptions import RedisError
+from responses import dumps as dumps_json
+
+
+logger = logging.getLogger(__name__)
+
+# значение-заглушка для кэширования отсутствующих объектов (ответов 404)
+NEGATIVE_VALUE = b"\x00"
+# канал, через который воркеры сообщают друг другу об изменении данных
+INVALIDATION_CHANNEL = "cache:invalidate"
+INVALIDATION_RETRY_DELAY = 1
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    errors: int = 0
+
+    def as_dict(self) -> dict[str, Any]:
+        return asdict(self)
+
+
+class LocalCache:
+    """LRU-кэш в памяти воркера с TTL.
+
+    Работает без блокировок, так как все обращения идут из одного event loop.
+    Изменения рассылаются другим воркерам через pub/sub Redis, см. listen_invalidations.
+    """
+
+    def __init__(self, namespace: str, max_size: int, ttl: float) -> None:
+        self.namespace = namespace
+        self.max_size = max_size
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        local_caches[namespace] = self
+        caches.setdefault(namespace, self)
+
+    def lookup(self, key: str) -> tuple[bool, Any]:
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] <= time.monotonic():
+            del self._entries[key]
+            self.stats.evictions += 1
+            entry = None
+        if entry is None:
+            self.stats.misses += 1
+            return False, None
+        self._entries.move_to_end(key)
+        self.stats.hits += 1
+        return True, entry[1]
+
+    def store(self, key: str, value: Any, ttl: float | None = None) -> None:
+        self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+
+    def drop(self, *keys: str) -> None:
+        for key in keys:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    async def get(self, redis: aioredis.Redis, key: str) -> tuple[bool, Any]:
+        return self.lookup(key)
+
+    async def set(self, redis: aioredis.Redis, key: str, value: Any) -> None:  # noqa A003
+        self.store(key, value)
+
+    async def invalidate(self, redis: aioredis.Redis, *keys: str) -> None:
+        if not keys:
+            return
+        self.drop(*keys)
+        try:
+            await redis.publish(INVALIDATION_CHANNEL, json.dumps({"namespace": self.namespace, "keys": keys}))
+        except RedisError:
+            self.stats.errors += 1
+
+    def stats_by_tier(self) -> dict[str, Any]:
+        return {"local": self.stats.as_dict(), "size": len(self._entries)}
+
+    @staticmethod
+    def dumps(value: Any) -> Any:
+        # значение хранится в памяти как есть, без сериализации
+        return value
+
+    @staticmethod
+    def loads(value: Any) -> Any:
+        return value
+
+
+class RedisCache:
+    """Read-through кэш в Redis с отдельным TTL для отсутствующих объектов.
+
+    Ошибки Redis не роняют запрос: чтение считается промахом, запись пропускается.
+    """
+
+    def __init__(self, namespace: str, ttl: int, negative_ttl: int) -> None:
+        self.namespace = namespace
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.stats = CacheStats()
+        caches[namespace] = self
+
+    def make_key(self, key: str) -> str:
+        return f"cache:{self.namespace}:{key}"
+
+    async def get(self, redis: aioredis.Redis, key: str) -> tuple[bool, bytes | None]:
+        """Return (found, value), value is None for cached absence of object."""
+        try:
+            value = await redis.get(self.make_key(key))
+        except RedisError:
+            self.stats.errors += 1
+            value = None
+        if value is None:
+            self.stats.misses += 1
+            return False, None
+        self.stats.hits += 1
+        return True, None if value == NEGATIVE_VALUE else value
+
+    async def set(self, redis: aioredis.Redis, key: str, value: bytes | str | None) -> None:  # noqa A003
+        if value is None and not self.negative_ttl:
+            return
+        try:
+            if value is None:
+                await redis.set(self.make_key(key), NEGATIVE_VALUE, ex=self.negative_ttl)
+            else:
+                await redis.set(self.make_key(key), value, ex=self.ttl)
+        except RedisError:
+            self.stats.errors += 1
+
+    async def invalidate(self, redis: aioredis.Redis, *keys: str) -> None:
+        if not keys:
+            return
+        try:
+            await redis.delete(*(self.make_key(key) for key in keys))
+        except RedisError:
+            self.stats.errors += 1
+
+    def stats_by_tier(self) -> dict[str, Any]:
+        return {"redis": self.stats.as_dict()}
+
+    @staticmethod
+    def dumps(value: Any) -> bytes:
+        return dumps_json(value)
+
+    @staticmethod
+    def loads(value: bytes) -> Any:
+        return json.loads(value)
+
+
+class TieredCache(RedisCache):
+    """Кэш в памяти воркера перед кэшем в Redis: горячие ключи не требуют похода в сеть."""
+
+    def __init__(self, namespace: str, ttl: int, negative_ttl: int, local_max_size: int, local_ttl: float) -> None:
+        super().__init__(namespace, ttl, negative_ttl)
+        self.local = LocalCache(namespace, local_max_size, local_ttl)
+
+    async def get(self, redis: aioredis.Redis, key: str) -> tuple[bool, bytes | None]:
+        found, value = self.local.lookup(key)
+        if found:
+            return found, value
+        found, value = await super().get(redis, key)
+        if found:
+            self._store_local(key, value)
+        return found, value
+
+    async def set(self, redis: aioredis.Redis, key: str, value: bytes | str | None) -> None:  # noqa A003
+        await super().set(redis, key, value)
+        self._store_local(key, value.encode() if isinstance(value, str) else value)
+
+    async def invalidate(self, redis: aioredis.Redis, *keys: str) -> None:
+        # сначала Redis, иначе другой воркер успеет заново взять в память устаревшее значение
+        await super().invalidate(redis, *keys)
+        await self.local.invalidate(redis, *keys)
+
+    def stats_by_tier(self) -> dict[str, Any]:
+        return {**self.local.stats_by_tier(), **super().stats_by_tier()}
+
+    def _store_local(self, key: str, value: bytes | None) -> None:
+        if value is None:
+            if self.negative_ttl:
+                self.local.store(key, None, ttl=min(self.local.ttl, self.negative_ttl))
+        else:
+            self.local.store(key, value)
+
+
+def cached(cache: LocalCache | TieredCache, key: Callable[..., str]) -> Callable:
+    """Cache view result by key built from view arguments.
+
+    View must get Redis client as `redis` argument, it is used for Redis tier and invalidation.
+    Only successful results are cached, raised HTTPException passes through.
+    """
+    def decorator(func: Callable) -> Callable:
+        @wraps(func)
+        async def wrapper(**kwargs: Any) -> Any:
+            redis, cache_key = kwargs["redis"], key(**kwargs)
+            found, value = await cache.get(redis, cache_key)
+            if found and value is not None:
+                return cache.loads(value)
+            result = await func(**kwargs)
+            await cache.set(redis, cache_key, cache.dumps(result))
+            return result
+        return wrapper
+    return decorator
+
+
+def drop_local_keys(message: bytes | str) -> None:
+    invalidation = json.loads(message)
+    local_cache = local_caches.get(invalidation["namespace"])
+    if local_cache:
+        local_cache.drop(*invalidation["keys"])
+
+
+def handle_invalidation(message: bytes | str) -> None:
+    try:
+        drop_local_keys(message)
+    except (ValueError, KeyError, TypeError):
+        # испорченное сообщение пропускается, иначе слушатель завершился бы и кэши перестали бы сбрасываться
+        logger.exception("Invalid cache invalidation message %r", message)
+
+
+async def listen_invalidations(redis: aioredis.Redis) -> None:
+    """Drop local cache keys changed by other workers, runs for the whole app lifetime."""
+    while True:
+        try:
+            async with redis.pubsub(ignore_subscribe_messages=True) as pubsub:
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                # пока подписки не было, сообщения могли потеряться, поэтому начинаем с пустых кэшей
+                for local_cache in local_caches.values():
+                    local_cache.clear()
+                async for message in pubsub.listen():
+                    handle_invalidation(message["data"])
+        except (RedisError, OSError):
+            await asyncio.sleep(INVALIDATION_RETRY_DELAY)
+
+
+caches: dict[str, LocalCache | RedisCache] = {}
+local_caches: dict[str, LocalCache] = {}
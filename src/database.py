@@ -1,16 +1,52 @@
-from typing import AsyncGenerator
+import asyncio
+import logging
+import weakref
+from functools import cache
+from typing import Any, AsyncGenerator
 
-import redis  # type: ignore[import-untyped]
-from env_settings import AppEnvSettings
+import startup_timing
+from env_settings import AppEnvSettings, get_settings
+from fastapi import Request
 from redis import asyncio as aioredis
-from sqlalchemy import create_engine
-from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, sessionmaker
+from redis.commands.core import AsyncScript
+from sqlalchemy import make_url, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 
 
-env_settings: AppEnvSettings = AppEnvSettings()
-engine = create_engine(str(env_settings.POSTGRES_DSN))
+logger = logging.getLogger(__name__)
 
-Session = sessionmaker(autoflush=False, bind=engine)
+env_settings: AppEnvSettings = get_settings()
+pool_settings = {
+    "pool_size": env_settings.DB.POOL_SIZE,
+    "max_overflow": env_settings.DB.MAX_OVERFLOW,
+    "pool_recycle": env_settings.DB.POOL_RECYCLE,
+    "pool_timeout": env_settings.DB.POOL_TIMEOUT,
+    "pool_pre_ping": True,
+    "echo": env_settings.DB.ECHO,
+}
+
+
+# движки и клиенты создаются при первом обращении, а не при импорте: воркер стартует быстрее,
+# а процессы, которым они не нужны (тесты, скрипты), не загружают драйверы
+@cache
+def get_async_engine() -> AsyncEngine:
+    # тот же DSN, но с асинхронным драйвером, чтобы запросы к БД не блокировали event loop
+    return create_async_engine(
+        make_url(str(env_settings.POSTGRES_DSN)).set(drivername="postgresql+asyncpg"),
+        **pool_settings,
+    )
+
+
+@cache
+def get_async_sessionmaker() -> async_sessionmaker[AsyncSession]:
+    # для потоковых ответов: зависимость с yield закрывает сессию раньше, чем начнется отправка тела
+    return async_sessionmaker(get_async_engine(), autoflush=False, expire_on_commit=False)
+
+
+async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
+    async with get_async_sessionmaker()() as session:
+        yield session
 
 
 class DBModel(DeclarativeBase):
@@ -28,17 +64,82 @@ class PlaneTotemDB(DBModel):
     # tags: Mapped[list[str]]
 
 
-sync_redis = redis.Redis(
-    host="redis",
-    port=6379,
-    db=0,
-    decode_responses=True,  # Автоматическое декодирование в строки
-)
+redis_connection_settings = {
+    "host": env_settings.REDIS.HOST,
+    "port": env_settings.REDIS.PORT,
+    "db": env_settings.REDIS.DB,
+    "socket_timeout": env_settings.REDIS.SOCKET_TIMEOUT,
+    "socket_connect_timeout": env_settings.REDIS.SOCKET_CONNECT_TIMEOUT,
+}
+
+
+# скрипт ссылается на клиент через weakref.proxy, иначе клиент никогда не удалился бы из словаря
+_registered_scripts: weakref.WeakKeyDictionary[aioredis.Redis, dict[str, AsyncScript]] = weakref.WeakKeyDictionary()
+
+
+def get_script(redis_client: aioredis.Redis, script: str) -> AsyncScript:
+    """Lua script registered once per client, register_script creates and hashes it on every call."""
+    scripts = _registered_scripts.setdefault(redis_client, {})
+    if script not in scripts:
+        scripts[script] = AsyncScript(weakref.proxy(redis_client), script)
+    return scripts[script]
+
+
+def create_aioredis_pool(max_connections: int | None = None) -> aioredis.BlockingConnectionPool:
+    # при исчерпании пула запрос ждет свободное соединение, а не падает с ошибкой
+    return aioredis.BlockingConnectionPool(
+        max_connections=max_connections or env_settings.REDIS.MAX_CONNECTIONS,
+        timeout=env_settings.REDIS.POOL_TIMEOUT,
+        **redis_connection_settings,
+    )
+
+
+def create_aioredis_pubsub_client() -> aioredis.Redis:
+    # подписка ждет сообщений бесконечно, поэтому без таймаута чтения и вне общего пула
+    return aioredis.Redis(
+        **(redis_connection_settings | {"socket_timeout": None}),
+        socket_keepalive=True,
+    )
+
+
+def get_redis_pool_stats(pool: aioredis.ConnectionPool) -> dict[str, Any]:
+    idle = len(pool._available_connections)
+    in_use = len(pool._in_use_connections)
+    return {
+        "max_connections": pool.max_connections,
+        "created_connections": idle + in_use,
+        "in_use_connections": in_use,
+        "idle_connections": idle,
+    }
+
+
+async def create_all_tables() -> None:
+    async with get_async_engine().begin() as connection:
+        await connection.run_sync(DBModel.metadata.create_all)
+
+
+async def warm_up_pools(redis_client: aioredis.Redis) -> None:
+    """Open first connections of DB and Redis pools, errors are only logged: the app works without warmup."""
+    async def connect_db() -> None:
+        async with get_async_engine().connect() as connection:
+            await connection.execute(text("SELECT 1"))
+
+    with startup_timing.measure("warmup_db"):
+        try:
+            await asyncio.gather(*(connect_db() for _ in range(env_settings.DB.WARMUP_CONNECTIONS)))
+        except Exception:
+            logger.warning("DB pool warmup failed", exc_info=True)
+    with startup_timing.measure("warmup_redis"):
+        try:
+            await asyncio.gather(*(redis_client.ping() for _ in range(env_settings.REDIS.WARMUP_CONNECTIONS)))
+        except Exception:
+            logger.warning("Redis pool warmup failed", exc_info=True)
+    logger.info(
+        "Pools warmup finished: DB %.0fms, Redis %.0fms",
+        startup_timing.stages["warmup_db"] * 1000, startup_timing.stages["warmup_redis"] * 1000,
+    )
 
 
-async def get_aioredis() -> AsyncGenerator:
-    redis_engine = await aioredis.from_url("redis://redis:6379")
-    try:
-        yield redis_engine
-    finally:
-        await redis_engine.close()
+async def get_aioredis(request: Request) -> aioredis.Redis:
+    # клиент общий для всех запросов воркера, соединения берутся из пула, созданного в lifespan
+    return request.app.state.redis
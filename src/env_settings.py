@@ -1,3 +1,6 @@
+from functools import cache
+from pathlib import Path
+
 from pydantic import BaseModel, Field, PostgresDsn
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -25,14 +28,283 @@ class RollbarEnvSettings(BaseModel):
     """
 
 
+class DBEnvSettings(BaseModel):
+    """Settings of SQLAlchemy async engine connection pool."""
+
+    POOL_SIZE: int = Field(default=5, ge=1)
+    """Number of connections kept open in the pool of each worker."""
+
+    MAX_OVERFLOW: int = Field(default=10, ge=0)
+    """Number of connections allowed above POOL_SIZE during load peaks."""
+
+    POOL_RECYCLE: int = Field(default=1800, ge=-1)
+    """Seconds after which a connection is reopened, -1 disables recycling."""
+
+    POOL_TIMEOUT: float = Field(default=30, gt=0)
+    """Seconds to wait for a free connection before giving up."""
+
+    ECHO: bool = False
+    """Log all SQL statements, useful only for debugging."""
+
+    CREATE_ALL: bool = False
+    """Create missing tables on startup, for local development without migrations."""
+
+    WARMUP_CONNECTIONS: int = Field(default=2, ge=0)
+    """Connections opened in background after startup, so first requests do not wait for them."""
+
+
+class RedisEnvSettings(BaseModel):
+    """Settings of Redis connection pools."""
+
+    HOST: str = 'redis'
+    PORT: int = 6379
+    DB: int = 0
+
+    MAX_CONNECTIONS: int = Field(default=50, ge=1)
+    """Max number of connections in the pool of each worker."""
+
+    POOL_TIMEOUT: float = Field(default=5, gt=0)
+    """Seconds to wait for a free connection when all of them are in use."""
+
+    WARMUP_CONNECTIONS: int = Field(default=2, ge=0)
+    """Connections of async pool opened in background after startup."""
+
+    SOCKET_TIMEOUT: float = Field(default=5, gt=0)
+    """Seconds to wait for a reply to a command."""
+
+    SOCKET_CONNECT_TIMEOUT: float = Field(default=2, gt=0)
+    """Seconds to wait for a new connection to be established."""
+
+    BATCH_MAX_KEYS: int = Field(default=10_000, ge=1)
+    """Max number of keys accepted by one batch request to Redis items endpoints."""
+
+
+class CacheEnvSettings(BaseModel):
+    """Settings of read-through caches in Redis."""
+
+    TOTEM_TTL: int = Field(default=300, ge=1)
+    """Seconds a found totem is kept in cache."""
+
+    TOTEM_NEGATIVE_TTL: int = Field(default=30, ge=0)
+    """Seconds a missing totem (404) is kept in cache, 0 disables negative caching."""
+
+    LOCAL_MAX_SIZE: int = Field(default=10_000, ge=1)
+    """Max number of keys kept in memory of each worker by each in-process cache."""
+
+    LOCAL_TTL: float = Field(default=5, gt=0)
+    """Seconds a key is kept in worker memory, limits staleness if an invalidation message is lost."""
+
+
+class MetricsEnvSettings(BaseModel):
+    """Settings of /metrics endpoint."""
+
+    MULTIPROC_DIR: Path | None = None
+    """Directory shared by all workers of the server to sum up their metrics.
+    Without it /metrics shows metrics of the worker that served the request only.
+    Gunicorn empties it on start, under plain uvicorn with several workers it should be emptied by hand.
+    """
+
+    FLUSH_INTERVAL: float = Field(default=5, gt=0)
+    """Seconds between writes of worker metrics to MULTIPROC_DIR."""
+
+
+class TotemsEnvSettings(BaseModel):
+    """Settings of bulk totem ingestion."""
+
+    BULK_CHUNK_SIZE: int = Field(default=1000, ge=1)
+    """Number of totems validated and written to DB in one transaction."""
+
+    BULK_MAX_RECORD_BYTES: int = Field(default=64 * 1024, ge=1)
+    """Max size of one NDJSON line or JSON array element, protects memory from endless lines."""
+
+    BULK_MAX_REJECTED_REPORTED: int = Field(default=1000, ge=0)
+    """Max number of rejected records listed in response, the rest are only counted."""
+
+    EXPORT_YIELD_PER: int = Field(default=1000, ge=1)
+    """Number of rows fetched from server-side cursor and sent to client at once on export."""
+
+
+class ProfilingEnvSettings(BaseModel):
+    """Settings of per-request profiling."""
+
+    TOKEN: str = ''
+    """Secret for X-Profile header or `profile` query param to profile single request, empty disables it."""
+
+    SAMPLE_RATE: int = Field(default=0, ge=0)
+    """Profile every N-th request in background, 0 disables sampling."""
+
+    SLOWEST_KEPT: int = Field(default=20, ge=1)
+    """Number of the slowest sampled profiles kept in memory of the worker."""
+
+    TOP_FUNCTIONS: int = Field(default=30, ge=1)
+    """Number of functions in profile summary, sorted by cumulative time."""
+
+    DIR: Path | None = None
+    """Directory for .prof files, without it profiles are returned in response by default."""
+
+
+class JobsEnvSettings(BaseModel):
+    """Settings of Redis job queues and their workers."""
+
+    CONCURRENCY: dict[str, int] = {'notifications': 4}
+    """Number of batches processed at once by one worker process, by queue name.
+    It is not a limit of the whole queue: N worker processes of a queue handle up to N times more batches at once.
+    """
+
+    MAX_ATTEMPTS: int = Field(default=5, ge=1)
+    """Job is marked as failed after this number of attempts."""
+
+    RETRY_BACKOFF: float = Field(default=2, gt=0)
+    """Delay before the first retry in seconds, doubled on each next attempt."""
+
+    RETRY_BACKOFF_MAX: float = Field(default=300, gt=0)
+
+    BATCH_WINDOW: float = Field(default=2, ge=0)
+    """Seconds to wait for other jobs of the same group, e.g. messages to the same recipient."""
+
+    BATCH_MAX_SIZE: int = Field(default=100, ge=1)
+
+    RESULT_TTL: int = Field(default=24 * 60 * 60, ge=1)
+    """Seconds to keep status of finished jobs."""
+
+    HEARTBEAT_TTL: int = Field(default=30, ge=1)
+    """Jobs of worker without heartbeat for this number of seconds are returned to queue."""
+
+
+class FilesEnvSettings(BaseModel):
+    """Settings of /files/ endpoint."""
+
+    ROOT: Path = Path('static')
+    """Only files and directories inside it are served."""
+
+    LIST_PAGE_SIZE: int = Field(default=100, ge=1)
+    """Default number of directory entries in one page."""
+
+    LIST_MAX_PAGE_SIZE: int = Field(default=1000, ge=1)
+
+
+class UploadsEnvSettings(BaseModel):
+    """Settings of streaming multipart uploads."""
+
+    DIR: Path = Path('uploads')
+    """Directory for uploaded files, they are written there chunk by chunk."""
+
+    MAX_FILE_SIZE: int = Field(default=512 * 1024 * 1024, ge=1)
+
+    MAX_REQUEST_SIZE: int = Field(default=1024 * 1024 * 1024, ge=1)
+
+    MAX_FIELD_SIZE: int = Field(default=64 * 1024, ge=1)
+    """Max size of non-file form field, such fields are kept in memory."""
+
+
+class StaticEnvSettings(BaseModel):
+    """Settings of /static mount."""
+
+    DIR: Path = Path('static')
+
+    MEMORY_CACHE_SIZE: int = Field(default=64 * 1024 * 1024, ge=0)
+    """Max total size of files and their gzip variants kept in memory of each worker."""
+
+    MAX_CACHED_FILE_SIZE: int = Field(default=1024 * 1024, ge=0)
+    """Larger files are sent from disk, with prebuilt .gz variant if it exists."""
+
+    GZIP_MIN_SIZE: int = Field(default=1024, ge=0)
+    """Smaller files are sent uncompressed."""
+
+    REVALIDATE_INTERVAL: float = Field(default=2, ge=0)
+    """Cached file is served without checking it on disk for this number of seconds."""
+
+
+class CompressionEnvSettings(BaseModel):
+    """Settings of gzip compression of responses."""
+
+    MIN_SIZE: int = Field(default=1024, ge=0)
+    """Smaller responses are sent uncompressed, gzip header and CPU time are not worth it."""
+
+    LEVEL: int = Field(default=6, ge=1, le=9)
+
+    THREAD_MIN_SIZE: int = Field(default=256 * 1024, ge=1)
+    """Larger body chunks are compressed in thread pool to not block event loop."""
+
+
+class ServerEnvSettings(BaseModel):
+    """Settings of production server started with gunicorn_conf.py."""
+
+    BIND: str = '0.0.0.0:8000'
+
+    WORKERS: int = Field(default=0, ge=0)
+    """Number of worker processes, 0 - one per available CPU.
+    Each worker has its own DB and Redis pools, sized by DB and REDIS settings.
+    """
+
+    TIMEOUT: int = Field(default=60, ge=1)
+    """Worker which does not respond for this number of seconds is restarted."""
+
+    GRACEFUL_TIMEOUT: int = Field(default=30, ge=1)
+    """Seconds given to worker to finish its requests on restart or shutdown."""
+
+    KEEPALIVE: int = Field(default=5, ge=0)
+
+    MAX_REQUESTS: int = Field(default=0, ge=0)
+    """Worker is restarted after this number of requests, 0 disables restarts."""
+
+    MAX_REQUESTS_JITTER: int = Field(default=0, ge=0)
+    """Random addition to MAX_REQUESTS, so workers are not restarted all at once."""
+
+
+class CalcEnvSettings(BaseModel):
+    """Settings of /calc/batch/ endpoints."""
+
+    BATCH_MAX_BODY_SIZE: int = Field(default=64 * 1024 * 1024, ge=1)
+    """Max request body size, the body is kept in memory while arrays are processed."""
+
+    BATCH_MAX_LENGTH: int = Field(default=4 * 1024 * 1024, ge=1)
+    """Max number of elements in each array."""
+
+
 class AppEnvSettings(BaseSettings):
     """Settings for FastAPI app."""
 
     POSTGRES_DSN: PostgresDsn
 
+    DB: DBEnvSettings = DBEnvSettings()
+
+    REDIS: RedisEnvSettings = RedisEnvSettings()
+
+    CACHE: CacheEnvSettings = CacheEnvSettings()
+
+    METRICS: MetricsEnvSettings = MetricsEnvSettings()
+
+    TOTEMS: TotemsEnvSettings = TotemsEnvSettings()
+
+    PROFILING: ProfilingEnvSettings = ProfilingEnvSettings()
+
+    JOBS: JobsEnvSettings = JobsEnvSettings()
+
+    FILES: FilesEnvSettings = FilesEnvSettings()
+
+    UPLOADS: UploadsEnvSettings = UploadsEnvSettings()
+
+    STATIC: StaticEnvSettings = StaticEnvSettings()
+
+    COMPRESSION: CompressionEnvSettings = CompressionEnvSettings()
+
+    SERVER: ServerEnvSettings = ServerEnvSettings()
+
+    CALC: CalcEnvSettings = CalcEnvSettings()
+
     ROLLBAR: RollbarEnvSettings | None = None
 
     FASTAPI_DEBUG: bool = False
     """Should be disabled in production environment."""
 
+    FAST_JSON_RESPONSES: bool = False
+    """Serialize JSON responses with orjson, requires `fast-json` extra."""
+
     model_config = SETTINGS_MODEL_CONFIG
+
+
+@cache
+def get_settings() -> AppEnvSettings:
+    """Read settings from environment once per process."""
+    return AppEnvSettings()  # type: ignore[call-arg]  # обязательные поля читаются из окружения
@@ -1,3 +1,5 @@
+import logging
+
 from fastapi import Request, Response, status
 from fastapi.encoders import jsonable_encoder
 from fastapi.exception_handlers import http_exception_handler, request_validation_exception_handler
@@ -5,18 +7,21 @@ from fastapi.exceptions import HTTPException, RequestValidationError
 from fastapi.responses import JSONResponse
 
 
+logger = logging.getLogger(__name__)
+
+
 class UnicornError(Exception):
     def __init__(self, name: str):
         self.name = name
 
 
 async def custom_http_exception_handler(request: Request, exc: HTTPException) -> Response:
-    print(f"OMG! An HTTP error!: {repr(exc)}")
+    logger.info("OMG! An HTTP error!: %r", exc, extra={"path": request.url.path, "status": exc.status_code})
     return await http_exception_handler(request, exc)
 
 
 async def validation_exception_handler(request: Request, exc: RequestValidationError) -> Response:
-    print(f"OMG! The client sent invalid data!: {exc}")
+    logger.info("OMG! The client sent invalid data!: %s", exc.errors(), extra={"path": request.url.path})
     return await request_validation_exception_handler(request, exc)
 
 
@@ -0,0 +1,63 @@
+import heapq
+import os
+import stat
+from collections.abc import Mapping
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from typing import Any
+
+
+def resolve_in_root(root: Path, relative_path: str) -> tuple[Path, os.stat_result] | None:
+    """Return path with its stat if it exists inside root, symlinks leading outside are not followed."""
+    root = root.resolve()
+    try:
+        path = (root / relative_path).resolve(strict=True)
+        return (path, path.stat()) if path.is_relative_to(root) else None
+    except (OSError, RuntimeError):  # RuntimeError - петля из символических ссылок
+        return None
+
+
+def list_directory(path: Path, cursor: str | None, limit: int) -> tuple[list[dict[str, Any]], str | None]:
+    """Return page of directory entries sorted by name, which follow cursor, and cursor of the next page.
+
+    Directory is read with scandir without loading all names to memory, only the page is kept.
+    """
+    with os.scandir(path) as entries:
+        page = heapq.nsmallest(
+            limit + 1,
+            (entry for entry in entries if cursor is None or entry.name > cursor),
+            key=lambda entry: entry.name,
+        )
+    next_cursor = page[limit - 1].name if len(page) > limit else None
+    result = []
+    for entry in page[:limit]:
+        try:
+            entry_stat = entry.stat()
+        except OSError:  # файл удален между чтением каталога и stat
+            continue
+        is_dir = stat.S_ISDIR(entry_stat.st_mode)
+        result.append({
+            "name": entry.name,
+            "is_dir": is_dir,
+            "size": None if is_dir else entry_stat.st_size,
+            "modified": entry_stat.st_mtime,
+        })
+    return result, next_cursor
+
+
+def is_not_modified(response_headers: Mapping[str, str], request_headers: Mapping[str, str]) -> bool:
+    """Check conditional request headers, If-None-Match takes precedence over If-Modified-Since."""
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match is not None:
+        etag = response_headers.get("etag", "").removeprefix("W/")
+        return if_none_match.strip() == "*" or etag in {
+            tag.strip().removeprefix("W/") for tag in if_none_match.split(",")
+        }
+    if_modified_since = request_headers.get("if-modified-since")
+    last_modified = response_headers.get("last-modified")
+    if if_modified_since is None or last_modified is None:
+        return False
+    try:
+        return parsedate_to_datetime(if_modified_since) >= parsedate_to_datetime(last_modified)
+    except (TypeError, ValueError):
+        return False
@@ -0,0 +1,73 @@
+"""Gunicorn config of production server: app is preloaded in master and forked to uvicorn workers.
+
+Run from repository root: gunicorn --config src/gunicorn_conf.py
+
+Restarts without dropping requests:
+- kill -HUP <master pid> starts new workers and stops old ones after they finish their requests.
+  The app is preloaded, so HUP rereads settings but not code;
+- new code is deployed with kill -USR2 <master pid>, which starts new master with new workers,
+  and then kill -TERM <old master pid>. Old workers finish requests within SERVER__GRACEFUL_TIMEOUT.
+"""
+import logging.config
+import math
+import os
+from pathlib import Path
+from typing import Any
+
+import metrics
+import startup_timing
+import yaml  # type: ignore[import-untyped]
+from env_settings import get_settings
+
+
+LOGGING_CONFIG_PATH = Path(__file__).parent / "uvicorn_logging_config.yaml"
+CGROUP_CPU_MAX_PATH = Path("/sys/fs/cgroup/cpu.max")
+
+
+def available_cpus() -> int:
+    """Return number of CPUs available to this process, with affinity and container CPU limit taken into account."""
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+    try:
+        # docker --cpus задает квоту cgroup, а не affinity: "max 100000" или "150000 100000"
+        quota, period = CGROUP_CPU_MAX_PATH.read_text().split()
+        if quota != "max":
+            cpus = min(cpus, math.ceil(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+    return max(cpus, 1)
+
+
+settings = get_settings()
+
+wsgi_app = "main:main()"
+preload_app = True
+# воркер асинхронный и сам загружает одно ядро, поэтому по одному на CPU, а не 2 * CPU + 1
+workers = settings.SERVER.WORKERS or available_cpus()
+# loop и http в режиме auto: uvloop и httptools из uvicorn[standard], если они установлены
+worker_class = "uvicorn.workers.UvicornWorker"
+bind = settings.SERVER.BIND
+timeout = settings.SERVER.TIMEOUT
+graceful_timeout = settings.SERVER.GRACEFUL_TIMEOUT
+keepalive = settings.SERVER.KEEPALIVE
+max_requests = settings.SERVER.MAX_REQUESTS
+max_requests_jitter = settings.SERVER.MAX_REQUESTS_JITTER
+
+
+def on_starting(server: Any) -> None:
+    # вызывается один раз в мастере до запуска воркеров, снимки прошлого запуска еще не перезаписаны
+    if settings.METRICS.MULTIPROC_DIR:
+        metrics.clear_snapshots(settings.METRICS.MULTIPROC_DIR)
+    server.log.info(
+        "Starting %s workers, up to %s DB and %s Redis connections in total",
+        workers,
+        workers * (settings.DB.POOL_SIZE + settings.DB.MAX_OVERFLOW),
+        workers * settings.REDIS.MAX_CONNECTIONS,
+    )
+
+
+def post_fork(server: Any, worker: Any) -> None:
+    startup_timing.mark("fork")
+    # логирование настраивается в каждом воркере, а не в мастере: поток вывода QueueStreamHandler
+    # не переживает fork, и записи воркера остались бы в очереди навсегда
+    with open(LOGGING_CONFIG_PATH) as file:
+        logging.config.dictConfig(yaml.safe_load(file))
@@ -0,0 +1,271 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+from collections.abc import Awaitable, Callable
+from contextlib import suppress
+from typing import Any
+
+from database import env_settings, get_script
+from redis import asyncio as aioredis
+from redis.exceptions import RedisError
+
+
+logger = logging.getLogger(__name__)
+
+settings = env_settings.JOBS
+
+JobHandler = Callable[[str, list[dict[str, Any]]], Awaitable[None]]
+
+# Очередь хранит не задачи, а группы: задачи одной группы (например, письма одному адресату)
+# копятся в списке группы и отдаются обработчику пачкой. Группа стоит в очереди не больше одного раза,
+# поэтому пачки одной группы не обрабатываются параллельно и порядок задач в группе сохраняется.
+ENQUEUE_SCRIPT = """
+redis.call('HMSET', KEYS[1], 'group', ARGV[2], 'payload', ARGV[3], 'status', 'queued', 'attempts', 0,
+           'created_at', ARGV[4], 'updated_at', ARGV[4])
+if redis.call('RPUSH', KEYS[2], ARGV[1]) == 1 then
+    if tonumber(ARGV[5]) > 0 then
+        redis.call('ZADD', KEYS[4], tonumber(ARGV[4]) + tonumber(ARGV[5]), ARGV[2])
+    else
+        redis.call('LPUSH', KEYS[3], ARGV[2])
+    end
+end
+"""
+
+PROMOTE_SCRIPT = """
+local groups = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+for _, group in ipairs(groups) do
+    redis.call('ZREM', KEYS[1], group)
+    redis.call('LPUSH', KEYS[2], group)
+end
+return #groups
+"""
+
+# задачи убираются из группы только после обработки, так что падение воркера их не теряет
+FINISH_SCRIPT = """
+redis.call('LREM', KEYS[2], 1, ARGV[1])
+redis.call('LTRIM', KEYS[1], ARGV[2], -1)
+if tonumber(ARGV[3]) > 0 then
+    redis.call('ZADD', KEYS[4], ARGV[3], ARGV[1])
+elseif redis.call('LLEN', KEYS[1]) > 0 then
+    redis.call('LPUSH', KEYS[3], ARGV[1])
+end
+"""
+
+# группа возвращается в очередь, только если она еще в списке воркера, иначе FINISH_SCRIPT уже отработал
+RETURN_SCRIPT = """
+if redis.call('LREM', KEYS[1], 1, ARGV[1]) > 0 then
+    redis.call('LPUSH', KEYS[2], ARGV[1])
+end
+"""
+
+PROMOTE_BATCH = 100
+# ожидание новых задач ограничено, чтобы не упираться в таймаут чтения сокета
+BLOCK_TIMEOUT = 1
+
+handlers: dict[str, JobHandler] = {}
+
+
+def job_handler(queue: str) -> Callable[[JobHandler], JobHandler]:
+    """Register handler of queue jobs, it gets group and payloads of the batch."""
+    def decorator(func: JobHandler) -> JobHandler:
+        handlers[queue] = func
+        return func
+    return decorator
+
+
+def job_key(job_id: str) -> str:
+    return f"jobs:job:{job_id}"
+
+
+def retry_delay(attempt: int) -> float:
+    return min(settings.RETRY_BACKOFF * 2 ** (attempt - 1), settings.RETRY_BACKOFF_MAX)
+
+
+def decode_job(job: dict[bytes, bytes]) -> dict[str, Any]:
+    fields = {key.decode(): value.decode() for key, value in job.items()}
+    return fields | {
+        "payload": json.loads(fields["payload"]),
+        "attempts": int(fields["attempts"]),
+        "created_at": float(fields["created_at"]),
+        "updated_at": float(fields["updated_at"]),
+    }
+
+
+class JobQueue:
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.pending_key = f"jobs:{name}:pending"
+        self.delayed_key = f"jobs:{name}:delayed"
+        self.workers_key = f"jobs:{name}:workers"
+
+    def group_key(self, group: str) -> str:
+        return f"jobs:{self.name}:group:{group}"
+
+    def processing_key(self, worker_id: str) -> str:
+        return f"jobs:{self.name}:processing:{worker_id}"
+
+    def heartbeat_key(self, worker_id: str) -> str:
+        return f"jobs:{self.name}:heartbeat:{worker_id}"
+
+    async def enqueue(self, redis: aioredis.Redis, payload: dict[str, Any], group: str | None = None) -> str:
+        """Put job to queue and return its id, jobs of one group are handled together."""
+        job_id = uuid.uuid4().hex
+        group = group or job_id
+        await get_script(redis, ENQUEUE_SCRIPT)(
+            keys=[job_key(job_id), self.group_key(group), self.pending_key, self.delayed_key],
+            args=[job_id, group, json.dumps(payload), time.time(), settings.BATCH_WINDOW],
+        )
+        return job_id
+
+    async def get_job(self, redis: aioredis.Redis, job_id: str) -> dict[str, Any] | None:
+        job = await redis.hgetall(job_key(job_id))  # type: ignore[misc]
+        return decode_job(job) if job else None
+
+
+class Worker:
+    """Process jobs of one queue with limited number of concurrent batches.
+
+    The limit is per worker: each process of the queue handles up to `concurrency` batches at once.
+
+    Taken group stays in the worker processing list until its batch is handled.
+    Other workers return it to the queue if the worker stops sending heartbeats,
+    the worker itself returns groups whose handling was interrupted by Redis error.
+    """
+
+    def __init__(self, redis: aioredis.Redis, queue: JobQueue, handler: JobHandler, concurrency: int) -> None:
+        self.redis = redis
+        self.queue = queue
+        self.handler = handler
+        self.concurrency = concurrency
+        self.id = f"{socket.gethostname()}:{os.getpid()}"
+        self.processing_key = queue.processing_key(self.id)
+        self.promote_script = redis.register_script(PROMOTE_SCRIPT)
+        self.finish_script = redis.register_script(FINISH_SCRIPT)
+        self.return_script = redis.register_script(RETURN_SCRIPT)
+        self.interrupted_groups: set[str] = set()
+
+    async def run(self) -> None:
+        await self.heartbeat()
+        await self.redis.sadd(self.queue.workers_key, self.id)  # type: ignore[misc]
+        tasks = [asyncio.create_task(self.consume()) for _ in range(self.concurrency)]
+        tasks.append(asyncio.create_task(self.maintain()))
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            for task in tasks:
+                with suppress(asyncio.CancelledError):
+                    await task
+            # задачи, взятые в работу, сразу возвращаются в очередь, не дожидаясь потери пульса
+            await self.requeue(self.id)
+            await self.redis.delete(self.queue.heartbeat_key(self.id))
+
+    async def consume(self) -> None:
+        while True:
+            try:
+                await self.take_group()
+            except (RedisError, OSError):
+                logger.exception("Redis is unavailable, queue %s", self.queue.name)
+                await asyncio.sleep(1)
+
+    async def take_group(self) -> None:
+        group = await self.redis.brpoplpush(  # type: ignore[misc]
+            self.queue.pending_key, self.processing_key, timeout=BLOCK_TIMEOUT,
+        )
+        if group is None:
+            return
+        try:
+            await self.process(group.decode())
+        except (RedisError, OSError):
+            # по пульсу группу вернули бы только после смерти воркера, поэтому ее возвращает maintain этого воркера
+            self.interrupted_groups.add(group.decode())
+            raise
+
+    async def process(self, group: str) -> None:
+        group_job_ids = await self.redis.lrange(  # type: ignore[misc]
+            self.queue.group_key(group), 0, settings.BATCH_MAX_SIZE - 1,
+        )
+        job_ids = [job_id.decode() for job_id in group_job_ids]
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for job_id in job_ids:
+                pipe.hincrby(job_key(job_id), "attempts", 1)
+                pipe.hset(job_key(job_id), mapping={"status": "running", "updated_at": time.time()})
+                pipe.hget(job_key(job_id), "payload")
+            results = await pipe.execute()
+        attempts, payloads = results[0::3], [json.loads(payload) for payload in results[2::3]]
+
+        try:
+            if job_ids:
+                await self.handler(group, payloads)
+        except Exception as error:
+            # у задач в начале группы попыток не меньше, чем у пришедших позже,
+            # поэтому исчерпавшие попытки задачи всегда идут подряд с начала пачки
+            failed = sum(attempt >= settings.MAX_ATTEMPTS for attempt in attempts)
+            logger.exception("Batch of %s jobs of queue %s failed", len(job_ids), self.queue.name)
+            await self.set_status(job_ids[:failed], "failed", error=repr(error), expire=True)
+            await self.set_status(job_ids[failed:], "retrying", error=repr(error))
+            retry_at = time.time() + retry_delay(max(attempts[failed:])) if failed < len(job_ids) else 0
+            await self.finish(group, failed, retry_at)
+        else:
+            await self.set_status(job_ids, "done", expire=True)
+            await self.finish(group, len(job_ids), 0)
+
+    async def set_status(self, job_ids: list[str], status: str, error: str = "", expire: bool = False) -> None:
+        if not job_ids:
+            return
+        fields = {"status": status, "updated_at": time.time()} | ({"error": error} if error else {})
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for job_id in job_ids:
+                pipe.hset(job_key(job_id), mapping=fields)
+                if expire:
+                    pipe.expire(job_key(job_id), settings.RESULT_TTL)
+            await pipe.execute()
+
+    async def finish(self, group: str, done_count: int, retry_at: float) -> None:
+        await self.finish_script(
+            keys=[self.queue.group_key(group), self.processing_key, self.queue.pending_key, self.queue.delayed_key],
+            args=[group, done_count, retry_at],
+        )
+
+    async def heartbeat(self) -> None:
+        await self.redis.set(self.queue.heartbeat_key(self.id), 1, ex=settings.HEARTBEAT_TTL)
+
+    async def maintain(self) -> None:
+        """Move delayed groups to queue, return interrupted groups, send heartbeat and requeue jobs of dead workers."""
+        last_heartbeat = 0.0
+        while True:
+            try:
+                await self.promote_script(
+                    keys=[self.queue.delayed_key, self.queue.pending_key], args=[time.time(), PROMOTE_BATCH],
+                )
+                await self.return_interrupted()
+                if time.monotonic() - last_heartbeat > settings.HEARTBEAT_TTL / 3:
+                    last_heartbeat = time.monotonic()
+                    await self.heartbeat()
+                    await self.requeue_dead_workers()
+            except (RedisError, OSError):
+                logger.exception("Redis is unavailable, queue %s", self.queue.name)
+            await asyncio.sleep(0.5)
+
+    async def return_interrupted(self) -> None:
+        for group in list(self.interrupted_groups):
+            await self.return_script(keys=[self.processing_key, self.queue.pending_key], args=[group])
+            self.interrupted_groups.discard(group)
+
+    async def requeue_dead_workers(self) -> None:
+        for worker_id in await self.redis.smembers(self.queue.workers_key):  # type: ignore[misc]
+            if not await self.redis.exists(self.queue.heartbeat_key(worker_id.decode())):  # type: ignore[misc]
+                await self.requeue(worker_id.decode())
+
+    async def requeue(self, worker_id: str) -> None:
+        processing_key = self.queue.processing_key(worker_id)
+        while await self.redis.rpoplpush(processing_key, self.queue.pending_key) is not None:  # type: ignore[misc]
+            pass
+        await self.redis.srem(self.queue.workers_key, worker_id)  # type: ignore[misc]
+        if worker_id != self.id:
+            logger.warning("Jobs of dead worker %s returned to queue %s", worker_id, self.queue.name)
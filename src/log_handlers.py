@@ -0,0 +1,91 @@
+import itertools
+import json
+import logging
+import queue
+import sys
+from logging import LogRecord
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any
+
+from time_formatter import LocalTimeFormatter
+
+
+# атрибуты, которые есть у любой записи, все остальные пришли через extra
+RECORD_ATTRIBUTES = frozenset(vars(LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "taskName"}
+
+
+class JsonFormatter(LocalTimeFormatter):
+    """Format record as one line JSON with fields passed via extra."""
+
+    def format(self, record: LogRecord) -> str:  # noqa A003
+        data = {
+            "time": self.formatTime(record, self.datefmt),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        data.update(self.extra_fields(record))
+        if record.exc_info:
+            data["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+    def extra_fields(self, record: LogRecord) -> dict[str, Any]:
+        return {key: value for key, value in vars(record).items() if key not in RECORD_ATTRIBUTES}
+
+
+class AccessJsonFormatter(JsonFormatter):
+    """JSON formatter for uvicorn.access logger, splits request line to separate fields."""
+
+    def extra_fields(self, record: LogRecord) -> dict[str, Any]:
+        fields = super().extra_fields(record)
+        if isinstance(record.args, tuple) and len(record.args) == 5:
+            client, method, path, http_version, status = record.args
+            fields.update(client=client, method=method, path=path, http_version=http_version, status=status)
+        return fields
+
+
+class SamplingFilter(logging.Filter):
+    """Pass every N-th access log record, errors and records above INFO always pass."""
+
+    def __init__(self, rate: int = 1) -> None:
+        super().__init__()
+        self.rate = rate
+        self._counter = itertools.count()
+
+    def filter(self, record: LogRecord) -> bool:  # noqa A003
+        if self.rate <= 1 or record.levelno > logging.INFO:
+            return True
+        # аргументы записи uvicorn.access: клиент, метод, путь, версия HTTP, статус
+        if isinstance(record.args, tuple) and len(record.args) == 5 and int(str(record.args[4])) >= 400:
+            return True
+        return next(self._counter) % self.rate == 0
+
+
+class QueueStreamHandler(QueueHandler):
+    """Put records to queue, stream handler writes them from a separate thread.
+
+    Formatter set by logging config goes to the stream handler, so neither formatting
+    nor output happen in the thread that logs, e.g. in event loop serving requests.
+    """
+
+    def __init__(self, stream: Any = None) -> None:
+        super().__init__(queue.SimpleQueue())
+        self.stream_handler = logging.StreamHandler(stream or sys.stderr)
+        self.listener = QueueListener(self.queue, self.stream_handler, respect_handler_level=True)
+        self.listener.start()
+        self._listening = True
+
+    def setFormatter(self, fmt: logging.Formatter | None) -> None:  # noqa N802
+        self.stream_handler.setFormatter(fmt)
+
+    def close(self) -> None:
+        # logging.shutdown закрывает обработчики при завершении процесса, оставшиеся в очереди записи дописываются
+        if self._listening:
+            self._listening = False
+            self.listener.stop()
+        super().close()
+
+    def prepare(self, record: LogRecord) -> LogRecord:
+        # в отличие от QueueHandler запись не форматируется, аргументы сообщения
+        # подставляются уже в потоке записи, поэтому в них не стоит передавать изменяемые объекты
+        return record
@@ -1,11 +1,30 @@
+import startup_timing  # isort: skip  # первым, чтобы замерить импорт остальных модулей
+
+import asyncio
+import logging
+import time
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager, suppress
+
 import exceptions
-from database import DBModel, engine
-from env_settings import AppEnvSettings
+import metrics
+from cache import listen_invalidations
+from database import (
+    create_aioredis_pool,
+    create_aioredis_pubsub_client,
+    create_all_tables,
+    env_settings,
+    get_async_engine,
+    get_redis_pool_stats,
+    warm_up_pools,
+)
 from fastapi import FastAPI
 from fastapi.exceptions import RequestValidationError
-from fastapi.staticfiles import StaticFiles
 from middlewares import CustomMiddleware, middlewares
+from redis import asyncio as aioredis
+from responses import default_response_class
 from starlette.exceptions import HTTPException as StarletteHTTPException
+from static_files import CachedStaticFiles
 from version import __version__
 
 from users.views import router as user_router
@@ -15,10 +34,60 @@ from views.item_views import router as item_router
 from views.model_views import router as model_router
 from views.other_views import router as other_views_router
 from views.security_views import router as security_router
+from views.service_views import router as service_router
 from views.sotem_views import router as sotem_router
 from views.totem_views import router as totem_router
 
 
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    if env_settings.DB.CREATE_ALL:
+        # DDL при каждом старте воркера замедляет запуск, поэтому только по явной настройке
+        await create_all_tables()
+    # один пул соединений Redis на воркер вместо нового подключения на каждый запрос
+    app.state.redis_pool = create_aioredis_pool()
+    app.state.redis = aioredis.Redis(connection_pool=app.state.redis_pool)
+    pubsub_redis = create_aioredis_pubsub_client()
+    background_tasks = [
+        asyncio.create_task(listen_invalidations(pubsub_redis)),
+        # первые соединения открываются в фоне, воркер начинает принимать запросы сразу
+        asyncio.create_task(warm_up_pools(app.state.redis)),
+    ]
+
+    metrics.db_pool_connections.set_function(lambda: {
+        ("checked_out",): get_async_engine().pool.checkedout(),  # type: ignore[attr-defined]
+        ("checked_in",): get_async_engine().pool.checkedin(),  # type: ignore[attr-defined]
+        ("overflow",): max(get_async_engine().pool.overflow(), 0),  # type: ignore[attr-defined]
+    })
+    metrics.redis_pool_connections.set_function(lambda: {
+        (state,): get_redis_pool_stats(app.state.redis_pool)[f"{state}_connections"]
+        for state in ("created", "in_use", "idle")
+    })
+    metrics_dir = env_settings.METRICS.MULTIPROC_DIR
+    if metrics_dir:
+        background_tasks.append(
+            asyncio.create_task(metrics.flush_periodically(metrics_dir, env_settings.METRICS.FLUSH_INTERVAL)),
+        )
+    startup_timing.mark("lifespan")
+    logger.info(
+        "Worker started in %.3fs: %s", time.perf_counter() - startup_timing.STARTED, startup_timing.format_stages(),
+    )
+    yield
+    for task in background_tasks:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+    if metrics_dir:
+        # счетчики воркера должны остаться в сумме после его остановки
+        await metrics.write_snapshot(metrics_dir, with_gauges=False)
+    await pubsub_redis.aclose()
+    await app.state.redis.aclose()
+    await app.state.redis_pool.aclose()
+
+
 # app = FastAPI(dependencies=[Depends(verify_token), Depends(verify_key)])  # add path dependencies for all routes
 def create_app(
     debug: bool,
@@ -29,6 +98,8 @@ def create_app(
         version=__version__,
         root_path="/api/v1",
         middleware=middlewares,  # type: ignore[arg-type]
+        lifespan=lifespan,
+        default_response_class=default_response_class(env_settings.FAST_JSON_RESPONSES),
         # openapi_url='/api/v1/openapi.json',
     )
 
@@ -41,6 +112,7 @@ def create_app(
     app.include_router(security_router, tags=["security"])
     app.include_router(background_tasks_router, tags=["background_tasks"])
     app.include_router(other_views_router, tags=["others"])
+    app.include_router(service_router, tags=["service"])
 
     # @app.exception_handler(StarletteHTTPException)
     # async def http_exception_handler(request, exc):
@@ -56,7 +128,13 @@ def create_app(
     app.exception_handler(RequestValidationError)(exceptions.validation_exception_handler2)
     app.exception_handler(exceptions.UnicornError)(exceptions.unicorn_exception_handler)
 
-    app.mount("/static", StaticFiles(directory="static"), name="static")
+    app.mount("/static", CachedStaticFiles(
+        directory=env_settings.STATIC.DIR,
+        memory_cache_size=env_settings.STATIC.MEMORY_CACHE_SIZE,
+        max_cached_file_size=env_settings.STATIC.MAX_CACHED_FILE_SIZE,
+        gzip_min_size=env_settings.STATIC.GZIP_MIN_SIZE,
+        revalidate_interval=env_settings.STATIC.REVALIDATE_INTERVAL,
+    ), name="static")
 
     app.add_middleware(CustomMiddleware)
 
@@ -64,9 +142,9 @@ def create_app(
 
 
 def main() -> FastAPI:
-    env_settings: AppEnvSettings = AppEnvSettings()
+    startup_timing.mark("imports")
     app = create_app(
         debug=env_settings.FASTAPI_DEBUG,
     )
-    DBModel.metadata.create_all(engine)
+    startup_timing.mark("create_app")
     return app
@@ -0,0 +1,276 @@
+import asyncio
+import json
+import os
+import time
+from bisect import bisect_left
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+Labels = tuple[str, ...]
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1, 2.5, 5, 7.5, 10)
+
+
+# Метрики меняются только из event loop воркера, поэтому обходятся без блокировок.
+# Несколько воркеров пишут снимки своих метрик в общий каталог, /metrics их суммирует.
+class Metric:
+    type_ = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Labels = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.samples: dict[Labels, Any] = {}
+        registry[name] = self
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "type": self.type_,
+            "documentation": self.documentation,
+            "labelnames": list(self.labelnames),
+            "samples": [[list(labels), value] for labels, value in self.samples.items()],
+        }
+
+
+class Counter(Metric):
+    type_ = "counter"
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self.samples[labels] = self.samples.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    type_ = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Labels = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._function: Callable[[], dict[Labels, float]] | None = None
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self.samples[labels] = self.samples.get(labels, 0) + amount
+
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        self.samples[labels] = self.samples.get(labels, 0) - amount
+
+    def set_function(self, function: Callable[[], dict[Labels, float]]) -> None:
+        """Take values from function at collection time instead of the hot path."""
+        self._function = function
+
+    def snapshot(self) -> dict[str, Any]:
+        if self._function is not None:
+            self.samples = self._function()
+        return super().snapshot()
+
+
+class Histogram(Metric):
+    type_ = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Labels = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = buckets
+
+    def observe(self, value: float, *labels: str) -> None:
+        # счетчики по корзинам без накопления, последняя - +Inf, за ней сумма наблюдений
+        sample = self.samples.get(labels)
+        if sample is None:
+            sample = self.samples[labels] = [0] * (len(self.buckets) + 2)
+        sample[bisect_left(self.buckets, value)] += 1
+        sample[-1] += value
+
+    def snapshot(self) -> dict[str, Any]:
+        return super().snapshot() | {"buckets": list(self.buckets)}
+
+
+registry: dict[str, Metric] = {}
+
+http_requests_total = Counter(
+    "http_requests_total", "Total number of HTTP requests.", ("method", "route", "status"),
+)
+http_requests_in_progress = Gauge(
+    "http_requests_in_progress", "Number of HTTP requests being processed.", ("method",),
+)
+http_request_duration_seconds = Histogram(
+    "http_request_duration_seconds", "Time until the end of HTTP response.", ("method", "route", "status"),
+)
+db_pool_connections = Gauge("db_pool_connections", "Connections of SQLAlchemy async pool.", ("state",))
+redis_pool_connections = Gauge("redis_pool_connections", "Connections of Redis async pool.", ("state",))
+
+
+def route_template(scope: Scope) -> str:
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    if "endpoint" in scope:  # смонтированное приложение, например статика
+        return scope["root_path"][len(scope.get("app_root_path", "")):] + "/{path}"
+    return "<unmatched>"
+
+
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = "500"
+        start_time = time.perf_counter()
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        http_requests_in_progress.inc(method)
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            http_requests_in_progress.dec(method)
+            route = route_template(scope)
+            http_requests_total.inc(method, route, status)
+            http_request_duration_seconds.observe(time.perf_counter() - start_time, method, route, status)
+
+
+def take_snapshot(with_gauges: bool = True) -> dict[str, Any]:
+    return {
+        name: metric.snapshot()
+        for name, metric in registry.items()
+        if with_gauges or metric.type_ != "gauge"
+    }
+
+
+def write_file_atomically(path: Path, data: str) -> None:
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_text(data)
+    os.replace(tmp_path, path)  # читатели не увидят наполовину записанный файл
+
+
+async def write_snapshot(directory: Path, with_gauges: bool = True) -> None:
+    # снимок берется в потоке event loop, чтобы метрики не менялись во время обхода
+    data = json.dumps(take_snapshot(with_gauges))
+    await asyncio.to_thread(write_file_atomically, directory / f"{os.getpid()}.json", data)
+
+
+def is_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def read_snapshots(directory: Path) -> list[dict[str, Any]]:
+    snapshots = []
+    for path in directory.glob("*.json"):
+        try:
+            snapshot = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue
+        if path.stem.isdigit() and not is_alive(int(path.stem)):
+            # счетчики завершившегося воркера остаются в сумме, а его мгновенные значения уже неверны
+            snapshot = {name: metric for name, metric in snapshot.items() if metric["type"] != "gauge"}
+        snapshots.append(snapshot)
+    return snapshots
+
+
+def merge_snapshots(snapshots: list[dict[str, Any]]) -> dict[str, Any]:
+    merged: dict[str, Any] = {}
+    for snapshot in snapshots:
+        for name, metric in snapshot.items():
+            target = merged.setdefault(name, metric | {"samples": {}})
+            for labels, value in metric["samples"]:
+                merge_sample(target, labels, value)
+    return merged
+
+
+def merge_sample(target: dict[str, Any], labels: list[str], value: Any) -> None:
+    # у гистограммы значение - счетчики корзин и сумма, они складываются поэлементно
+    key = tuple(labels)
+    if isinstance(value, list):
+        previous = target["samples"].get(key, [0] * len(value))
+        target["samples"][key] = [a + b for a, b in zip(previous, value)]
+    else:
+        target["samples"][key] = target["samples"].get(key, 0) + value
+
+
+def escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(labelnames: list[str], labels: Labels, extra: str = "") -> str:
+    pairs = [f'{name}="{escape_label_value(value)}"' for name, value in zip(labelnames, labels)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def render_metrics(metrics: dict[str, Any]) -> str:
+    """Render merged snapshot in Prometheus text exposition format."""
+    lines = []
+    for name, metric in sorted(metrics.items()):
+        lines.append(f"# HELP {name} {metric['documentation']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        labelnames = metric["labelnames"]
+        for labels, value in sorted(metric["samples"].items()):
+            if metric["type"] == "histogram":
+                lines.extend(render_histogram(name, labelnames, labels, value, metric["buckets"]))
+            else:
+                lines.append(f"{name}{format_labels(labelnames, labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def render_histogram(
+    name: str,
+    labelnames: list[str],
+    labels: Labels,
+    value: list[Any],
+    buckets: list[float],
+) -> list[str]:
+    """Render cumulative buckets, sum and count, value holds count of each bucket and sum last."""
+    lines = []
+    cumulative = 0
+    bounds = [str(bound) for bound in buckets] + ["+Inf"]
+    for bound, count in zip(bounds, value):
+        cumulative += count
+        le = f'le="{bound}"'
+        lines.append(f"{name}_bucket{format_labels(labelnames, labels, le)} {cumulative}")
+    lines.append(f"{name}_sum{format_labels(labelnames, labels)} {value[-1]}")
+    lines.append(f"{name}_count{format_labels(labelnames, labels)} {cumulative}")
+    return lines
+
+
+async def collect_metrics(directory: Path | None) -> str:
+    if directory is None:
+        return render_metrics(merge_snapshots([take_snapshot()]))
+    await write_snapshot(directory)
+    snapshots = await asyncio.to_thread(read_snapshots, directory)
+    return render_metrics(merge_snapshots(snapshots))
+
+
+def clear_snapshots(directory: Path) -> None:
+    """Remove snapshots of previous server runs, otherwise their counters are added to the new ones."""
+    directory.mkdir(parents=True, exist_ok=True)
+    for path in (*directory.glob("*.json"), *directory.glob("*.tmp")):
+        path.unlink(missing_ok=True)
+
+
+async def flush_periodically(directory: Path, interval: float) -> None:
+    """Write snapshot of worker metrics for other workers serving /metrics."""
+    while True:
+        await asyncio.sleep(interval)
+        await write_snapshot(directory)
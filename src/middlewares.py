@@ -1,49 +1,79 @@
 import re
 import time
-from typing import Callable
 
-from fastapi import Request, Response  # , HTTPException
+from database import env_settings
 from fastapi.middleware.cors import CORSMiddleware
-from starlette.middleware.base import BaseHTTPMiddleware
+from metrics import MetricsMiddleware
+from request_profiling import ProfilingMiddleware
+from response_compression import CompressionMiddleware
 # from starlette.middleware.httpsredirect import HTTPSRedirectMiddleware
 # from starlette.middleware.trustedhost import TrustedHostMiddleware
+from starlette.datastructures import MutableHeaders
 from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 
-async def check_name_format(request: Request, call_next: Callable) -> Response:
-    path_parts = request.scope["path"].split("/")
-    if path_parts[-2] == "hello":
-        if not re.match("^[a-zA-Zа-яА-Я]{2,30}$", path_parts[-1]):
-            # print('Catch in check_name_format middleware')
-            return JSONResponse(
-                status_code=400,
-                content={"detail": "Name must be in regex ^[a-zA-Zа-яА-Я]{2,30}$"},
-            )
+NAME_PATTERN = re.compile("^[a-zA-Zа-яА-Я]{2,30}$")
 
-            # this make traceback and 500
-            # raise HTTPException(
-            #     status_code=400,
-            #     detail={"message": "Name must be in regex ^[a-zA-Zа-яА-Я]{2,30}$"},
-            # )
-    response = await call_next(request)
-    return response
+
+# Мидлвари написаны на чистом ASGI, а не через BaseHTTPMiddleware:
+# нет лишней задачи и очереди на каждый запрос, потоковые ответы не буферизуются.
+class NameFormatMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http":
+            path_parts = scope["path"].split("/")
+            if path_parts[-2] == "hello" and not NAME_PATTERN.match(path_parts[-1]):
+                response = JSONResponse(
+                    status_code=400,
+                    content={"detail": f"Name must be in regex {NAME_PATTERN.pattern}"},
+                )
+                await response(scope, receive, send)
+                return
+
+                # this make traceback and 500
+                # raise HTTPException(
+                #     status_code=400,
+                #     detail={"message": "Name must be in regex ^[a-zA-Zа-яА-Я]{2,30}$"},
+                # )
+        await self.app(scope, receive, send)
 
 
 # must be as first middleware
-async def add_process_time_header(request: Request, call_next: Callable) -> Response:
-    start_time = time.perf_counter()
-    # print('Its in process_time_header request')
-    response = await call_next(request)
-    # print('Its in process_time_header response')
-    process_time = time.perf_counter() - start_time
-    response.headers["X-Process-Time"] = str(process_time)
-    response.headers["X-Root-Path"] = request.scope.get("root_path")
-    return response
+class ProcessTimeHeaderMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start_time = time.perf_counter()
+
+        async def send_with_process_time(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                # время до начала ответа, как и раньше: тело потокового ответа еще не отправлено
+                headers = MutableHeaders(scope=message)
+                headers["X-Process-Time"] = str(time.perf_counter() - start_time)
+                headers["X-Root-Path"] = scope.get("root_path", "")
+            await send(message)
+
+        await self.app(scope, receive, send_with_process_time)
 
 
 middlewares = [
     # (class, arguments for init, params)
-    (BaseHTTPMiddleware, (), {"dispatch": add_process_time_header}),
+    (MetricsMiddleware, (), {}),
+    (ProfilingMiddleware, (), {}),
+    (ProcessTimeHeaderMiddleware, (), {}),
+    (CompressionMiddleware, (), {
+        "minimum_size": env_settings.COMPRESSION.MIN_SIZE,
+        "compress_level": env_settings.COMPRESSION.LEVEL,
+        "thread_min_size": env_settings.COMPRESSION.THREAD_MIN_SIZE,
+    }),
     # (HTTPSRedirectMiddleware, (), {}),
     # (TrustedHostMiddleware, (), {"allowed_hosts": ["127.0.0.1", ]}),  # , "*.example.com", "localhost"])
     (CORSMiddleware, (), {
@@ -52,17 +82,23 @@ middlewares = [
         "allow_methods": ["POST"],  # "GET",
         "allow_headers": ["*"],
     }),
-    (BaseHTTPMiddleware, (), {"dispatch": check_name_format}),
+    (NameFormatMiddleware, (), {}),
 ]
 
 
-class CustomMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
+class CustomMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
         # Pre-processing logic
         # e.g., Authentication, Logging, Metrics
         # print('Its in CustomMiddleware request')
-        response = await call_next(request)
-        # Post-processing logic
-        # e.g., Error Handling, Response Transformation
-        # print('Its in CustomMiddleware response')
-        return response
+
+        async def send_wrapper(message: Message) -> None:
+            # Post-processing logic
+            # e.g., Error Handling, Response Transformation
+            # print('Its in CustomMiddleware response')
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
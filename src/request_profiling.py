@@ -0,0 +1,165 @@
+import asyncio
+import cProfile
+import heapq
+import hmac
+import io
+import itertools
+import pstats
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+from urllib.parse import parse_qs
+
+from database import env_settings
+from fastapi import Header, HTTPException, status
+from starlette.datastructures import MutableHeaders
+from starlette.responses import PlainTextResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+settings = env_settings.PROFILING
+
+# (длительность, номер, профиль) - на вершине кучи самый быстрый из сохраненных профилей
+slowest_profiles: list[tuple[float, int, dict[str, Any]]] = []
+_profile_counter = itertools.count(1)
+_request_counter = itertools.count(1)
+
+
+def format_profile(profiler: cProfile.Profile) -> str:
+    stream = io.StringIO()
+    pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(settings.TOP_FUNCTIONS)
+    return stream.getvalue()
+
+
+def make_profile_path(scope: Scope) -> Path:
+    timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+    name = scope["path"].strip("/").replace("/", "_") or "root"
+    return (settings.DIR or Path(".")) / f"{timestamp}-{scope['method']}-{name}.prof"
+
+
+def save_profile(profiler: cProfile.Profile, path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    profiler.dump_stats(path)
+
+
+def keep_if_slow(profiler: cProfile.Profile, scope: Scope, duration: float, status_code: int) -> None:
+    if len(slowest_profiles) >= settings.SLOWEST_KEPT and duration <= slowest_profiles[0][0]:
+        return  # сводку не строим, если профиль все равно не попадет в буфер
+    record = {
+        "time": datetime.now(timezone.utc).isoformat(),
+        "method": scope["method"],
+        "path": scope["path"],
+        "status": status_code,
+        "duration": duration,
+        "summary": format_profile(profiler),
+    }
+    heapq.heappush(slowest_profiles, (duration, next(_profile_counter), record))
+    if len(slowest_profiles) > settings.SLOWEST_KEPT:
+        heapq.heappop(slowest_profiles)
+
+
+def token_matches(token: str) -> bool:
+    # compare_digest принимает только ASCII строки, байты сравниваются для любого токена
+    return bool(settings.TOKEN) and hmac.compare_digest(token.encode(), settings.TOKEN.encode())
+
+
+def requested_output(scope: Scope) -> str | None:
+    """Return output mode of on-demand profiling if request asks for it with the right token."""
+    if not settings.TOKEN:
+        return None
+    headers = dict(scope["headers"])
+    query = parse_qs(scope["query_string"].decode("latin-1"))
+    token = headers.get(b"x-profile", b"").decode("latin-1") or query.get("profile", [""])[0]
+    if not token or not token_matches(token):
+        return None
+    output = headers.get(b"x-profile-output", b"").decode("latin-1") or query.get("profile_output", [""])[0]
+    return output or ("file" if settings.DIR else "inline")
+
+
+class ProfilingMiddleware:
+    """Profile single requests on demand and every N-th request in background.
+
+    cProfile can not be enabled twice in one thread, so while one request is profiled
+    other requests are not. Call tree may also contain work of concurrent requests,
+    as they run in the same event loop.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        self.busy = False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or self.busy:
+            await self.app(scope, receive, send)
+            return
+        output, sampled = self.choose_mode(scope)
+        if output is None and not sampled:
+            await self.app(scope, receive, send)
+            return
+
+        profile_path = make_profile_path(scope)
+        profiler, response_status, duration = await self.run_profiled(scope, receive, send, output, profile_path)
+        await self.output_profile(profiler, output, profile_path, response_status, scope, receive, send)
+        if sampled:
+            keep_if_slow(profiler, scope, duration, response_status)
+
+    @staticmethod
+    def choose_mode(scope: Scope) -> tuple[str | None, bool]:
+        """Return output mode requested for on-demand profiling and whether request is sampled."""
+        output = requested_output(scope)
+        sampled = bool(settings.SAMPLE_RATE) and next(_request_counter) % settings.SAMPLE_RATE == 0
+        return output, sampled
+
+    async def run_profiled(
+        self,
+        scope: Scope,
+        receive: Receive,
+        send: Send,
+        output: str | None,
+        profile_path: Path,
+    ) -> tuple[cProfile.Profile, int, float]:
+        """Run request under profiler, return profiler, response status and duration."""
+        response_status = 500
+
+        async def send_profiled(message: Message) -> None:
+            nonlocal response_status
+            if message["type"] == "http.response.start":
+                response_status = message["status"]
+                if output == "file":
+                    MutableHeaders(scope=message)["X-Profile-File"] = profile_path.name
+            if output != "inline":  # при выводе в ответ исходный ответ заменяется сводкой профиля
+                await send(message)
+
+        profiler = cProfile.Profile()
+        self.busy = True
+        start_time = time.perf_counter()
+        profiler.enable()
+        try:
+            await self.app(scope, receive, send_profiled)
+        finally:
+            profiler.disable()
+            self.busy = False
+        return profiler, response_status, time.perf_counter() - start_time
+
+    @staticmethod
+    async def output_profile(
+        profiler: cProfile.Profile,
+        output: str | None,
+        profile_path: Path,
+        response_status: int,
+        scope: Scope,
+        receive: Receive,
+        send: Send,
+    ) -> None:
+        if output == "file":
+            await asyncio.to_thread(save_profile, profiler, profile_path)
+        elif output == "inline":
+            summary = format_profile(profiler)
+            response = PlainTextResponse(summary, headers={"X-Profiled-Status": str(response_status)})
+            await response(scope, receive, send)
+
+
+async def verify_profiling_token(x_profile_token: str = Header()) -> None:  # noqa B008
+    if not token_matches(x_profile_token):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="X-Profile-Token header invalid")
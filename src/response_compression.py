@@ -0,0 +1,178 @@
+import asyncio
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+# уже сжатые форматы, повторное сжатие только тратит CPU
+SKIPPED_TYPES = (
+    "image/png",
+    "image/jpeg",
+    "image/gif",
+    "image/webp",
+    "image/avif",
+    "video/",
+    "audio/",
+    "font/woff",
+    "application/zip",
+    "application/gzip",
+    "application/x-gzip",
+    "application/x-7z-compressed",
+    "application/x-rar-compressed",
+    "application/octet-stream",
+)
+GZIP_WBITS = zlib.MAX_WBITS | 16
+SKIPPED_STATUSES = {204, 206, 304}
+
+
+def parse_quality(params: list[str]) -> float:
+    """Return q parameter of Accept-Encoding item, invalid value makes coding not acceptable."""
+    for param in params:
+        name, _, value = param.partition("=")
+        if name.strip() == "q":
+            try:
+                return float(value)
+            except ValueError:
+                return 0
+    return 1.0
+
+
+def coding_qualities(accept_encoding: str) -> dict[str, float]:
+    qualities = {}
+    for item in accept_encoding.lower().split(","):
+        coding, *params = (part.strip() for part in item.split(";"))
+        qualities[coding] = parse_quality(params)
+    return qualities
+
+
+def accepts_gzip(accept_encoding: str) -> bool:
+    """Check Accept-Encoding header for gzip or *, coding with q=0 is not acceptable."""
+    qualities = coding_qualities(accept_encoding)
+    return qualities.get("gzip", qualities.get("*", 0)) > 0
+
+
+class CompressionMiddleware:
+    """Compress responses with gzip if client accepts it, chunk by chunk without buffering the whole body.
+
+    Bodies smaller than minimum_size, responses with Content-Encoding and skipped content types are sent as is.
+    Each chunk of streaming response is flushed, so client receives it without waiting for the next one.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        compress_level: int = 6,
+        thread_min_size: int = 256 * 1024,
+        skipped_types: tuple[str, ...] = SKIPPED_TYPES,
+    ) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.compress_level = compress_level
+        self.thread_min_size = thread_min_size
+        self.skipped_types = skipped_types
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+        responder = CompressionResponder(self, send, accepts_gzip(Headers(scope=scope).get("accept-encoding", "")))
+        await self.app(scope, receive, responder.send)
+
+
+class CompressionResponder:
+    def __init__(self, middleware: CompressionMiddleware, send: Send, accepts_gzip: bool) -> None:
+        self.middleware = middleware
+        self._send = send
+        self.accepts_gzip = accepts_gzip
+        self.start_message: Message | None = None
+        self.compressor: "zlib._Compress | None" = None
+        self.passthrough = False
+
+    def is_compressible(self, headers: Headers, status_code: int) -> bool:
+        content_type = headers.get("content-type", "")
+        return (
+            status_code not in SKIPPED_STATUSES
+            and bool(content_type)
+            and not content_type.startswith(self.middleware.skipped_types)
+            and "content-encoding" not in headers
+            and "content-range" not in headers
+            and "no-transform" not in headers.get("cache-control", "")
+        )
+
+    async def send(self, message: Message) -> None:
+        if self.passthrough:
+            await self._send(message)
+        elif message["type"] == "http.response.start":
+            await self.start(message)
+        elif message["type"] == "http.response.body" and self.compressor is None:
+            await self.first_body(message)
+        elif message["type"] == "http.response.body":
+            await self.next_body(message)
+        else:
+            await self._send(message)
+
+    async def next_body(self, message: Message) -> None:
+        more_body = message.get("more_body", False)
+        body = await self.compress(message.get("body", b""), finish=not more_body)
+        if body or not more_body:
+            await self._send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+    async def start(self, message: Message) -> None:
+        headers = Headers(raw=message["headers"])
+        if not self.is_compressible(headers, message["status"]):
+            self.passthrough = True
+            await self._send(message)
+            return
+        # ответ может сжиматься для других клиентов, кэши должны различать варианты
+        MutableHeaders(scope=message).add_vary_header("Accept-Encoding")
+        content_length = headers.get("content-length", "")
+        if not self.accepts_gzip or (content_length.isdigit() and int(content_length) < self.middleware.minimum_size):
+            self.passthrough = True
+            await self._send(message)
+            return
+        # решение откладывается до первого блока тела: по нему видно, маленький ли ответ целиком
+        self.start_message = message
+
+    async def first_body(self, message: Message) -> None:
+        assert self.start_message is not None
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if not more_body and len(body) < self.middleware.minimum_size:
+            self.passthrough = True
+            await self._send(self.start_message)
+            await self._send(message)
+            return
+
+        self.compressor = zlib.compressobj(self.middleware.compress_level, zlib.DEFLATED, GZIP_WBITS)
+        body = await self.compress(body, finish=not more_body)
+        self.set_gzip_headers(None if more_body else len(body))
+        await self._send(self.start_message)
+        await self._send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+    def set_gzip_headers(self, content_length: int | None) -> None:
+        assert self.start_message is not None
+        headers = MutableHeaders(scope=self.start_message)
+        headers["Content-Encoding"] = "gzip"
+        # диапазоны байтов относятся к несжатому телу, а сжатое представление уже не совпадает побайтно
+        for name in ("content-length", "accept-ranges"):
+            if name in headers:
+                del headers[name]
+        if content_length is not None:
+            headers["Content-Length"] = str(content_length)
+        etag = headers.get("etag")
+        if etag and not etag.startswith("W/"):
+            headers["ETag"] = f"W/{etag}"
+
+    async def compress(self, data: bytes, finish: bool) -> bytes:
+        if not data and not finish:
+            return b""
+        if len(data) >= self.middleware.thread_min_size:
+            # zlib отпускает GIL, большой блок сжимается в потоке и не останавливает цикл событий
+            return await asyncio.to_thread(self.compress_chunk, data, finish)
+        return self.compress_chunk(data, finish)
+
+    def compress_chunk(self, data: bytes, finish: bool) -> bytes:
+        assert self.compressor is not None
+        return self.compressor.compress(data) + self.compressor.flush(zlib.Z_FINISH if finish else zlib.Z_SYNC_FLUSH)
@@ -0,0 +1,40 @@
+import json
+from typing import Any
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+from pydantic import BaseModel
+
+
+try:
+    import orjson
+except ImportError:  # orjson ставится отдельно: poetry install --extras fast-json
+    orjson = None  # type: ignore[assignment]
+
+
+def default(value: Any) -> Any:
+    # сюда попадают только значения, которые сериализатор не знает сам, обычно модели Pydantic
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    return jsonable_encoder(value)
+
+
+def dumps(value: Any) -> bytes:
+    """Serialize value to JSON, Pydantic models and other types unknown to the serializer are converted on the way."""
+    if orjson is not None:
+        return orjson.dumps(value, default=default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(value, default=default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def default_response_class(fast_json: bool) -> type[JSONResponse]:
+    """Return ORJSONResponse if fast JSON responses are enabled, else JSONResponse.
+
+    FastAPI converts route results to JSON-compatible data before rendering: by Pydantic serialization
+    with response_model or return annotation, by jsonable_encoder without them. So orjson speeds up
+    only the final encoding to bytes.
+    """
+    if not fast_json:
+        return JSONResponse
+    if orjson is None:
+        raise RuntimeError("FAST_JSON_RESPONSES requires orjson: poetry install --extras fast-json")
+    return ORJSONResponse
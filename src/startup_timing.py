@@ -0,0 +1,34 @@
+"""Durations of worker startup stages, they are logged after startup and returned by /service/startup.
+
+The module is imported first in main.py, so the "imports" stage covers import of the app with its dependencies.
+"""
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+
+STARTED = time.perf_counter()
+stages: dict[str, float] = {}
+_last_mark = STARTED
+
+
+def mark(stage: str) -> None:
+    """Record time since the previous mark as duration of sequential stage."""
+    global _last_mark
+    now = time.perf_counter()
+    stages[stage] = now - _last_mark
+    _last_mark = now
+
+
+@contextmanager
+def measure(stage: str) -> Iterator[None]:
+    """Record duration of stage running in background, in parallel with others."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stages[stage] = time.perf_counter() - start
+
+
+def format_stages() -> str:
+    return ", ".join(f"{stage} {duration * 1000:.0f}ms" for stage, duration in stages.items())
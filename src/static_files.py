@@ -0,0 +1,267 @@
+"""Static files with gzip variants, strong ETags and in-memory cache of small hot files.
+
+Gzip variants can be built ahead of time, from repository root: python src/static_files.py static
+"""
+import argparse
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import stat
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from email.utils import formatdate
+from pathlib import Path
+
+import anyio
+from files import is_not_modified
+from response_compression import accepts_gzip
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, PathLike, StaticFiles
+from starlette.types import Scope
+
+
+# имя с хэшем содержимого, например app.3f2a9c1b.js или logo-3f2a9c1b.png, при изменении файла меняется и имя;
+# в хэше должна быть буква, иначе за него сошла бы дата, как в report-20241018.csv
+FINGERPRINT_PATTERN = re.compile(r"[.-](?=[0-9]*[a-f])[0-9a-f]{8,}\.[^/]+$")
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "public, no-cache"
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/javascript",
+    "application/json",
+    "application/manifest+json",
+    "application/xml",
+    "application/wasm",
+    "image/svg+xml",
+)
+GZIP_SUFFIX = ".gz"
+GZIP_LEVEL = 9
+
+
+def guess_media_type(path: str) -> str:
+    return mimetypes.guess_type(path)[0] or "text/plain"
+
+
+def is_compressible(media_type: str) -> bool:
+    return media_type.startswith(COMPRESSIBLE_TYPES)
+
+
+def cache_control(path: str) -> str:
+    return IMMUTABLE_CACHE_CONTROL if FINGERPRINT_PATTERN.search(path) else REVALIDATE_CACHE_CONTROL
+
+
+def gzip_variant(full_path: str, stat_result: os.stat_result) -> str | None:
+    """Return path of prebuilt .gz file if it is not older than the original."""
+    gzip_path = full_path + GZIP_SUFFIX
+    try:
+        return gzip_path if os.stat(gzip_path).st_mtime_ns >= stat_result.st_mtime_ns else None
+    except OSError:
+        return None
+
+
+def precompress_file(full_path: str, min_size: int) -> bool:
+    """Write .gz variant of compressible file if it has no fresh one and gzip makes it smaller."""
+    if full_path.endswith(GZIP_SUFFIX) or not is_compressible(guess_media_type(full_path)):
+        return False
+    stat_result = os.stat(full_path)
+    if stat_result.st_size < min_size or gzip_variant(full_path, stat_result):
+        return False
+    with open(full_path, "rb") as file:
+        compressed = gzip.compress(file.read(), compresslevel=GZIP_LEVEL, mtime=0)
+    if len(compressed) >= stat_result.st_size:
+        return False
+    with open(full_path + GZIP_SUFFIX, "wb") as file:
+        file.write(compressed)
+    return True
+
+
+def precompress(directory: Path, min_size: int) -> int:
+    """Write .gz variant next to each compressible file which has no fresh one, return number of written files."""
+    return sum(
+        precompress_file(os.path.join(dir_path, file_name), min_size)
+        for dir_path, _, file_names in os.walk(directory)
+        for file_name in file_names
+    )
+
+
+@dataclass
+class CachedFile:
+    full_path: str
+    mtime_ns: int
+    size: int
+    media_type: str
+    etag: str
+    last_modified: str
+    body: bytes
+    gzip_body: bytes | None
+    checked_at: float
+
+    @property
+    def memory_size(self) -> int:
+        return len(self.body) + len(self.gzip_body or b"")
+
+
+def load_file(full_path: str, stat_result: os.stat_result, media_type: str, gzip_min_size: int) -> CachedFile:
+    with open(full_path, "rb") as file:
+        body = file.read()
+    gzip_body = None
+    if is_compressible(media_type) and len(body) >= gzip_min_size:
+        gzip_path = gzip_variant(full_path, stat_result)
+        if gzip_path is not None:
+            with open(gzip_path, "rb") as file:
+                gzip_body = file.read()
+        else:
+            gzip_body = gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+        if len(gzip_body) >= len(body):
+            gzip_body = None
+    return CachedFile(
+        full_path=full_path,
+        mtime_ns=stat_result.st_mtime_ns,
+        size=stat_result.st_size,
+        media_type=media_type,
+        # ETag по содержимому одинаков на всех воркерах и серверах, в отличие от mtime
+        etag=f'"{hashlib.sha256(body).hexdigest()[:32]}"',
+        last_modified=formatdate(stat_result.st_mtime, usegmt=True),
+        body=body,
+        gzip_body=gzip_body,
+        checked_at=time.monotonic(),
+    )
+
+
+class CachedStaticFiles(StaticFiles):
+    """StaticFiles which keep small files in memory with their gzip variant and send them without disk access.
+
+    Files larger than max_cached_file_size are sent from disk, prebuilt .gz variant is used if it exists.
+    Cached files are checked for changes not more often than revalidate_interval seconds.
+    """
+
+    def __init__(
+        self,
+        *,
+        directory: PathLike | None = None,
+        memory_cache_size: int,
+        max_cached_file_size: int,
+        gzip_min_size: int,
+        revalidate_interval: float,
+        check_dir: bool = True,
+    ) -> None:
+        super().__init__(directory=directory, check_dir=check_dir)
+        self.memory_cache_size = memory_cache_size
+        self.max_cached_file_size = max_cached_file_size
+        self.gzip_min_size = gzip_min_size
+        self.revalidate_interval = revalidate_interval
+        self.cache: OrderedDict[str, CachedFile] = OrderedDict()
+        self.cached_bytes = 0
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        if scope["method"] not in ("GET", "HEAD"):
+            return await super().get_response(path, scope)
+        cached = self.fresh_cached(path)
+        if cached is not None:
+            return self.cached_response(path, cached, scope)
+
+        full_path, stat_result = await self.lookup_file(path)
+        if stat_result is None or not stat.S_ISREG(stat_result.st_mode):
+            # каталоги, html режим и ошибки доступа обрабатывает StaticFiles
+            self.forget(path)
+            return await super().get_response(path, scope)
+        if stat_result.st_size > self.max_cached_file_size:
+            self.forget(path)
+            return await self.disk_response(path, full_path, stat_result, scope)
+        cached = await self.load_cached(path, full_path, stat_result)
+        return self.cached_response(path, cached, scope)
+
+    def fresh_cached(self, path: str) -> CachedFile | None:
+        """Return cached file checked not earlier than revalidate_interval seconds ago."""
+        cached = self.cache.get(path)
+        if cached is None or time.monotonic() - cached.checked_at >= self.revalidate_interval:
+            return None
+        self.cache.move_to_end(path)
+        return cached
+
+    async def lookup_file(self, path: str) -> tuple[str, os.stat_result | None]:
+        try:
+            return await anyio.to_thread.run_sync(self.lookup_path, path)
+        except OSError:
+            return "", None
+
+    async def load_cached(self, path: str, full_path: str, stat_result: os.stat_result) -> CachedFile:
+        """Return cached file if it is unchanged on disk, otherwise read it again and remember."""
+        cached = self.cache.get(path)
+        if cached is not None and (cached.full_path, cached.mtime_ns, cached.size) == (
+            full_path, stat_result.st_mtime_ns, stat_result.st_size,
+        ):
+            cached.checked_at = time.monotonic()
+            self.cache.move_to_end(path)
+            return cached
+        cached = await anyio.to_thread.run_sync(
+            load_file, full_path, stat_result, guess_media_type(full_path), self.gzip_min_size,
+        )
+        self.remember(path, cached)
+        return cached
+
+    def remember(self, path: str, cached: CachedFile) -> None:
+        self.forget(path)
+        if cached.memory_size > self.memory_cache_size:
+            return
+        self.cache[path] = cached
+        self.cached_bytes += cached.memory_size
+        while self.cached_bytes > self.memory_cache_size:
+            _, evicted = self.cache.popitem(last=False)
+            self.cached_bytes -= evicted.memory_size
+
+    def forget(self, path: str) -> None:
+        cached = self.cache.pop(path, None)
+        if cached is not None:
+            self.cached_bytes -= cached.memory_size
+
+    @staticmethod
+    def cached_response(path: str, cached: CachedFile, scope: Scope) -> Response:
+        request_headers = Headers(scope=scope)
+        headers = {
+            "cache-control": cache_control(path),
+            "last-modified": cached.last_modified,
+            "etag": cached.etag,
+        }
+        body = cached.body
+        if cached.gzip_body is not None:
+            headers["vary"] = "Accept-Encoding"
+            if accepts_gzip(request_headers.get("accept-encoding", "")):
+                # у сжатого варианта свой ETag, иначе кэши могут отдать его клиенту без поддержки gzip
+                headers["etag"] = cached.etag[:-1] + '-gzip"'
+                headers["content-encoding"] = "gzip"
+                body = cached.gzip_body
+        if is_not_modified(headers, request_headers):
+            return NotModifiedResponse(Headers(headers))
+        headers["content-length"] = str(len(body))
+        if scope["method"] == "HEAD":
+            body = b""
+        return Response(body, media_type=cached.media_type, headers=headers)
+
+    @staticmethod
+    async def disk_response(path: str, full_path: str, stat_result: os.stat_result, scope: Scope) -> Response:
+        request_headers = Headers(scope=scope)
+        headers = {"cache-control": cache_control(path)}
+        media_type = guess_media_type(full_path)
+        if is_compressible(media_type):
+            headers["vary"] = "Accept-Encoding"
+            gzip_path = await anyio.to_thread.run_sync(gzip_variant, full_path, stat_result)
+            if gzip_path is not None and accepts_gzip(request_headers.get("accept-encoding", "")):
+                headers["content-encoding"] = "gzip"
+                full_path, stat_result = gzip_path, await anyio.to_thread.run_sync(os.stat, gzip_path)
+        response = FileResponse(full_path, stat_result=stat_result, media_type=media_type, headers=headers)
+        if is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build gzip variants of static files")
+    parser.add_argument("directory", type=Path)
+    parser.add_argument("--min-size", type=int, default=1024, help="smaller files are not compressed")
+    args = parser.parse_args()
+    print(f"{precompress(args.directory, args.min_size)} gzip files written")
@@ -0,0 +1,196 @@
+import csv
+import io
+import json
+import re
+from collections.abc import AsyncIterable, AsyncIterator, Iterable, Mapping, Sequence
+from typing import Any, TypeVar
+
+
+T = TypeVar("T")
+
+# символы, от которых зависит структура JSON, остальное сканеру можно пропускать целиком
+_JSON_TOKENS = re.compile(rb'["\\\[\]{},]')
+
+
+class StreamFormatError(ValueError):
+    """Тело запроса нельзя разобрать как поток записей."""
+
+
+class NDJSONSplitter:
+    """Инкрементально режет NDJSON-поток на строки, не держа в памяти больше одной строки."""
+
+    def __init__(self, max_record_bytes: int) -> None:
+        self.max_record_bytes = max_record_bytes
+        self._tail = b""
+        self._line_no = 0
+
+    def feed(self, data: bytes) -> list[tuple[int, bytes]]:
+        *lines, self._tail = (self._tail + data).split(b"\n")
+        # длинная строка может прийти целиком в одном куске вместе со своим переводом строки
+        for index, line in enumerate((*lines, self._tail)):
+            if len(line) > self.max_record_bytes:
+                line_no = self._line_no + index + 1
+                raise StreamFormatError(f"Line {line_no} is longer than {self.max_record_bytes} bytes")
+        return [record for line in lines if (record := self._number(line))]
+
+    def close(self) -> list[tuple[int, bytes]]:
+        record = self._number(self._tail)
+        self._tail = b""
+        return [record] if record else []
+
+    def _number(self, line: bytes) -> tuple[int, bytes] | None:
+        self._line_no += 1
+        line = line.strip()
+        return (self._line_no, line) if line else None
+
+
+class JsonArraySplitter:
+    """Инкрементально режет JSON-массив верхнего уровня на сырые элементы.
+
+    Элементы не разбираются, только находятся их границы, поэтому в памяти хранится
+    не больше одного элемента. Номер записи - позиция элемента в массиве, начиная с 1.
+    """
+
+    def __init__(self, max_record_bytes: int) -> None:
+        self.max_record_bytes = max_record_bytes
+        self._depth = 0  # 0 - до '[', 1 - внутри массива, больше - внутри элемента
+        self._in_string = False
+        self._skip_first = False  # экранирующий '\' пришел последним байтом прошлого куска
+        self._finished = False
+        self._count = 0
+        self._item = bytearray()
+        self._start = 0
+
+    def feed(self, data: bytes) -> list[tuple[int, bytes]]:
+        records: list[tuple[int, bytes]] = []
+        self._start = 0  # начало еще не сохраненной части текущего элемента
+        skip_until = int(self._skip_first)
+        self._skip_first = False
+        for match in _JSON_TOKENS.finditer(data):
+            pos = match.start()
+            if pos < skip_until:
+                continue
+            if self._in_string:
+                skip_until = self._scan_string(match.group(), pos, len(data))
+            elif record := self._scan_token(match.group(), data, pos):
+                records.append(record)
+        self._keep_tail(data[self._start:])
+        return records
+
+    def close(self) -> list[tuple[int, bytes]]:
+        if not self._finished:
+            raise StreamFormatError("JSON array is not terminated")
+        return []
+
+    def _scan_string(self, token: bytes, pos: int, size: int) -> int:
+        """Обрабатывает токен внутри строки, возвращает позицию, до которой байты экранированы."""
+        if token == b"\\":
+            # экранированный байт может прийти уже в следующем куске
+            self._skip_first = pos + 2 > size
+            return pos + 2
+        if token == b'"':
+            self._in_string = False
+        return 0
+
+    def _scan_token(self, token: bytes, data: bytes, pos: int) -> tuple[int, bytes] | None:
+        if self._depth == 0 or self._finished:
+            self._open_array(token, data, pos)
+        elif token == b'"':
+            self._in_string = True
+        elif self._depth > 1 or token in (b"{", b"["):
+            self._scan_nested(token)
+        else:
+            return self._close_item(token, data, pos)
+        return None
+
+    def _open_array(self, token: bytes, data: bytes, pos: int) -> None:
+        self._check_blank(data[self._start:pos])
+        if self._finished or token != b"[":
+            raise StreamFormatError("Body must be a single JSON array")
+        self._depth, self._start = 1, pos + 1
+
+    def _scan_nested(self, token: bytes) -> None:
+        if token in (b"{", b"["):
+            self._depth += 1
+        elif token in (b"}", b"]"):
+            self._depth -= 1
+
+    def _close_item(self, token: bytes, data: bytes, pos: int) -> tuple[int, bytes] | None:
+        # ',' или ']' верхнего уровня закрывают элемент
+        if token == b"}":
+            raise StreamFormatError(f"Unexpected '}}' after element {self._count}")
+        self._item += data[self._start:pos]
+        self._start = pos + 1
+        return self._pop_item(last=token == b"]")
+
+    def _keep_tail(self, tail: bytes) -> None:
+        if self._depth == 0 or self._finished:
+            self._check_blank(tail)
+            return
+        self._item += tail
+        if len(self._item) > self.max_record_bytes:
+            raise StreamFormatError(f"Element {self._count + 1} is longer than {self.max_record_bytes} bytes")
+
+    def _pop_item(self, last: bool) -> tuple[int, bytes] | None:
+        item = bytes(self._item).strip()
+        self._item.clear()
+        self._finished = last
+        if not item:
+            if last and not self._count:  # пустой массив
+                return None
+            raise StreamFormatError(f"Empty element after element {self._count}")
+        self._count += 1
+        return self._count, item
+
+    @staticmethod
+    def _check_blank(data: bytes) -> None:
+        if data.strip():
+            raise StreamFormatError("Body must be a single JSON array")
+
+
+async def split_stream(
+    chunks: AsyncIterable[bytes],
+    splitter: NDJSONSplitter | JsonArraySplitter,
+) -> AsyncIterator[tuple[int, bytes]]:
+    async for chunk in chunks:
+        for record in splitter.feed(chunk):
+            yield record
+    for record in splitter.close():
+        yield record
+
+
+async def batched(items: AsyncIterable[T], size: int) -> AsyncIterator[list[T]]:
+    batch: list[T] = []
+    async for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def encode_ndjson(rows: Iterable[Mapping[str, Any]]) -> bytes:
+    return "".join(json.dumps(dict(row), ensure_ascii=False) + "\n" for row in rows).encode()
+
+
+class CSVEncoder:
+    """Кодирует строки в CSV по частям, чтобы не собирать весь файл в памяти."""
+
+    def __init__(self, fieldnames: Sequence[str]) -> None:
+        self._buffer = io.StringIO()
+        self._writer = csv.DictWriter(self._buffer, fieldnames=fieldnames, extrasaction="ignore")
+
+    def header(self) -> bytes:
+        self._writer.writeheader()
+        return self._flush()
+
+    def encode(self, rows: Iterable[Mapping[str, Any]]) -> bytes:
+        self._writer.writerows(rows)
+        return self._flush()
+
+    def _flush(self) -> bytes:
+        data = self._buffer.getvalue()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return data.encode()
@@ -1,26 +1,36 @@
 import logging
 from datetime import datetime
 from logging import LogRecord
+from zoneinfo import ZoneInfo
 
-import pytz  # type: ignore[import-untyped]
+
+DEFAULT_DATEFMT = "%Y-%m-%d %H:%M:%S %Z%z"
+MSECS_PLACEHOLDER = "{msecs}"
 
 
 class LocalTimeFormatter(logging.Formatter):
-    """Кастомный форматтер для использования местного времени в логах."""
+    """Кастомный форматтер для использования местного времени в логах.
+
+    Время форматируется один раз в секунду, записи той же секунды берут готовую строку.
+    Место для миллисекунд отмечается в datefmt как {msecs}, например '%H:%M:%S.{msecs} %Z'.
+    """
 
-    def __init__(self, fmt: None = None, datefmt: None = None, tz_name: str = 'UTC') -> None:
+    def __init__(self, fmt: str | None = None, datefmt: str | None = None, tz_name: str = 'UTC') -> None:
         super().__init__(fmt=fmt, datefmt=datefmt)
-        self.local_tz = pytz.timezone(tz_name)
+        self.local_tz = ZoneInfo(tz_name)
+        # (секунда, формат, строка до миллисекунд, строка после них) - кортеж заменяется целиком,
+        # поэтому потоки не увидят частично обновленный кэш
+        self._cached: tuple[int, str | None, str, str | None] = (-1, None, "", None)
 
     def formatTime(self, record: LogRecord, datefmt: str | None = None) -> str:  # noqa N802,
-        # Получаем время записи в UTC
-        utc_dt = datetime.utcfromtimestamp(record.created).replace(tzinfo=pytz.utc)
-        # Конвертируем в местное время
-        local_dt = utc_dt.astimezone(self.local_tz)
-
-        # Форматируем время в соответствии с предоставленным форматом
-        if datefmt:
-            s = local_dt.strftime(datefmt)
-        else:
-            s = local_dt.strftime("%Y-%m-%d %H:%M:%S %Z%z")
-        return s
+        second = int(record.created)
+        cached_second, cached_datefmt, prefix, suffix = self._cached
+        if second != cached_second or datefmt != cached_datefmt:
+            # смещение зоны, в том числе при переходе на летнее время, определяется по самому моменту записи
+            local_dt = datetime.fromtimestamp(second, tz=self.local_tz)
+            prefix, _, rest = local_dt.strftime(datefmt or DEFAULT_DATEFMT).partition(MSECS_PLACEHOLDER)
+            suffix = rest if datefmt and MSECS_PLACEHOLDER in datefmt else None
+            self._cached = (second, datefmt, prefix, suffix)
+        if suffix is None:
+            return prefix
+        return f"{prefix}{int(record.msecs):03d}{suffix}"
@@ -0,0 +1,246 @@
+import asyncio
+import hashlib
+import os
+import uuid
+from collections.abc import AsyncIterator, Awaitable, Callable
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, BinaryIO
+from urllib.parse import parse_qsl
+
+from fastapi import Request
+
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ModuleNotFoundError:  # до версии 0.0.13 пакет импортировался как multipart
+    from multipart.multipart import MultipartParser, parse_options_header  # type: ignore[no-redef, import-untyped]
+
+
+# urlencoded форма целиком держится в памяти, поэтому ее размер ограничен несколькими полями, а не размером запроса
+MAX_URLENCODED_FIELDS = 16
+
+
+class UploadError(ValueError):
+    status_code = 400
+
+
+class UploadTooLargeError(UploadError):
+    status_code = 413
+
+
+@dataclass
+class StoredFile:
+    field_name: str
+    filename: str
+    content_type: str
+    path: Path
+    size: int = 0
+    sha256: str = ""
+    deduplicated: bool = False
+
+    def as_dict(self) -> dict[str, Any]:
+        return asdict(self) | {"path": self.path.name}
+
+
+@dataclass
+class MultipartUpload:
+    files: list[StoredFile] = field(default_factory=list)
+    fields: dict[str, str] = field(default_factory=dict)
+
+    def get_file(self, field_name: str) -> StoredFile:
+        for stored_file in self.files:
+            if stored_file.field_name == field_name:
+                return stored_file
+        raise UploadError(f"File field {field_name} is required")
+
+    def get_field(self, field_name: str) -> str:
+        try:
+            return self.fields[field_name]
+        except KeyError:
+            raise UploadError(f"Form field {field_name} is required") from None
+
+    async def discard(self) -> None:
+        for stored_file in self.files:
+            await asyncio.to_thread(remove_file, stored_file.path)
+
+
+def write_chunk(file: BinaryIO, hasher: Any, data: bytes) -> None:
+    # sha256 отпускает GIL на больших блоках, поэтому хэширование вместе с записью уходит в поток
+    hasher.update(data)
+    file.write(data)
+
+
+class MultipartReceiver:
+    """Read multipart body chunk by chunk and write files to directory without holding them in memory.
+
+    Memory used per request is about one body chunk plus form fields, limited by max_field_size.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        max_file_size: int,
+        max_request_size: int,
+        max_field_size: int,
+    ) -> None:
+        self.directory = directory
+        self.max_file_size = max_file_size
+        self.max_request_size = max_request_size
+        self.max_field_size = max_field_size
+        self.upload = MultipartUpload()
+        self._events: list[tuple[str, bytes]] = []
+        self._header_field = b""
+        self._headers: dict[bytes, bytes] = {}
+        self._file: BinaryIO | None = None
+        self._hasher: Any = None
+        self._field_name = ""
+        self._field_value = bytearray()
+        self._finished = False
+        # события парсера копятся при записи куска тела и обрабатываются по порядку после нее
+        self._handlers: dict[str, Callable[[bytes], Awaitable[None]]] = {
+            "part_begin": self.reset_headers,
+            "header_field": self.add_header_field,
+            "header_value": self.add_header_value,
+            "header_end": self.end_header,
+            "headers_finished": lambda data: self.begin_part(),
+            "part_data": self.write_part_data,
+            "part_end": lambda data: self.end_part(),
+            "end": lambda data: self.finish(),
+        }
+
+    async def receive(self, request: Request) -> MultipartUpload:
+        content_type, params = parse_options_header(request.headers.get("content-type", ""))
+        if content_type != b"multipart/form-data" or b"boundary" not in params:
+            raise UploadError("Content-Type must be multipart/form-data")
+        content_length = request.headers.get("content-length", "")
+        if content_length.isdigit() and int(content_length) > self.max_request_size:
+            raise UploadTooLargeError(f"Request is larger than {self.max_request_size} bytes")
+
+        await asyncio.to_thread(self.directory.mkdir, parents=True, exist_ok=True)
+        parser = MultipartParser(params[b"boundary"], callbacks={
+            "on_part_begin": lambda: self._events.append(("part_begin", b"")),
+            "on_part_data": lambda data, start, end: self._events.append(("part_data", data[start:end])),
+            "on_part_end": lambda: self._events.append(("part_end", b"")),
+            "on_header_field": lambda data, start, end: self._events.append(("header_field", data[start:end])),
+            "on_header_value": lambda data, start, end: self._events.append(("header_value", data[start:end])),
+            "on_header_end": lambda: self._events.append(("header_end", b"")),
+            "on_headers_finished": lambda: self._events.append(("headers_finished", b"")),
+            "on_end": lambda: self._events.append(("end", b"")),
+        })
+        try:
+            await self.parse_body(request, parser)
+        except BaseException:
+            await self.cleanup()
+            raise
+        return self.upload
+
+    async def parse_body(self, request: Request, parser: MultipartParser) -> None:
+        received = 0
+        async for chunk in self.body_chunks(request):
+            received += len(chunk)
+            if received > self.max_request_size:
+                raise UploadTooLargeError(f"Request is larger than {self.max_request_size} bytes")
+            parser.write(chunk)
+            await self.handle_events()
+        parser.finalize()
+        await self.handle_events()
+        if not self._finished:
+            # оборванное тело: последняя часть не дописана, ее хэш и размер неверны
+            raise UploadError("Request body ended before closing boundary")
+
+    async def receive_urlencoded(self, request: Request) -> MultipartUpload:
+        """Read urlencoded form, it has only fields, e.g. when all files are referenced by hashes."""
+        max_size = min(self.max_request_size, self.max_field_size * MAX_URLENCODED_FIELDS)
+        content_length = request.headers.get("content-length", "")
+        if content_length.isdigit() and int(content_length) > max_size:
+            raise UploadTooLargeError(f"Urlencoded form is larger than {max_size} bytes")
+        body = bytearray()
+        async for chunk in self.body_chunks(request):
+            body += chunk
+            if len(body) > max_size:
+                raise UploadTooLargeError(f"Urlencoded form is larger than {max_size} bytes")
+        for name, value in parse_qsl(body.decode("utf-8", errors="replace"), keep_blank_values=True):
+            if len(value) > self.max_field_size:
+                raise UploadTooLargeError(f"Form field {name} is larger than {self.max_field_size} bytes")
+            self.upload.fields[name] = value
+        return self.upload
+
+    @staticmethod
+    async def body_chunks(request: Request) -> AsyncIterator[bytes]:
+        async for chunk in request.stream():
+            if chunk:
+                yield chunk
+
+    async def handle_events(self) -> None:
+        events, self._events = self._events, []
+        for event, data in events:
+            await self._handlers[event](data)
+
+    async def reset_headers(self, data: bytes) -> None:
+        self._header_field, self._headers = b"", {}
+
+    async def add_header_field(self, data: bytes) -> None:
+        self._header_field += data
+
+    async def add_header_value(self, data: bytes) -> None:
+        name = self._header_field.lower()
+        self._headers[name] = self._headers.get(name, b"") + data
+
+    async def end_header(self, data: bytes) -> None:
+        self._header_field = b""
+
+    async def begin_part(self) -> None:
+        disposition, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        if disposition != b"form-data" or b"name" not in options:
+            raise UploadError("Each part must have Content-Disposition form-data header with name")
+        self._field_name = options[b"name"].decode("latin-1")
+        if b"filename" not in options:
+            self._file = None
+            self._field_value = bytearray()
+            return
+        stored_file = StoredFile(
+            field_name=self._field_name,
+            filename=options[b"filename"].decode("utf-8", errors="replace"),
+            content_type=self._headers.get(b"content-type", b"application/octet-stream").decode("latin-1"),
+            path=self.directory / uuid.uuid4().hex,
+        )
+        self.upload.files.append(stored_file)
+        self._file = await asyncio.to_thread(open, stored_file.path, "wb")
+        self._hasher = hashlib.sha256()
+
+    async def write_part_data(self, data: bytes) -> None:
+        if self._file is None:
+            if len(self._field_value) + len(data) > self.max_field_size:
+                raise UploadTooLargeError(f"Form field {self._field_name} is larger than {self.max_field_size} bytes")
+            self._field_value += data
+            return
+        stored_file = self.upload.files[-1]
+        stored_file.size += len(data)
+        if stored_file.size > self.max_file_size:
+            raise UploadTooLargeError(f"File {stored_file.filename} is larger than {self.max_file_size} bytes")
+        await asyncio.to_thread(write_chunk, self._file, self._hasher, data)
+
+    async def end_part(self) -> None:
+        if self._file is None:
+            self.upload.fields[self._field_name] = self._field_value.decode("utf-8", errors="replace")
+            return
+        await asyncio.to_thread(self._file.close)
+        self._file = None
+        self.upload.files[-1].sha256 = self._hasher.hexdigest()
+
+    async def finish(self) -> None:
+        self._finished = True
+
+    async def cleanup(self) -> None:
+        # при ошибке или обрыве соединения уже записанные файлы запроса удаляются
+        if self._file is not None:
+            await asyncio.to_thread(self._file.close)
+        await self.upload.discard()
+
+
+def remove_file(path: Path) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
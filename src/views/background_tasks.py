@@ -1,27 +1,47 @@
-from time import sleep
-from typing import Annotated
+import asyncio
+import logging
+from typing import Annotated, Any
 
-from fastapi import APIRouter, BackgroundTasks
+from database import get_aioredis
+from fastapi import APIRouter, Depends, HTTPException
+from job_queue import JobQueue, job_handler
 from pydantic import EmailStr, Field
+from redis import asyncio as aioredis
 
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
 MessageStr = Annotated[str, Field(min_length=5, max_length=10)]
 
+RedisDep = Annotated[aioredis.Redis, Depends(get_aioredis)]
+
+# уведомления отправляют отдельные процессы: python src/worker.py notifications
+notifications_queue = JobQueue("notifications")
+
 
-# Функция для отправки уведомлений
-def send_notification(email: EmailStr, message: MessageStr) -> None:
-    sleep(5)  # Симуляция долгой операции
-    print(f"Sent email to {email}: {message}")
+# Функция для отправки уведомлений, сообщения одному адресату приходят пачкой и уходят одним письмом
+@job_handler(notifications_queue.name)
+async def send_notifications(email: str, payloads: list[dict[str, Any]]) -> None:
+    await asyncio.sleep(5)  # Симуляция долгой операции
+    logger.info("Sent email to %s: %s", email, "; ".join(payload["message"] for payload in payloads))
 
 
 # Маршрут для отправки уведомлений
 @router.post("/send_notification/")
 async def send_email(
-    background_tasks: BackgroundTasks,
+    redis: RedisDep,
     email: EmailStr,
     message: MessageStr,
 ) -> dict[str, str]:
-    background_tasks.add_task(send_notification, email, message)
-    return {"message": "Notification is being sent in the background"}
+    job_id = await notifications_queue.enqueue(redis, {"message": message}, group=email)
+    return {"message": "Notification is being sent in the background", "job_id": job_id}
+
+
+@router.get("/send_notification/{job_id}")
+async def read_notification_job(redis: RedisDep, job_id: str) -> dict[str, Any]:
+    job = await notifications_queue.get_job(redis, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
@@ -1,6 +1,8 @@
 from typing import Annotated
 
-from fastapi import APIRouter, Path, Query
+from batch_calc import BatchCalcError, BatchOperation, BinaryDtype, calc_binary, calc_json, read_body, run_calc
+from database import env_settings
+from fastapi import APIRouter, HTTPException, Path, Query, Request, Response
 from pydantic import BaseModel
 
 
@@ -33,3 +35,50 @@ def add3(
     b: Annotated[int, Path(ge=0, le=10)],
 ) -> dict[str, int]:
     return {"a": a, "b": b, "sum": a + b}
+
+
+@router.post(
+    "/batch/{operation}",
+    response_class=Response,
+    responses={200: {"content": {
+        "application/json": {"example": {"result": [4, 6]}},
+        "application/octet-stream": {"schema": {"type": "string", "format": "binary"}},
+    }}},
+    openapi_extra={"requestBody": {"required": True, "content": {
+        "application/json": {"schema": {
+            "type": "object",
+            "properties": {
+                "a": {"type": "array", "items": {"type": "number"}},
+                "b": {"type": "array", "items": {"type": "number"}},
+            },
+            "required": ["a", "b"],
+        }},
+        "application/octet-stream": {"schema": {"type": "string", "format": "binary"}},
+    }}},
+)
+async def calc_batch(
+    request: Request,
+    operation: BatchOperation,
+    dtype: BinaryDtype = BinaryDtype.float64,
+) -> Response:
+    """Apply operation elementwise to arrays a and b, the result is returned in the format of request.
+
+    - **application/json**: object with lists a and b, result is object with list result;
+    - **application/octet-stream**: little-endian arrays a and b of dtype one after another,
+      result is little-endian array of dtype given in X-Result-Dtype header.
+    """
+    settings = env_settings.CALC
+    content_type = request.headers.get("content-type", "")
+    try:
+        if content_type.startswith("application/octet-stream"):
+            body = await read_body(request, settings.BATCH_MAX_BODY_SIZE)
+            content, result_dtype = await run_calc(calc_binary, body, operation, dtype, settings.BATCH_MAX_LENGTH)
+            return Response(content, media_type="application/octet-stream", headers={"X-Result-Dtype": result_dtype})
+        if content_type.startswith("application/json"):
+            body = await read_body(request, settings.BATCH_MAX_BODY_SIZE)
+            return Response(
+                await run_calc(calc_json, body, operation, settings.BATCH_MAX_LENGTH), media_type="application/json",
+            )
+    except BatchCalcError as error:
+        raise HTTPException(status_code=error.status_code, detail=str(error)) from None
+    raise HTTPException(status_code=415, detail="Content-Type must be application/json or application/octet-stream")
@@ -1,15 +1,36 @@
+import logging
 from datetime import datetime, time, timedelta
 from typing import Annotated, Any, Generator
 from uuid import UUID
 
-from database import get_aioredis
+from cache import LocalCache, cached
+from database import env_settings, get_aioredis, get_script
 from fastapi import APIRouter, Body, Cookie, Depends, Header, HTTPException, Path, Query
 from pydantic import AfterValidator, BaseModel, Field, HttpUrl
 from redis import Redis  # type: ignore[import-untyped]
 
 
+logger = logging.getLogger(__name__)
+
 fake_items_db = [{"item_name": "Foo"}, {"item_name": "Bar"}, {"item_name": "Baz"}]
 
+# GETDEL появился только в Redis 6.2, а скрипт атомарно забирает и удаляет ключи и на старых версиях
+POP_KEYS_SCRIPT = """
+local values = {}
+for i, key in ipairs(KEYS) do
+    values[i] = redis.call('GET', key)
+    if values[i] then
+        redis.call('DEL', key)
+    end
+end
+return values
+"""
+
+# сами значения лежат в Redis, поэтому перед ним достаточно кэша в памяти воркера
+item_cache = LocalCache("redis_item", max_size=env_settings.CACHE.LOCAL_MAX_SIZE, ttl=env_settings.CACHE.LOCAL_TTL)
+
+RedisKeys = Annotated[list[str], Body(min_length=1, max_length=env_settings.REDIS.BATCH_MAX_KEYS)]
+
 
 router = APIRouter()
 
@@ -113,6 +134,7 @@ async def create_redis_item(item: Item, redis: Redis = Depends(get_aioredis)) ->
     item.name = item.name.strip().title()
     item.description = ((item.description + ", ") * 3).rstrip(", ")
     await redis.set(item.name, item.price)
+    await item_cache.invalidate(redis, item.name)
     return {
         "status": "ok",
         item.name: item.price,
@@ -120,6 +142,7 @@ async def create_redis_item(item: Item, redis: Redis = Depends(get_aioredis)) ->
 
 
 @router.get("/get_redis_item/{item_key}")
+@cached(item_cache, key=lambda item_key, **_: item_key)
 async def get_redis_item(item_key: str, redis: Redis = Depends(get_aioredis)) -> dict[str, Any]:  # noqa B008
     value = await redis.get(item_key)
     if not value:
@@ -132,18 +155,51 @@ async def get_redis_item(item_key: str, redis: Redis = Depends(get_aioredis)) ->
 
 @router.delete("/delete_redis_item/")
 async def pop_redis_item(item_key: str, redis: Redis = Depends(get_aioredis)) -> dict[str, Any]:  # noqa B008
-    value = await redis.get(item_key)
+    [value] = await get_script(redis, POP_KEYS_SCRIPT)(keys=[item_key])
+    await item_cache.invalidate(redis, item_key)
     if not value:
         raise HTTPException(status_code=404, detail=f"Key {item_key} is absent.")
-    print(f"Value for '{item_key}': {value}")
-    await redis.delete(item_key)
-    print(f"Key '{item_key}' has been deleted.")
+    logger.info("Key '%s' with value %s has been deleted.", item_key, value)
     return {
         "status": "delete",
         item_key: value,
     }
 
 
+def split_found_keys(keys: list[str], values: list[Any]) -> dict[str, Any]:
+    return {
+        "items": {key: value for key, value in zip(keys, values) if value is not None},
+        "missing": [key for key, value in zip(keys, values) if value is None],
+    }
+
+
+@router.post("/redis_items/")
+async def create_redis_items(
+    items: Annotated[list[Item], Body(min_length=1, max_length=env_settings.REDIS.BATCH_MAX_KEYS)],
+    redis: Redis = Depends(get_aioredis),  # noqa B008
+) -> dict[str, Any]:
+    prices = {item.name.strip().title(): item.price for item in items}
+    await redis.mset(prices)
+    await item_cache.invalidate(redis, *prices)
+    return {
+        "status": "ok",
+        "items": prices,
+    }
+
+
+@router.post("/redis_items/get/")
+async def get_redis_items(keys: RedisKeys, redis: Redis = Depends(get_aioredis)) -> dict[str, Any]:  # noqa B008
+    values = await redis.mget(keys)
+    return {"status": "ok", **split_found_keys(keys, values)}
+
+
+@router.post("/redis_items/pop/")
+async def pop_redis_items(keys: RedisKeys, redis: Redis = Depends(get_aioredis)) -> dict[str, Any]:  # noqa B008
+    values = await get_script(redis, POP_KEYS_SCRIPT)(keys=keys)
+    await item_cache.invalidate(redis, *keys)
+    return {"status": "delete", **split_found_keys(keys, values)}
+
+
 @router.put("/update/{item_id}")
 async def update_item(
     item_id: Annotated[int, Path(ge=0, le=50)],
@@ -1,15 +1,34 @@
-import os.path
+import asyncio
+import logging
+import stat
 from enum import Enum
 from typing import Annotated, Any
 
+from blob_store import SHA256_PATTERN, BlobStore, parse_content_hashes
+from database import env_settings, get_aioredis
 from exceptions import UnicornError
-from fastapi import APIRouter, Depends, File, Form, Path, Request, Response, UploadFile, status
-from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
+from fastapi import APIRouter, Depends, Form, HTTPException, Path, Query, Request, Response, status
+from fastapi.responses import FileResponse, HTMLResponse, JSONResponse, RedirectResponse
+from files import is_not_modified, list_directory, resolve_in_root
 from pydantic import BaseModel, EmailStr
+from redis import asyncio as aioredis
+from uploads import MultipartReceiver, MultipartUpload, StoredFile, UploadError, remove_file
 
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
+RedisDep = Annotated[aioredis.Redis, Depends(get_aioredis)]
+
+
+def get_blob_store() -> BlobStore:
+    # каталог берется из настроек при каждом запросе, сам BlobStore ничего не открывает
+    return BlobStore(env_settings.UPLOADS.DIR / "blobs")
+
+
+BlobStoreDep = Annotated[BlobStore, Depends(get_blob_store)]
+
 
 @router.get("/hello")
 async def root(request: Request) -> Any:
@@ -27,7 +46,7 @@ async def read_unicorn(
     name: Annotated[str, Path(pattern="^[a-zA-Zа-яА-Я]{2,30}$")],
 ) -> dict[str, str]:
     if not isinstance(name, str):
-        print('Catch in read_unicorn url')
+        logger.warning('Catch in read_unicorn url')
         raise UnicornError(name=name)
     return {"message": f"Hello, {name.title()}"}
 
@@ -100,8 +119,7 @@ def fake_password_hasher(raw_password: str) -> str:
 def fake_save_user(user_in: UserIn) -> UserInDB:
     hashed_password = fake_password_hasher(user_in.password)
     user_in_db = UserInDB(**user_in.model_dump(), hashed_password=hashed_password)
-    print(f"User saved! ..not really, hashed_password: {hashed_password}")
-    print(user_in_db)
+    logger.info("User %s saved! ..not really", user_in_db.username)
     return user_in_db
 
 
@@ -111,15 +129,32 @@ async def create_user(user_in: UserIn) -> UserInDB:
     return user_saved
 
 
-# получение информации из файла
-@router.get("/files/{file_path:path}")
-async def read_file_or_dir(file_path: str) -> dict[str, Any]:
-    if os.path.isfile(file_path):
-        with open(file_path, "r") as f:
-            return {"file_path": file_path, "data": f.read(200)}
-    elif os.path.isdir(file_path):
-        return {"file_path": file_path, "files": os.listdir(file_path)}
-    return {"file_path": file_path, "exists": False}
+# получение файла или страницы содержимого каталога из FILES__ROOT, с диском работаем вне event loop
+@router.get("/files/{file_path:path}", response_model=None)
+async def read_file_or_dir(
+    request: Request,
+    file_path: str,
+    cursor: Annotated[str | None, Query(description="Name of the last entry of the previous page")] = None,
+    limit: Annotated[int, Query(ge=1, le=env_settings.FILES.LIST_MAX_PAGE_SIZE)] = env_settings.FILES.LIST_PAGE_SIZE,
+) -> Response | dict[str, Any]:
+    found = await asyncio.to_thread(resolve_in_root, env_settings.FILES.ROOT, file_path)
+    if found is None:
+        raise HTTPException(status_code=404, detail=f"File {file_path} not found")
+    path, path_stat = found
+    if stat.S_ISDIR(path_stat.st_mode):
+        entries, next_cursor = await asyncio.to_thread(list_directory, path, cursor, limit)
+        return {"file_path": file_path, "entries": entries, "next_cursor": next_cursor}
+    if not stat.S_ISREG(path_stat.st_mode):
+        raise HTTPException(status_code=404, detail=f"File {file_path} not found")
+
+    # FileResponse отдает файл частями или через sendfile сервера и сам обрабатывает заголовок Range
+    response = FileResponse(path, stat_result=path_stat)
+    if is_not_modified(response.headers, request.headers):
+        return Response(
+            status_code=status.HTTP_304_NOT_MODIFIED,
+            headers={name: response.headers[name] for name in ("etag", "last-modified")},
+        )
+    return response
 
 
 @router.get(
@@ -137,35 +172,170 @@ async def login(username: Annotated[str, Form()], password: Annotated[str, Form(
     return {"username": username}
 
 
-@router.post("/files/")
-async def create_files(
-    # files: Annotated[list[bytes], File()]
-    files: Annotated[list[bytes], File(description="Multiple files as bytes")],
-) -> dict[str, list[int]]:
-    return {"file_sizes": [len(file) for file in files]}
+def multipart_schema(properties: dict[str, Any], required: list[str]) -> dict[str, Any]:
+    # тело читается потоком, а не через параметры File(), поэтому схема формы описывается вручную
+    return {"requestBody": {"required": True, "content": {"multipart/form-data": {"schema": {
+        "type": "object", "properties": properties, "required": required,
+    }}}}}
+
+
+async def receive_upload(request: Request, urlencoded: bool = False) -> MultipartUpload:
+    receiver = MultipartReceiver(
+        directory=env_settings.UPLOADS.DIR,
+        max_file_size=env_settings.UPLOADS.MAX_FILE_SIZE,
+        max_request_size=env_settings.UPLOADS.MAX_REQUEST_SIZE,
+        max_field_size=env_settings.UPLOADS.MAX_FIELD_SIZE,
+    )
+    try:
+        if urlencoded:
+            return await receiver.receive_urlencoded(request)
+        return await receiver.receive(request)
+    except UploadError as error:
+        raise HTTPException(status_code=error.status_code, detail=str(error)) from None
+
+
+async def receive_form(request: Request, content_hashes: list[tuple[str, str]]) -> MultipartUpload:
+    """Receive multipart form, or urlencoded or empty one if files are referenced by hashes."""
+    content_type = request.headers.get("content-type", "")
+    if content_hashes and not content_type:
+        return MultipartUpload()
+    if content_hashes and content_type.startswith("application/x-www-form-urlencoded"):
+        return await receive_upload(request, urlencoded=True)
+    return await receive_upload(request)
+
+
+async def reference_stored_files(
+    redis: aioredis.Redis,
+    blob_store: BlobStore,
+    upload: MultipartUpload,
+    content_hashes: list[tuple[str, str]],
+) -> None:
+    """Add files referenced by X-Content-SHA256 to upload, their content must be already stored."""
+    for field_name, sha256 in content_hashes:
+        size = await blob_store.add_reference(redis, sha256)
+        if size is None:
+            raise UploadError(f"Content {sha256} of {field_name} is not stored, the file must be uploaded")
+        upload.files.append(StoredFile(
+            field_name=field_name,
+            filename="",
+            content_type="application/octet-stream",
+            path=blob_store.blob_path(sha256),
+            size=size,
+            sha256=sha256,
+            deduplicated=True,
+        ))
+
+
+async def rollback_upload(redis: aioredis.Redis, blob_store: BlobStore, upload: MultipartUpload) -> None:
+    """Remove temporary files of upload and release references it took, blobs stay on disk while referenced."""
+    # файлы в каталоге хранилища держат ссылку, остальные - еще не перенесенные временные
+    referenced = [stored_file for stored_file in upload.files if stored_file.path.is_relative_to(blob_store.directory)]
+    for stored_file in upload.files:
+        if stored_file not in referenced:
+            await asyncio.to_thread(remove_file, stored_file.path)
+    for stored_file in referenced:
+        await blob_store.release(redis, stored_file.sha256)
+
+
+async def store_received_files(redis: aioredis.Redis, blob_store: BlobStore, upload: MultipartUpload) -> None:
+    for stored_file in upload.files:
+        if not stored_file.deduplicated:
+            stored_file.deduplicated = await blob_store.store(redis, stored_file)
+
+
+def check_required(upload: MultipartUpload, required_files: tuple[str, ...], required_fields: tuple[str, ...]) -> None:
+    for field_name in required_files:
+        upload.get_file(field_name)
+    for field_name in required_fields:
+        upload.get_field(field_name)
+
+
+async def store_upload(
+    request: Request,
+    redis: aioredis.Redis,
+    blob_store: BlobStore,
+    required_files: tuple[str, ...] = (),
+    required_fields: tuple[str, ...] = (),
+) -> MultipartUpload:
+    """Receive upload into blob store.
+
+    Files already stored may be left out of the form if client sends their hashes
+    in X-Content-SHA256 header, e.g. `file=<sha256>, fileb=<sha256>`. Then the rest
+    of the form may be urlencoded, or the body may be empty.
+    """
+    try:
+        content_hashes = parse_content_hashes(request.headers.get("x-content-sha256", ""))
+    except ValueError as error:
+        raise HTTPException(status_code=400, detail=str(error)) from None
+    upload = await receive_form(request, content_hashes)
+    try:
+        await reference_stored_files(redis, blob_store, upload, content_hashes)
+        check_required(upload, required_files, required_fields)
+        await store_received_files(redis, blob_store, upload)
+    except BaseException as error:
+        # и при ошибке хранилища или Redis не остаются временные файлы и взятые ссылки
+        await rollback_upload(redis, blob_store, upload)
+        if isinstance(error, UploadError):
+            raise HTTPException(status_code=422, detail=str(error)) from None
+        raise
+    return upload
+
+
+@router.post("/files/", openapi_extra=multipart_schema(
+    {"files": {"type": "array", "items": {"type": "string", "format": "binary"}, "description": "Multiple files"}},
+    ["files"],
+))
+async def create_files(request: Request) -> dict[str, Any]:
+    upload = await receive_upload(request)
+    return {
+        "file_sizes": [stored_file.size for stored_file in upload.files],
+        "files": [stored_file.as_dict() for stored_file in upload.files],
+    }
 
 
-@router.post("/files2/")
-async def create_file(
-    file: Annotated[bytes, File()],
-    fileb: Annotated[UploadFile, File()],
-    token: Annotated[str, Form()],
-) -> dict[str, Any]:
+@router.post("/files2/", openapi_extra=multipart_schema(
+    {
+        "file": {"type": "string", "format": "binary"},
+        "fileb": {"type": "string", "format": "binary"},
+        "token": {"type": "string"},
+    },
+    ["file", "fileb", "token"],
+))
+async def create_file(request: Request, redis: RedisDep, blob_store: BlobStoreDep) -> dict[str, Any]:
+    upload = await store_upload(
+        request, redis, blob_store, required_files=("file", "fileb"), required_fields=("token",),
+    )
+    file, fileb, token = upload.get_file("file"), upload.get_file("fileb"), upload.get_field("token")
     return {
-        "file_size": len(file),
+        "file_size": file.size,
+        "file_sha256": file.sha256,
         "token": token,
         "fileb_content_type": fileb.content_type,
+        "fileb_sha256": fileb.sha256,
     }
 
 
-@router.post("/uploadfiles/")
-async def create_upload_files(
-    # files: list[UploadFile]
-    files: Annotated[
-        list[UploadFile], File(description="Multiple files as UploadFile"),
-    ],
-) -> dict[str, list[str | None]]:
-    return {"filenames": [file.filename for file in files]}
+@router.post("/uploadfiles/", openapi_extra=multipart_schema(
+    {"files": {"type": "array", "items": {"type": "string", "format": "binary"}, "description": "Multiple files"}},
+    [],
+))
+async def create_upload_files(request: Request, redis: RedisDep, blob_store: BlobStoreDep) -> dict[str, Any]:
+    upload = await store_upload(request, redis, blob_store)
+    return {
+        "filenames": [stored_file.filename or None for stored_file in upload.files],
+        "files": [stored_file.as_dict() for stored_file in upload.files],
+    }
+
+
+@router.delete("/uploadfiles/{sha256}")
+async def delete_upload_file(
+    sha256: Annotated[str, Path(pattern=SHA256_PATTERN.pattern)],
+    redis: RedisDep,
+    blob_store: BlobStoreDep,
+) -> dict[str, Any]:
+    if not await blob_store.release(redis, sha256):
+        raise HTTPException(status_code=404, detail=f"Content {sha256} is not stored")
+    return {"sha256": sha256, "status": "released"}
 
 
 @router.get("/")
@@ -0,0 +1,40 @@
+from typing import Any
+
+import startup_timing
+from cache import caches
+from database import env_settings, get_redis_pool_stats
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import PlainTextResponse
+from metrics import collect_metrics
+from request_profiling import slowest_profiles, verify_profiling_token
+
+
+router = APIRouter()
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def read_metrics() -> PlainTextResponse:
+    return PlainTextResponse(
+        await collect_metrics(env_settings.METRICS.MULTIPROC_DIR),
+        media_type="text/plain; version=0.0.4",
+    )
+
+
+@router.get("/service/redis-pools")
+async def read_redis_pools(request: Request) -> dict[str, Any]:
+    return {"async": get_redis_pool_stats(request.app.state.redis_pool)}
+
+
+@router.get("/service/caches")
+async def read_caches() -> dict[str, Any]:
+    return {name: cache.stats_by_tier() for name, cache in caches.items()}
+
+
+@router.get("/service/profiles", dependencies=[Depends(verify_profiling_token)])
+async def read_slowest_profiles() -> list[dict[str, Any]]:
+    return [record for _, _, record in sorted(slowest_profiles, reverse=True)]
+
+
+@router.get("/service/startup")
+async def read_startup_timings() -> dict[str, float]:
+    return startup_timing.stages
@@ -1,3 +1,4 @@
+import logging
 from datetime import datetime
 
 from fastapi import APIRouter
@@ -6,6 +7,8 @@ from pydantic import BaseModel, model_validator
 from typing_extensions import Self
 
 
+logger = logging.getLogger(__name__)
+
 fake_db = {}
 
 router = APIRouter()
@@ -25,11 +28,11 @@ class Sotem(BaseModel):
 
 @router.put("/sotems/{sotem_id}/{ext_value}")
 def update_sotem(ext_value: int, sotem_id: str, sotem: Sotem) -> Sotem:
-    print(f'{ext_value=} ')
+    logger.debug('ext_value=%s', ext_value)
 
     json_compatible_item_data = jsonable_encoder(sotem)
-    print(sotem)
-    print(json_compatible_item_data)
+    logger.debug('%r', sotem)
+    logger.debug('%s', json_compatible_item_data)
 
     # fake_db[sotem_id] = json_compatible_item_data
     fake_db[sotem_id] = sotem
@@ -1,19 +1,45 @@
+import logging
+from collections.abc import AsyncIterator
 from enum import Enum
-from typing import Any, Union  # Annotated,
-
-from database import PlaneTotemDB, Session
-from fastapi import APIRouter, HTTPException, status  # Query, Path, Body, Header, Cookie,
-from fastapi.encoders import jsonable_encoder
-from pydantic import BaseModel  # , Field, HttpUrl
-from sqlalchemy import desc, update
-from tools import async_time_calc
+from typing import Annotated, Any, Union
+
+from cache import TieredCache
+from database import PlaneTotemDB, env_settings, get_aioredis, get_async_session, get_async_sessionmaker
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status  # Path, Body, Header, Cookie,
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, ConfigDict, ValidationError  # , Field, HttpUrl
+from redis import asyncio as aioredis
+from sqlalchemy import Select, desc, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from streaming import (
+    CSVEncoder,
+    JsonArraySplitter,
+    NDJSONSplitter,
+    StreamFormatError,
+    batched,
+    encode_ndjson,
+    split_stream,
+)
 
 from views.sotem_views import router as sotem_router
 
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 router.include_router(sotem_router, prefix='/sotem')
 
+SessionDep = Annotated[AsyncSession, Depends(get_async_session)]
+RedisDep = Annotated[aioredis.Redis, Depends(get_aioredis)]
+
+totem_cache = TieredCache(
+    "totem",
+    ttl=env_settings.CACHE.TOTEM_TTL,
+    negative_ttl=env_settings.CACHE.TOTEM_NEGATIVE_TTL,
+    local_max_size=env_settings.CACHE.LOCAL_MAX_SIZE,
+    local_ttl=env_settings.CACHE.LOCAL_TTL,
+)
+
 
 class Totem(BaseModel):
     name: str = ""
@@ -23,6 +49,12 @@ class Totem(BaseModel):
     tags: list[str] = []
 
 
+class StoredTotem(Totem):
+    id: int  # noqa A003
+
+    model_config = ConfigDict(from_attributes=True)
+
+
 totems = {
     "foo": {"name": "Foo", "price": 50.2},
     "bar": {"name": "Bar", "description": "The bartenders", "price": 62, "tax": 20.2},
@@ -39,8 +71,7 @@ totems = {
     # description="Create a totem with all the information,"
     #             " name, description, price, tax and a set of unique tags",
 )
-@async_time_calc
-async def create_totem(totem: Totem) -> dict[str, str | Any]:
+async def create_totem(totem: Totem, session: SessionDep, redis: RedisDep) -> dict[str, str | Any]:
     """Create a totem with all the information.
 
     Params:
@@ -50,25 +81,146 @@ async def create_totem(totem: Totem) -> dict[str, str | Any]:
     - **tax**: if the item doesn't have tax, you can omit this
     - **tags**: a set of unique tag strings for this totem
     """
-    with Session(autoflush=True) as session:
-        new_plane_totem = PlaneTotemDB(
-            **totem.model_dump(exclude={'tags'}),
+    # один запрос INSERT ... RETURNING вместо чтения всей таблицы ради только что добавленной строки
+    stmt = insert(PlaneTotemDB).values(totem.model_dump(exclude={'tags'})).returning(PlaneTotemDB)
+    new_plane_totem = (await session.scalars(stmt)).one()
+    await session.commit()
+    # по имени мог быть закэширован 404 или более старый тотем
+    await totem_cache.invalidate(redis, new_plane_totem.name)
+
+    return {
+        "message": "plane_totem created",
+        "totem": StoredTotem.model_validate(new_plane_totem),
+    }
+
+
+def validate_totems(chunk: list[tuple[int, bytes]], report: dict[str, Any]) -> list[dict[str, Any]]:
+    """Return rows of valid totems of chunk, invalid ones are counted in report."""
+    rows = []
+    for line_no, raw_totem in chunk:
+        try:
+            rows.append(Totem.model_validate_json(raw_totem).model_dump(exclude={'tags'}))
+        except ValidationError as exc:
+            report["rejected_count"] += 1
+            if len(report["rejected"]) < env_settings.TOTEMS.BULK_MAX_REJECTED_REPORTED:
+                report["rejected"].append({"line": line_no, "errors": exc.errors(include_url=False)})
+    return rows
+
+
+async def ingest_totems(
+    records: AsyncIterator[tuple[int, bytes]],
+    session: AsyncSession,
+    redis: aioredis.Redis,
+    report: dict[str, Any],
+) -> None:
+    """Write records to DB by chunks, report is filled as chunks are written."""
+    async for chunk in batched(records, env_settings.TOTEMS.BULK_CHUNK_SIZE):
+        rows = validate_totems(chunk, report)
+        if rows:
+            # executemany склеивается драйвером в многострочные INSERT
+            await session.execute(insert(PlaneTotemDB), rows)
+            await session.commit()
+            await totem_cache.invalidate(redis, *{row["name"] for row in rows})
+        report["inserted"] += len(rows)
+        report["chunks"].append({
+            "chunk": len(report["chunks"]) + 1,
+            "received": len(chunk),
+            "inserted": len(rows),
+            "rejected": len(chunk) - len(rows),
+        })
+
+
+@router.post(
+    "/totems/bulk",
+    status_code=status.HTTP_201_CREATED,
+    summary="Create many totems from a streamed body",
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/x-ndjson": {"schema": {"$ref": "#/components/schemas/Totem"}},
+                "application/json": {"schema": {"type": "array", "items": {"$ref": "#/components/schemas/Totem"}}},
+            },
+        },
+    },
+)
+async def create_totems_bulk(request: Request, session: SessionDep, redis: RedisDep) -> dict[str, Any]:
+    """Create totems from NDJSON (one totem per line) or JSON array body.
+
+    The body is read as a stream and written to DB by chunks, each chunk in its own transaction,
+    so already written chunks stay in DB even if the stream is broken later.
+    Invalid totems are skipped and reported by line number (by element position for JSON array).
+    """
+    settings = env_settings.TOTEMS
+    splitter: NDJSONSplitter | JsonArraySplitter
+    if request.headers.get("content-type", "").startswith("application/json"):
+        splitter = JsonArraySplitter(settings.BULK_MAX_RECORD_BYTES)
+    else:
+        splitter = NDJSONSplitter(settings.BULK_MAX_RECORD_BYTES)
+
+    report: dict[str, Any] = {"inserted": 0, "rejected_count": 0, "chunks": [], "rejected": []}
+    try:
+        await ingest_totems(split_stream(request.stream(), splitter), session, redis, report)
+    except StreamFormatError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={"message": str(exc), "report": report},
         )
-        session.add(new_plane_totem)
-        # эксперименты с настройкой autoflush и измерением времени передачи одного или всех значений
-        # спойлер: время выполнения ручки практически одинаково в обоих случаяъ
-        # getting_new_plane_totem = session.query(PlaneTotemDB).order_by(desc(PlaneTotemDB.id)).first()
-        getting_new_plane_totem = session.query(PlaneTotemDB).all()[-1]
-        print(f'getting_new_plane_totem {getting_new_plane_totem.__dict__}')
-        session.commit()
-        # getting2_new_plane_totem = session.query(PlaneTotemDB).order_by(desc(PlaneTotemDB.id)).first()
-        getting2_new_plane_totem = session.query(PlaneTotemDB).all()[-1]
-        print(f'getting2_new_plane_totem {getting2_new_plane_totem.__dict__}')
-
-        return {
-            "message": "plane_totem created",
-            "totem": totem.model_dump(),
-        }
+    return report
+
+
+class ExportFormat(str, Enum):
+    ndjson = "ndjson"
+    csv = "csv"
+
+
+EXPORT_MEDIA_TYPES = {
+    ExportFormat.ndjson: "application/x-ndjson",
+    ExportFormat.csv: "text/csv",
+}
+EXPORT_COLUMNS = (PlaneTotemDB.id, PlaneTotemDB.name, PlaneTotemDB.description, PlaneTotemDB.price, PlaneTotemDB.tax)
+
+
+async def stream_totems(
+    session_maker: async_sessionmaker[AsyncSession],
+    stmt: Select,
+    export_format: ExportFormat,
+) -> AsyncIterator[bytes]:
+    # сессия открывается здесь, а не в зависимости: тело отдается уже после выхода из обработчика
+    async with session_maker() as session:
+        # yield_per включает серверный курсор, в памяти одновременно только одна пачка строк
+        result = await session.stream(stmt.execution_options(yield_per=env_settings.TOTEMS.EXPORT_YIELD_PER))
+        if export_format is ExportFormat.csv:
+            encoder = CSVEncoder([column.key for column in EXPORT_COLUMNS])
+            yield encoder.header()
+            async for partition in result.mappings().partitions():
+                yield encoder.encode(partition)
+        else:
+            async for partition in result.mappings().partitions():
+                yield encode_ndjson(partition)
+
+
+@router.get("/totems/export", response_class=StreamingResponse)
+async def export_totems(
+    session_maker: Annotated[async_sessionmaker[AsyncSession], Depends(get_async_sessionmaker)],
+    export_format: Annotated[ExportFormat, Query(alias="format")] = ExportFormat.ndjson,
+    name: str | None = None,
+    min_price: float | None = None,
+    max_price: float | None = None,
+) -> StreamingResponse:
+    """Stream all stored totems, or the ones matching filters, ordered by id."""
+    stmt = select(*EXPORT_COLUMNS).order_by(PlaneTotemDB.id)
+    if name is not None:
+        stmt = stmt.filter(PlaneTotemDB.name == name)
+    if min_price is not None:
+        stmt = stmt.filter(PlaneTotemDB.price >= min_price)
+    if max_price is not None:
+        stmt = stmt.filter(PlaneTotemDB.price <= max_price)
+    return StreamingResponse(
+        stream_totems(session_maker, stmt, export_format),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="totems.{export_format.value}"'},
+    )
 
 
 @router.get(
@@ -77,47 +229,56 @@ async def create_totem(totem: Totem) -> dict[str, str | Any]:
     response_model_include={"name", "price", "description", "tags"},
     response_model_exclude_unset=True,
 )
-async def get_totem(totem_name: str) -> Totem:
-    with Session() as session:
-        totem = session.query(PlaneTotemDB).filter(PlaneTotemDB.name == totem_name).\
-            order_by(desc(PlaneTotemDB.id)).first()
-        if not totem:
-            raise HTTPException(status_code=404, detail={"message": "Totem not found"})
-        return totem
+async def get_totem(totem_name: str, session: SessionDep, redis: RedisDep) -> Totem:
+    found, cached_totem = await totem_cache.get(redis, totem_name)
+    if found and cached_totem is None:
+        raise HTTPException(status_code=404, detail={"message": "Totem not found"})
+    if cached_totem is not None:
+        return Totem.model_validate_json(cached_totem)
+
+    totem_from_db = await session.scalar(
+        select(PlaneTotemDB).filter(PlaneTotemDB.name == totem_name).order_by(desc(PlaneTotemDB.id)).limit(1),
+    )
+    if not totem_from_db:
+        await totem_cache.set(redis, totem_name, None)
+        raise HTTPException(status_code=404, detail={"message": "Totem not found"})
+    # в кэш попадают только поля, которые есть в БД, чтобы response_model_exclude_unset работал как без кэша
+    totem = Totem.model_validate(totem_from_db, from_attributes=True)
+    await totem_cache.set(redis, totem_name, totem.model_dump_json(exclude_unset=True))
+    return totem
 
 
 @router.put(
     "/totems/{totem_id}",
     # response_model=Totem,
 )
-async def update_totem(totem_id: str, totem: Totem) -> dict[str, str | Any]:
-    with Session() as session:
-        # totem_from_db = session.query(PlaneTotemDB).filter(PlaneTotemDB.id == totem_id).first()
-        # if not totem_from_db:
-        #     raise HTTPException(status_code=404, detail={"message": f"Totem with id {totem_id} not found"})
-
-        # проверка наличия объекта через запрос на обновление
-        stmt = update(PlaneTotemDB).filter(PlaneTotemDB.id == totem_id).values(totem.model_dump(exclude={'tags'}))
-        result = session.execute(stmt)
-        if not result.rowcount:  # если нет ни одной обновленной строки, значит объектов не существует
-            raise HTTPException(status_code=404, detail={"message": f"Totem with id {totem_id} not found"})
-        session.commit()
-        return {
-            "message": "plane_totem updated",
-            "totem": totem,
-        }
+async def update_totem(totem_id: int, totem: Totem, session: SessionDep, redis: RedisDep) -> dict[str, str | Any]:
+    # имя до обновления нужно, чтобы сбросить и его кэш, строка блокируется до конца транзакции
+    old_name = await session.scalar(
+        select(PlaneTotemDB.name).filter(PlaneTotemDB.id == totem_id).with_for_update(),
+    )
+    if old_name is None:
+        raise HTTPException(status_code=404, detail={"message": f"Totem with id {totem_id} not found"})
+    stmt = update(PlaneTotemDB).filter(PlaneTotemDB.id == totem_id).values(totem.model_dump(exclude={'tags'}))
+    await session.execute(stmt)
+    await session.commit()
+    await totem_cache.invalidate(redis, old_name, totem.name)
+    return {
+        "message": "plane_totem updated",
+        "totem": totem,
+    }
 
 
 @router.patch("/totems4/{totem_id}", response_model=Totem)
 async def update_totem4(totem_id: str, totem: Totem) -> Totem:
     stored_totem_data = totems[totem_id]
     stored_totem_model = Totem(**stored_totem_data)  # type: ignore[arg-type]
-    print(stored_totem_model)
+    logger.debug("Stored totem %r", stored_totem_model)
     update_data = totem.dict(exclude_unset=True)
-    print(update_data)
+    logger.debug("Update data %s", update_data)
     updated_totem = stored_totem_model.model_copy(update=update_data)
-    print(updated_totem)
-    totems[totem_id] = jsonable_encoder(updated_totem)
+    logger.debug("Updated totem %r", updated_totem)
+    totems[totem_id] = updated_totem.model_dump(mode="json")
     return updated_totem
 
 
@@ -0,0 +1,45 @@
+import argparse
+import asyncio
+import logging.config
+import signal
+from pathlib import Path
+
+from database import create_aioredis_pool, env_settings
+from job_queue import JobQueue, Worker, handlers
+from redis import asyncio as aioredis
+from yaml import safe_load  # type: ignore[import-untyped]
+
+import views.background_tasks  # noqa F401  регистрирует обработчики очередей
+
+
+async def run_worker(queue_name: str, concurrency: int) -> None:
+    # каждое чтение очереди держит соединение на время блокирующего BRPOPLPUSH
+    redis = aioredis.Redis(connection_pool=create_aioredis_pool(max_connections=concurrency * 2 + 2))
+    worker = Worker(redis, JobQueue(queue_name), handlers[queue_name], concurrency)
+    task = asyncio.create_task(worker.run())
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, task.cancel)
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    finally:
+        await redis.aclose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Process jobs of Redis queue.")
+    parser.add_argument("queue", choices=sorted(handlers))
+    parser.add_argument(
+        "--concurrency", type=int, help="batches processed at once by this process, JOBS__CONCURRENCY by default",
+    )
+    args = parser.parse_args()
+    # тот же конфиг логирования, что и у uvicorn
+    logging.config.dictConfig(safe_load(Path(__file__).with_name("uvicorn_logging_config.yaml").read_text()))
+    concurrency = args.concurrency or env_settings.JOBS.CONCURRENCY.get(args.queue, 1)
+    asyncio.run(run_worker(args.queue, concurrency))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,20 @@
+import asyncio
+import os
+import tracemalloc
+from collections.abc import AsyncIterator, Callable, Iterator
+from contextlib import AbstractContextManager, contextmanager
+from dataclasses import dataclass, field
+from typing import Any
+
+import fakeredis
 import pytest
 from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
 
+from cache import local_caches
+from database import DBModel, get_aioredis, get_async_session, get_async_sessionmaker
 from main import create_app
 
 
@@ -8,3 +22,104 @@ from main import create_app
 @pytest.fixture(scope="module")
 def pytest_client() -> TestClient:
     return TestClient(create_app(False))
+
+
+@dataclass
+class QueryStats:
+    statements: list[str] = field(default_factory=list)
+    rows_fetched: int = 0
+    peak_memory: int = 0
+
+    def count(self, kind: str) -> int:
+        """Number of statements of kind, e.g. SELECT or INSERT."""
+        return sum(statement.lstrip().upper().startswith(kind) for statement in self.statements)
+
+
+class RowCountingCursor:
+    """DBAPI cursor proxy which counts rows fetched by SQLAlchemy results."""
+
+    def __init__(self, cursor: Any, stats: QueryStats) -> None:
+        self._cursor = cursor
+        self._stats = stats
+
+    def fetchone(self) -> Any:
+        row = self._cursor.fetchone()
+        self._stats.rows_fetched += row is not None
+        return row
+
+    def fetchmany(self, *args: Any, **kwargs: Any) -> list[Any]:
+        rows = self._cursor.fetchmany(*args, **kwargs)
+        self._stats.rows_fetched += len(rows)
+        return rows
+
+    def fetchall(self) -> list[Any]:
+        rows = self._cursor.fetchall()
+        self._stats.rows_fetched += len(rows)
+        return rows
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._cursor, name)
+
+
+@pytest.fixture
+def db_engine(tmp_path) -> Iterator[AsyncEngine]:
+    """Engine of SQLite file, or of database from TEST_DATABASE_URL, e.g. local Postgres with asyncpg driver."""
+    url = os.environ.get("TEST_DATABASE_URL", f"sqlite+aiosqlite:///{tmp_path}/test.sqlite3")
+    # TestClient без контекстного менеджера запускает каждый запрос в своем цикле событий,
+    # поэтому соединения не переиспользуются между запросами
+    engine = create_async_engine(url, poolclass=NullPool)
+
+    async def run_ddl(operation: Callable) -> None:
+        async with engine.begin() as connection:
+            await connection.run_sync(operation)
+
+    asyncio.run(run_ddl(DBModel.metadata.create_all))
+    yield engine
+    asyncio.run(run_ddl(DBModel.metadata.drop_all))
+
+
+@pytest.fixture
+def db_client(db_engine) -> TestClient:
+    """Client of app with DB of db_engine and fakeredis instead of Redis."""
+    session_maker = async_sessionmaker(db_engine, autoflush=False, expire_on_commit=False)
+    redis_server = fakeredis.FakeServer()
+
+    async def get_session() -> AsyncIterator[AsyncSession]:
+        async with session_maker() as session:
+            yield session
+
+    for local_cache in local_caches.values():
+        local_cache.clear()
+    app = create_app(False)
+    app.dependency_overrides[get_async_session] = get_session
+    app.dependency_overrides[get_async_sessionmaker] = lambda: session_maker
+    app.dependency_overrides[get_aioredis] = lambda: fakeredis.FakeAsyncRedis(server=redis_server)
+    return TestClient(app)
+
+
+@pytest.fixture
+def track_queries(db_engine) -> Callable[[], AbstractContextManager[QueryStats]]:
+    """Record SQL statements, fetched rows and peak of Python allocations inside `with track_queries() as stats`."""
+    @contextmanager
+    def track() -> Iterator[QueryStats]:
+        stats = QueryStats()
+
+        def before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+            stats.statements.append(statement)
+
+        def after_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+            # результат создается после этого события и читает строки через context.cursor
+            context.cursor = RowCountingCursor(cursor, stats)
+
+        event.listen(db_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+        event.listen(db_engine.sync_engine, "after_cursor_execute", after_cursor_execute)
+        tracemalloc.start()
+        try:
+            yield stats
+        finally:
+            stats.peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            event.remove(db_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+            event.remove(db_engine.sync_engine, "after_cursor_execute", after_cursor_execute)
+
+    return track
@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+from database import env_settings
+
+
+@pytest.mark.parametrize(("operation", "expected"), [
+    ("add", [5, 7.5, 9]),
+    ("sub", [-3, -3.5, -3]),
+    ("mul", [4, 11.0, 18]),
+    ("min", [1, 2.0, 3]),
+    ("max", [4, 5.5, 6]),
+])
+def test_json_batch(pytest_client, operation, expected):
+    response = pytest_client.post(f"/calc/batch/{operation}", json={"a": [1, 2.0, 3], "b": [4, 5.5, 6]})
+    assert response.status_code == 200
+    assert response.json() == {"result": expected}
+
+
+def test_json_division_by_zero_gives_null(pytest_client):
+    response = pytest_client.post("/calc/batch/div", json={"a": [1, 0, 3], "b": [2, 0, 0]})
+    assert response.json() == {"result": [0.5, None, None]}
+
+
+@pytest.mark.parametrize("body", [
+    {"a": [1, 2], "b": [1]},
+    {"a": [1, "2"], "b": [1, 2]},
+    {"a": [True], "b": [1]},
+    {"a": [[1]], "b": [[1]]},
+    {"a": 1, "b": 1},
+    [1, 2],
+])
+def test_json_batch_rejects_invalid_arrays(pytest_client, body):
+    assert pytest_client.post("/calc/batch/add", json=body).status_code == 400
+
+
+@pytest.mark.parametrize("dtype", ["float64", "float32", "int64", "int32"])
+def test_binary_batch_returns_little_endian_result(pytest_client, dtype):
+    a = np.arange(1000, dtype=np.dtype(dtype).newbyteorder("<"))
+    b = np.full(1000, 3, dtype=a.dtype)
+    response = pytest_client.post(
+        "/calc/batch/mul",
+        params={"dtype": dtype},
+        content=a.tobytes() + b.tobytes(),
+        headers={"Content-Type": "application/octet-stream"},
+    )
+    assert response.status_code == 200
+    assert response.headers["x-result-dtype"] == dtype
+    assert np.array_equal(np.frombuffer(response.content, dtype=a.dtype), a * b)
+
+    response = pytest_client.post(
+        "/calc/batch/div",
+        params={"dtype": dtype},
+        content=a.tobytes() + b.tobytes(),
+        headers={"Content-Type": "application/octet-stream"},
+    )
+    result_dtype = np.dtype(response.headers["x-result-dtype"]).newbyteorder("<")
+    assert np.allclose(np.frombuffer(response.content, dtype=result_dtype), a / b)
+
+
+def test_binary_batch_rejects_unpaired_body(pytest_client):
+    response = pytest_client.post(
+        "/calc/batch/add", content=b"\0" * 24, headers={"Content-Type": "application/octet-stream"},
+    )
+    assert response.status_code == 400
+
+
+def test_batch_limits(pytest_client, monkeypatch):
+    monkeypatch.setattr(env_settings.CALC, "BATCH_MAX_LENGTH", 2)
+    assert pytest_client.post("/calc/batch/add", json={"a": [1, 2, 3], "b": [1, 2, 3]}).status_code == 413
+    monkeypatch.setattr(env_settings.CALC, "BATCH_MAX_BODY_SIZE", 10)
+    response = pytest_client.post(
+        "/calc/batch/add", content=b"\0" * 32, headers={"Content-Type": "application/octet-stream"},
+    )
+    assert response.status_code == 413
+    response = pytest_client.post("/calc/batch/add", content=b"1", headers={"Content-Type": "text/plain"})
+    assert response.status_code == 415
@@ -0,0 +1,69 @@
+import asyncio
+import time
+from contextlib import suppress
+
+import fakeredis
+
+from cache import INVALIDATION_CHANNEL, LocalCache, drop_local_keys, listen_invalidations
+
+
+def test_local_cache_evicts_least_recently_used():
+    cache = LocalCache("test_lru", max_size=2, ttl=60)
+    cache.store("a", 1)
+    cache.store("b", 2)
+    cache.lookup("a")
+    cache.store("c", 3)
+    assert cache.lookup("b") == (False, None)
+    assert cache.lookup("a") == (True, 1)
+    assert cache.stats.evictions == 1
+
+
+def test_local_cache_expires_keys():
+    cache = LocalCache("test_ttl", max_size=2, ttl=60)
+    cache.store("a", 1, ttl=0.01)
+    time.sleep(0.02)
+    assert cache.lookup("a") == (False, None)
+    assert cache.stats.as_dict() == {"hits": 0, "misses": 1, "evictions": 1, "errors": 0}
+
+
+def test_invalidation_message_drops_keys():
+    cache = LocalCache("test_invalidation", max_size=10, ttl=60)
+    cache.store("a", 1)
+    cache.store("b", 2)
+    drop_local_keys('{"namespace": "test_invalidation", "keys": ["a"]}')
+    assert cache.lookup("a") == (False, None)
+    assert cache.lookup("b") == (True, 2)
+
+
+async def eventually(condition) -> bool:
+    for _ in range(100):
+        if await condition():
+            return True
+        await asyncio.sleep(0.01)
+    return False
+
+
+def test_listener_survives_malformed_messages():
+    cache = LocalCache("test_listener", max_size=10, ttl=60)
+    redis = fakeredis.FakeAsyncRedis()
+
+    async def subscribed():
+        return (await redis.pubsub_numsub(INVALIDATION_CHANNEL))[0][1] == 1
+
+    async def dropped():
+        return cache.lookup("a") == (False, None)
+
+    async def scenario():
+        listener = asyncio.create_task(listen_invalidations(redis))
+        assert await eventually(subscribed)
+        cache.store("a", 1)
+        for message in ("not json", '{"keys": ["a"]}', "[]", '{"namespace": "test_listener", "keys": ["a"]}'):
+            await redis.publish(INVALIDATION_CHANNEL, message)
+        # ключ сброшен последним сообщением, значит слушатель пережил испорченные
+        assert await eventually(dropped)
+        assert not listener.done()
+        listener.cancel()
+        with suppress(asyncio.CancelledError):
+            await listener
+
+    asyncio.run(scenario())
@@ -0,0 +1,34 @@
+import pytest
+
+from database import env_settings
+
+
+@pytest.fixture
+def files_root(tmp_path, monkeypatch):
+    (tmp_path / "data.txt").write_text("0123456789")
+    for name in ("a", "b", "c"):
+        (tmp_path / "dir" / name).mkdir(parents=True)
+    (tmp_path.parent / "secret.txt").write_text("secret")
+    monkeypatch.setattr(env_settings.FILES, "ROOT", tmp_path)
+    return tmp_path
+
+
+def test_file_is_served_with_range_and_etag(pytest_client, files_root):
+    response = pytest_client.get("/files/data.txt")
+    assert response.text == "0123456789"
+    assert pytest_client.get("/files/data.txt", headers={"Range": "bytes=2-4"}).text == "234"
+    not_modified = pytest_client.get("/files/data.txt", headers={"If-None-Match": response.headers["etag"]})
+    assert not_modified.status_code == 304
+
+
+def test_directory_is_listed_by_pages(pytest_client, files_root):
+    first_page = pytest_client.get("/files/dir", params={"limit": 2}).json()
+    assert [entry["name"] for entry in first_page["entries"]] == ["a", "b"]
+    second_page = pytest_client.get("/files/dir", params={"limit": 2, "cursor": first_page["next_cursor"]}).json()
+    assert [entry["name"] for entry in second_page["entries"]] == ["c"]
+    assert second_page["next_cursor"] is None
+
+
+def test_files_outside_root_are_not_served(pytest_client, files_root):
+    assert pytest_client.get("/files/../secret.txt").status_code == 404
+    assert pytest_client.get("/files/%2E%2E/secret.txt").status_code == 404
@@ -0,0 +1,26 @@
+import logging
+from types import SimpleNamespace
+
+import pytest
+
+import gunicorn_conf
+
+
+@pytest.mark.parametrize(("cpu_max", "limit"), [("max 100000", None), ("150000 100000", 2), ("50000 100000", 1)])
+def test_available_cpus_respect_cgroup_quota(tmp_path, monkeypatch, cpu_max, limit):
+    monkeypatch.setattr(gunicorn_conf, "CGROUP_CPU_MAX_PATH", tmp_path / "cpu.max")
+    unlimited = gunicorn_conf.available_cpus()
+    (tmp_path / "cpu.max").write_text(cpu_max)
+    assert gunicorn_conf.available_cpus() == min(unlimited, limit or unlimited)
+
+
+def test_on_starting_clears_metrics_of_previous_run(tmp_path, monkeypatch):
+    metrics_dir = tmp_path / "metrics"
+    metrics_dir.mkdir()
+    (metrics_dir / "123.json").write_text("{}")
+    (metrics_dir / "124.tmp").write_text("{")
+    monkeypatch.setattr(gunicorn_conf.settings.METRICS, "MULTIPROC_DIR", metrics_dir)
+
+    gunicorn_conf.on_starting(SimpleNamespace(log=logging.getLogger("gunicorn.error")))
+    assert metrics_dir.is_dir()
+    assert not list(metrics_dir.iterdir())
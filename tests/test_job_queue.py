@@ -0,0 +1,212 @@
+import asyncio
+import time
+from contextlib import suppress
+
+import fakeredis
+import pytest
+from redis.exceptions import RedisError
+
+from job_queue import JobQueue, Worker, decode_job, job_key, retry_delay, settings
+
+
+def test_retry_delay_grows_up_to_limit(monkeypatch):
+    monkeypatch.setattr(settings, "RETRY_BACKOFF", 2)
+    monkeypatch.setattr(settings, "RETRY_BACKOFF_MAX", 10)
+    assert [retry_delay(attempt) for attempt in range(1, 5)] == [2, 4, 8, 10]
+
+
+def test_job_is_decoded_from_redis_hash():
+    job = decode_job({
+        b"group": b"user@example.com",
+        b"payload": b'{"message": "hello"}',
+        b"status": b"done",
+        b"attempts": b"1",
+        b"created_at": b"1700000000.5",
+        b"updated_at": b"1700000001.5",
+    })
+    assert job == {
+        "group": "user@example.com",
+        "payload": {"message": "hello"},
+        "status": "done",
+        "attempts": 1,
+        "created_at": 1700000000.5,
+        "updated_at": 1700000001.5,
+    }
+
+
+class RecordingHandler:
+    def __init__(self, fail: bool = False) -> None:
+        self.fail = fail
+        self.batches: list[tuple[str, list[dict]]] = []
+
+    async def __call__(self, group: str, payloads: list[dict]) -> None:
+        self.batches.append((group, payloads))
+        if self.fail:
+            raise RuntimeError("SMTP is down")
+
+
+@pytest.fixture
+def redis():
+    return fakeredis.FakeAsyncRedis()
+
+
+@pytest.fixture
+def queue():
+    return JobQueue("test")
+
+
+@pytest.fixture(autouse=True)
+def no_batch_window(monkeypatch):
+    monkeypatch.setattr(settings, "BATCH_WINDOW", 0)
+
+
+async def take_and_process(redis, worker: Worker) -> str | None:
+    """Do one step of Worker.consume: take group to processing list and handle its batch."""
+    group = await redis.brpoplpush(worker.queue.pending_key, worker.processing_key, timeout=1)
+    if group is not None:
+        await worker.process(group.decode())
+    return group and group.decode()
+
+
+async def statuses(redis, job_ids: list[str]) -> list[str]:
+    return [(await redis.hget(job_key(job_id), "status")).decode() for job_id in job_ids]
+
+
+def test_jobs_of_group_are_queued_once_and_handled_in_one_batch(redis, queue):
+    handler = RecordingHandler()
+
+    async def scenario():
+        job_ids = [await queue.enqueue(redis, {"message": number}, group="a@example.com") for number in range(3)]
+        other_id = await queue.enqueue(redis, {"message": "other"}, group="b@example.com")
+        assert await redis.lrange(queue.pending_key, 0, -1) == [b"b@example.com", b"a@example.com"]
+        assert (await queue.get_job(redis, job_ids[0]))["status"] == "queued"
+
+        worker = Worker(redis, queue, handler, concurrency=1)
+        assert await take_and_process(redis, worker) == "a@example.com"
+        assert await take_and_process(redis, worker) == "b@example.com"
+        assert await take_and_process(redis, worker) is None
+
+        assert await statuses(redis, [*job_ids, other_id]) == ["done"] * 4
+        assert 0 < await redis.ttl(job_key(other_id)) <= settings.RESULT_TTL
+        assert not await redis.exists(queue.group_key("a@example.com"), worker.processing_key)
+
+    asyncio.run(scenario())
+    assert handler.batches == [
+        ("a@example.com", [{"message": 0}, {"message": 1}, {"message": 2}]),
+        ("b@example.com", [{"message": "other"}]),
+    ]
+
+
+def test_batch_is_limited_by_max_size(redis, queue, monkeypatch):
+    monkeypatch.setattr(settings, "BATCH_MAX_SIZE", 2)
+    handler = RecordingHandler()
+
+    async def scenario():
+        for number in range(3):
+            await queue.enqueue(redis, {"message": number}, group="a@example.com")
+        worker = Worker(redis, queue, handler, concurrency=1)
+        # остаток группы возвращается в очередь после обработки пачки
+        assert await take_and_process(redis, worker) == "a@example.com"
+        assert await take_and_process(redis, worker) == "a@example.com"
+
+    asyncio.run(scenario())
+    assert [len(payloads) for _, payloads in handler.batches] == [2, 1]
+
+
+def test_batch_window_delays_group_until_promoted(redis, queue, monkeypatch):
+    monkeypatch.setattr(settings, "BATCH_WINDOW", 60)
+
+    async def scenario():
+        await queue.enqueue(redis, {"message": 1}, group="a@example.com")
+        await queue.enqueue(redis, {"message": 2}, group="a@example.com")
+        assert not await redis.llen(queue.pending_key)
+        [(group, due)] = await redis.zrange(queue.delayed_key, 0, -1, withscores=True)
+        assert group == b"a@example.com" and due == pytest.approx(time.time() + 60, abs=5)
+
+        worker = Worker(redis, queue, RecordingHandler(), concurrency=1)
+        promote_keys = [queue.delayed_key, queue.pending_key]
+        assert await worker.promote_script(keys=promote_keys, args=[time.time(), 100]) == 0
+        assert await worker.promote_script(keys=promote_keys, args=[time.time() + 61, 100]) == 1
+        assert await redis.lrange(queue.pending_key, 0, -1) == [b"a@example.com"]
+
+    asyncio.run(scenario())
+
+
+def test_failed_batch_is_retried_with_backoff_and_then_failed(redis, queue, monkeypatch):
+    monkeypatch.setattr(settings, "MAX_ATTEMPTS", 2)
+    handler = RecordingHandler(fail=True)
+
+    async def scenario():
+        job_id = await queue.enqueue(redis, {"message": 1}, group="a@example.com")
+        worker = Worker(redis, queue, handler, concurrency=1)
+
+        await take_and_process(redis, worker)
+        job = await queue.get_job(redis, job_id)
+        assert (job["status"], job["attempts"], job["error"]) == ("retrying", 1, "RuntimeError('SMTP is down')")
+        [(_, retry_at)] = await redis.zrange(queue.delayed_key, 0, -1, withscores=True)
+        assert retry_at == pytest.approx(time.time() + retry_delay(1), abs=5)
+        assert not await redis.llen(queue.pending_key)
+
+        await worker.promote_script(keys=[queue.delayed_key, queue.pending_key], args=[retry_at, 100])
+        await take_and_process(redis, worker)
+        job = await queue.get_job(redis, job_id)
+        assert (job["status"], job["attempts"]) == ("failed", 2)
+        assert not await redis.exists(queue.group_key("a@example.com"), queue.delayed_key, queue.pending_key)
+
+    asyncio.run(scenario())
+    assert len(handler.batches) == 2
+
+
+def test_jobs_of_dead_worker_are_requeued(redis, queue):
+    async def scenario():
+        await queue.enqueue(redis, {"message": 1}, group="a@example.com")
+        dead = Worker(redis, queue, RecordingHandler(), concurrency=1)
+        dead.id, dead.processing_key = "dead:1", queue.processing_key("dead:1")
+        await redis.sadd(queue.workers_key, dead.id)
+        # группа взята в работу, но пульса от воркера нет
+        await redis.brpoplpush(queue.pending_key, dead.processing_key, timeout=1)
+
+        alive = Worker(redis, queue, RecordingHandler(), concurrency=1)
+        await redis.sadd(queue.workers_key, alive.id)
+        maintain = asyncio.create_task(alive.maintain())
+        await asyncio.sleep(0.1)
+        maintain.cancel()
+        with suppress(asyncio.CancelledError):
+            await maintain
+
+        assert await redis.lrange(queue.pending_key, 0, -1) == [b"a@example.com"]
+        assert not await redis.exists(dead.processing_key)
+        assert await redis.smembers(queue.workers_key) == {alive.id.encode()}
+        assert await redis.exists(queue.heartbeat_key(alive.id))
+
+    asyncio.run(scenario())
+
+
+def test_group_interrupted_by_redis_error_is_returned(redis, queue, monkeypatch):
+    handler = RecordingHandler()
+
+    async def scenario():
+        await queue.enqueue(redis, {"message": 1}, group="a@example.com")
+        worker = Worker(redis, queue, handler, concurrency=1)
+        finish = worker.finish
+
+        async def failing_finish(*args):
+            monkeypatch.setattr(worker, "finish", finish)
+            raise RedisError("connection lost")
+
+        monkeypatch.setattr(worker, "finish", failing_finish)
+        with pytest.raises(RedisError):
+            await worker.take_group()
+        assert await redis.lrange(worker.processing_key, 0, -1) == [b"a@example.com"]
+
+        await worker.return_interrupted()
+        assert not await redis.exists(worker.processing_key)
+        assert await take_and_process(redis, worker) == "a@example.com"
+        assert not await redis.exists(queue.group_key("a@example.com"))
+        # группа уже обработана, повторный возврат ничего не делает
+        worker.interrupted_groups.add("a@example.com")
+        await worker.return_interrupted()
+        assert not await redis.exists(queue.pending_key, worker.processing_key)
+
+    asyncio.run(scenario())
+    assert len(handler.batches) == 2
@@ -0,0 +1,48 @@
+import io
+import json
+import logging
+
+from log_handlers import AccessJsonFormatter, JsonFormatter, QueueStreamHandler, SamplingFilter
+
+
+def make_access_record(status: int) -> logging.LogRecord:
+    return logging.LogRecord(
+        "uvicorn.access", logging.INFO, "", 0, '%s - "%s %s HTTP/%s" %d',
+        ("127.0.0.1:5000", "GET", "/hello", "1.1", status), None,
+    )
+
+
+def test_json_formatter_adds_extra_fields():
+    record = logging.LogRecord("app", logging.WARNING, "", 0, "Key %s deleted", ("a",), None)
+    record.path = "/items"
+    data = json.loads(JsonFormatter(datefmt="%Y", tz_name="Europe/Moscow").format(record))
+    assert data["level"] == "WARNING"
+    assert data["message"] == "Key a deleted"
+    assert data["path"] == "/items"
+    assert data["time"].isdigit()
+
+
+def test_access_formatter_splits_request_line():
+    data = json.loads(AccessJsonFormatter().format(make_access_record(200)))
+    assert data["method"] == "GET"
+    assert data["path"] == "/hello"
+    assert data["status"] == 200
+
+
+def test_sampling_filter_keeps_errors():
+    sampling_filter = SamplingFilter(rate=3)
+    passed = [sampling_filter.filter(make_access_record(200)) for _ in range(6)]
+    assert passed.count(True) == 2
+    assert all(sampling_filter.filter(make_access_record(500)) for _ in range(3))
+
+
+def test_queue_handler_writes_from_listener_thread():
+    stream = io.StringIO()
+    handler = QueueStreamHandler(stream)
+    handler.setFormatter(JsonFormatter())
+    logger = logging.getLogger("test_queue_handler")
+    logger.addHandler(handler)
+    logger.warning("Hello, %s", "Vasya")
+    logger.removeHandler(handler)
+    handler.close()
+    assert json.loads(stream.getvalue())["message"] == "Hello, Vasya"
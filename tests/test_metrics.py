@@ -0,0 +1,36 @@
+from metrics import merge_snapshots, render_metrics
+
+
+def test_metrics_count_requests_by_route_template(pytest_client):
+    pytest_client.get("/hello/Vasya")
+    response = pytest_client.get("/metrics")
+    assert response.status_code == 200
+    assert 'http_requests_total{method="GET",route="/hello/{name}",status="200"}' in response.text
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/hello/{name}",status="200",le="+Inf"}' in (
+        response.text
+    )
+
+
+def test_worker_snapshots_are_summed():
+    snapshot = {
+        "requests_total": {
+            "type": "counter",
+            "documentation": "Requests.",
+            "labelnames": ["route"],
+            "samples": [[["/a"], 2]],
+        },
+        "latency_seconds": {
+            "type": "histogram",
+            "documentation": "Latency.",
+            "labelnames": [],
+            "buckets": [0.1, 1],
+            "samples": [[[], [1, 2, 0, 1.5]]],
+        },
+    }
+    text = render_metrics(merge_snapshots([snapshot, snapshot]))
+    assert 'requests_total{route="/a"} 4' in text
+    assert 'latency_seconds_bucket{le="0.1"} 2' in text
+    assert 'latency_seconds_bucket{le="1"} 6' in text
+    assert 'latency_seconds_bucket{le="+Inf"} 6' in text
+    assert "latency_seconds_count 6" in text
+    assert "latency_seconds_sum 3.0" in text
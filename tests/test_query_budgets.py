@@ -0,0 +1,70 @@
+import json
+
+from database import env_settings
+
+
+TOTEM = {"name": "Budget", "description": "Budget totem", "price": 10, "tax": 1}
+
+
+def create_totem(client, **fields):
+    response = client.post("/totems/", json=TOTEM | fields)
+    assert response.status_code == 201
+    return response.json()["totem"]
+
+
+def test_create_totem_inserts_one_row(db_client, track_queries):
+    for number in range(20):
+        create_totem(db_client, name=f"Totem {number}")
+    with track_queries() as stats:
+        create_totem(db_client)
+    # INSERT ... RETURNING, без чтения всей таблицы
+    assert stats.statements and stats.count("INSERT") == 1
+    assert stats.count("SELECT") == 0
+    assert stats.rows_fetched == 1
+
+
+def test_get_totem_issues_one_select_and_then_uses_cache(db_client, track_queries):
+    for number in range(20):
+        create_totem(db_client, name="Budget" if number % 2 else f"Totem {number}")
+    with track_queries() as stats:
+        assert db_client.get("/totems/Budget").json()["name"] == "Budget"
+    assert stats.count("SELECT") == 1
+    assert len(stats.statements) == 1
+    assert stats.rows_fetched <= 1
+
+    with track_queries() as stats:
+        db_client.get("/totems/Budget")
+        assert db_client.get("/totems/Missing").status_code == 404
+        assert db_client.get("/totems/Missing").status_code == 404
+    # тотем берется из кэша, а отсутствие тотема кэшируется после первого запроса
+    assert len(stats.statements) == 1
+
+
+def test_update_totem_reads_one_row(db_client, track_queries):
+    totem = create_totem(db_client)
+    with track_queries() as stats:
+        response = db_client.put(f"/totems/{totem['id']}", json=TOTEM | {"price": 20})
+    assert response.status_code == 200
+    assert (stats.count("SELECT"), stats.count("UPDATE"), len(stats.statements)) == (1, 1, 2)
+    assert stats.rows_fetched == 1
+
+
+def test_bulk_create_issues_insert_per_chunk(db_client, track_queries, monkeypatch):
+    monkeypatch.setattr(env_settings.TOTEMS, "BULK_CHUNK_SIZE", 50)
+    body = "\n".join(json.dumps(TOTEM | {"name": f"Totem {number}"}) for number in range(120))
+    with track_queries() as stats:
+        response = db_client.post("/totems/bulk", content=body, headers={"Content-Type": "application/x-ndjson"})
+    assert response.json()["inserted"] == 120
+    assert stats.count("INSERT") == 3
+    assert stats.rows_fetched == 0
+
+
+def test_export_reads_table_once_with_bounded_memory(db_client, track_queries):
+    body = "\n".join(json.dumps(TOTEM | {"name": f"Totem {number}"}) for number in range(2000))
+    db_client.post("/totems/bulk", content=body, headers={"Content-Type": "application/x-ndjson"})
+    with track_queries() as stats:
+        lines = db_client.get("/totems/export").text.splitlines()
+    assert len(lines) == 2000
+    assert len(stats.statements) == 1
+    assert stats.rows_fetched == 2000
+    assert stats.peak_memory < 5 * 1024 * 1024
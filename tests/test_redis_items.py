@@ -0,0 +1,32 @@
+import gc
+import weakref
+
+import fakeredis
+
+from database import get_script
+from views.item_views import POP_KEYS_SCRIPT
+
+
+def test_pop_redis_items_returns_and_deletes_found_keys(db_client):
+    db_client.post("/items/redis_items/", json=[{"name": "foo", "price": 1}, {"name": "bar", "price": 2}])
+
+    response = db_client.post("/items/redis_items/pop/", json=["Foo", "Bar", "Baz"])
+    assert response.json() == {"status": "delete", "items": {"Foo": "1.0", "Bar": "2.0"}, "missing": ["Baz"]}
+    assert db_client.post("/items/redis_items/get/", json=["Foo", "Bar"]).json()["missing"] == ["Foo", "Bar"]
+
+    db_client.post("/items/create_redis_item/", json={"name": "single", "price": 3})
+    assert db_client.delete("/items/delete_redis_item/", params={"item_key": "Single"}).json()["Single"] == "3.0"
+    assert db_client.delete("/items/delete_redis_item/", params={"item_key": "Single"}).status_code == 404
+
+
+def test_script_is_registered_once_per_client():
+    redis_client, other_client = fakeredis.FakeAsyncRedis(), fakeredis.FakeAsyncRedis()
+    script = get_script(redis_client, POP_KEYS_SCRIPT)
+    assert get_script(redis_client, POP_KEYS_SCRIPT) is script
+    assert get_script(other_client, POP_KEYS_SCRIPT) is not script
+
+    # кэш не держит клиент
+    client_ref = weakref.ref(redis_client)
+    del redis_client, script
+    gc.collect()
+    assert client_ref() is None
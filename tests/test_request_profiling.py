@@ -0,0 +1,38 @@
+import request_profiling
+
+
+def test_profile_returned_inline_with_valid_token(pytest_client, monkeypatch):
+    monkeypatch.setattr(request_profiling.settings, "TOKEN", "secret")
+    response = pytest_client.get("/hello/Vasya", headers={"X-Profile": "secret"})
+    assert response.status_code == 200
+    assert response.headers["X-Profiled-Status"] == "200"
+    assert "cumulative" in response.text
+
+
+def test_profile_not_taken_with_invalid_token(pytest_client, monkeypatch):
+    monkeypatch.setattr(request_profiling.settings, "TOKEN", "secret")
+    response = pytest_client.get("/hello/Vasya?profile=wrong")
+    assert "X-Profiled-Status" not in response.headers
+    assert pytest_client.get("/service/profiles", headers={"X-Profile-Token": "wrong"}).status_code == 403
+
+
+def test_non_ascii_token_is_rejected(pytest_client, monkeypatch):
+    monkeypatch.setattr(request_profiling.settings, "TOKEN", "secret")
+    response = pytest_client.get("/hello/Vasya?profile=%C3%A9")
+    assert response.status_code == 200
+    assert "X-Profiled-Status" not in response.headers
+    assert pytest_client.get("/service/profiles", headers={"X-Profile-Token": b"\xe9"}).status_code == 403
+
+
+def test_sampled_profiles_keep_the_slowest(pytest_client, monkeypatch):
+    monkeypatch.setattr(request_profiling.settings, "TOKEN", "secret")
+    monkeypatch.setattr(request_profiling.settings, "SAMPLE_RATE", 1)
+    monkeypatch.setattr(request_profiling.settings, "SLOWEST_KEPT", 2)
+    request_profiling.slowest_profiles.clear()
+    for _ in range(3):
+        pytest_client.get("/hello/Vasya")
+    monkeypatch.setattr(request_profiling.settings, "SAMPLE_RATE", 0)
+    profiles = pytest_client.get("/service/profiles", headers={"X-Profile-Token": "secret"}).json()
+    assert len(profiles) == 2
+    assert profiles[0]["duration"] >= profiles[1]["duration"]
+    assert profiles[0]["path"] == "/hello/Vasya"
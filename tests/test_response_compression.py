@@ -0,0 +1,91 @@
+import asyncio
+import zlib
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, Response
+from fastapi.testclient import TestClient
+
+from response_compression import CompressionMiddleware, accepts_gzip
+
+
+BIG_TEXT = "totem " * 1000
+
+
+@pytest.fixture(scope="module")
+def client():
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=500, thread_min_size=4000)
+
+    @app.get("/big")
+    def big():
+        return PlainTextResponse(BIG_TEXT, headers={"ETag": '"abc"'})
+
+    @app.get("/small")
+    def small():
+        return PlainTextResponse("small")
+
+    @app.get("/image")
+    def image():
+        return Response(b"\x89PNG" * 1000, media_type="image/png")
+
+    return TestClient(app)
+
+
+@pytest.mark.parametrize(("header", "expected"), [
+    ("gzip, deflate, br", True),
+    ("br;q=1.0, gzip;q=0.5", True),
+    ("gzip;q=0", False),
+    ("*", True),
+    ("*, gzip;q=0", False),
+    ("identity", False),
+    ("", False),
+])
+def test_accept_encoding_negotiation(header, expected):
+    assert accepts_gzip(header) is expected
+
+
+def test_large_response_is_compressed(client):
+    response = client.get("/big", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert int(response.headers["content-length"]) < len(BIG_TEXT)
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.headers["etag"] == 'W/"abc"'
+    assert response.text == BIG_TEXT
+
+    uncompressed = client.get("/big", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in uncompressed.headers
+    assert uncompressed.headers["vary"] == "Accept-Encoding"
+    assert uncompressed.text == BIG_TEXT
+
+
+def test_small_and_compressed_types_are_not_compressed(client):
+    for path in ("/small", "/image"):
+        response = client.get(path, headers={"Accept-Encoding": "gzip"})
+        assert "content-encoding" not in response.headers
+    assert "vary" not in client.get("/image", headers={"Accept-Encoding": "gzip"}).headers
+
+
+def test_streaming_response_is_compressed_by_chunks():
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"text/plain")]})
+        for number in range(10):
+            await send({"type": "http.response.body", "body": f"line {number}\n".encode() * 100, "more_body": True})
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "method": "GET", "headers": [(b"accept-encoding", b"gzip")]}
+    asyncio.run(CompressionMiddleware(app, minimum_size=500)(scope, None, send))
+
+    assert (b"content-encoding", b"gzip") in messages[0]["headers"]
+    chunks = [message["body"] for message in messages[1:]]
+    assert len(chunks) == 11
+    # каждый блок сброшен, поэтому уже полученная часть распаковывается без конца потока
+    decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+    assert decompressor.decompress(chunks[0]) == b"line 0\n" * 100
+    assert decompressor.decompress(b"".join(chunks[1:])).endswith(b"line 9\n")
+    assert decompressor.eof
@@ -0,0 +1,37 @@
+import json
+from datetime import datetime, timedelta
+from decimal import Decimal
+from uuid import UUID
+
+import pytest
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+from pydantic import BaseModel
+
+import responses
+from responses import default_response_class, dumps
+
+
+class Item(BaseModel):
+    name: str
+    created: datetime
+    tags: set[str] = set()
+
+
+def test_dumps_matches_fastapi_encoding():
+    value = {
+        "id": UUID("6ffefd8e-a018-e811-bbf9-60f67727d806"),
+        "items": [Item(name="Foo", created=datetime(2024, 1, 2, 3, 4, 5, 6), tags={"a"})],
+        "price": Decimal("1.5"),
+        "duration": timedelta(seconds=90),
+        1: "non string key",
+    }
+    assert json.loads(dumps(value)) == json.loads(json.dumps(jsonable_encoder(value)))
+
+
+def test_default_response_class_requires_orjson(monkeypatch):
+    assert default_response_class(False) is JSONResponse
+    assert default_response_class(True) is ORJSONResponse
+    monkeypatch.setattr(responses, "orjson", None)
+    with pytest.raises(RuntimeError):
+        default_response_class(True)
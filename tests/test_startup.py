@@ -0,0 +1,21 @@
+import database
+import main
+import startup_timing
+
+
+def test_main_does_not_create_engines_and_records_stages():
+    database.get_async_engine.cache_clear()
+    main.main()
+    assert database.get_async_engine.cache_info().currsize == 0
+    assert {"imports", "create_app"} <= set(startup_timing.stages)
+
+
+def test_measure_records_stage_duration():
+    with startup_timing.measure("test_stage"):
+        pass
+    assert "test_stage" in startup_timing.format_stages()
+    assert 0 <= startup_timing.stages.pop("test_stage") < 1
+
+
+def test_settings_are_read_once():
+    assert database.get_settings() is database.env_settings
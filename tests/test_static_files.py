@@ -0,0 +1,119 @@
+import gzip
+import os
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from static_files import (
+    IMMUTABLE_CACHE_CONTROL,
+    REVALIDATE_CACHE_CONTROL,
+    CachedStaticFiles,
+    cache_control,
+    precompress,
+)
+
+
+STYLE = "body { color: black; }\n" * 200
+
+
+@pytest.fixture
+def static_dir(tmp_path):
+    (tmp_path / "style.css").write_text(STYLE)
+    (tmp_path / "app.3f2a9c1b.js").write_text("console.log('hello');\n" * 100)
+    (tmp_path / "small.txt").write_text("small")
+    (tmp_path / "big.txt").write_text("big file\n" * 1000)
+    return tmp_path
+
+
+def make_client(static_dir, **kwargs):
+    options = {
+        "memory_cache_size": 1024 * 1024,
+        "max_cached_file_size": 8 * 1024,
+        "gzip_min_size": 100,
+        "revalidate_interval": 0,
+    } | kwargs
+    app = FastAPI()
+    static_files = CachedStaticFiles(directory=static_dir, **options)
+    app.mount("/static", static_files)
+    return TestClient(app), static_files
+
+
+def test_gzip_variant_and_strong_etags(static_dir):
+    client, _ = make_client(static_dir)
+    plain = client.get("/static/style.css", headers={"Accept-Encoding": "identity"})
+    assert plain.text == STYLE
+    assert "content-encoding" not in plain.headers
+    assert plain.headers["vary"] == "Accept-Encoding"
+
+    compressed = client.get("/static/style.css", headers={"Accept-Encoding": "gzip"})
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert int(compressed.headers["content-length"]) < len(STYLE)
+    assert compressed.text == STYLE
+    assert not plain.headers["etag"].startswith("W/")
+    assert compressed.headers["etag"] != plain.headers["etag"]
+
+    not_modified = client.get("/static/style.css", headers={
+        "Accept-Encoding": "gzip", "If-None-Match": compressed.headers["etag"],
+    })
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+
+    small = client.get("/static/small.txt", headers={"Accept-Encoding": "gzip"})
+    assert small.text == "small"
+    assert "content-encoding" not in small.headers
+
+
+def test_cache_control_of_fingerprinted_files(static_dir):
+    client, _ = make_client(static_dir)
+    assert client.get("/static/app.3f2a9c1b.js").headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+    assert "no-cache" in client.get("/static/style.css").headers["cache-control"]
+    assert cache_control("report-20241018.csv") == REVALIDATE_CACHE_CONTROL
+    assert cache_control("logo-3f2a9c1b.png") == IMMUTABLE_CACHE_CONTROL
+
+
+def test_memory_cache_is_bounded_and_revalidated(static_dir):
+    client, static_files = make_client(static_dir, memory_cache_size=6000)
+    client.get("/static/style.css")
+    client.get("/static/app.3f2a9c1b.js")
+    assert static_files.cached_bytes <= 6000
+    assert list(static_files.cache) == ["app.3f2a9c1b.js"]
+
+    etag = client.get("/static/app.3f2a9c1b.js").headers["etag"]
+    (static_dir / "app.3f2a9c1b.js").write_text("changed")
+    os.utime(static_dir / "app.3f2a9c1b.js", ns=(0, 0))
+    changed = client.get("/static/app.3f2a9c1b.js")
+    assert changed.text == "changed"
+    assert changed.headers["etag"] != etag
+
+    client.get("/static/big.txt")
+    assert "big.txt" not in static_files.cache
+    client.get("/static/small.txt")
+    (static_dir / "small.txt").unlink()
+    assert client.get("/static/small.txt").status_code == 404
+    assert "small.txt" not in static_files.cache
+
+
+def test_large_files_use_prebuilt_gzip(static_dir):
+    assert precompress(static_dir, min_size=100) == 3
+    assert precompress(static_dir, min_size=100) == 0
+    assert gzip.decompress((static_dir / "big.txt.gz").read_bytes()) == (static_dir / "big.txt").read_bytes()
+
+    client, _ = make_client(static_dir, max_cached_file_size=1000)
+    response = client.get("/static/big.txt", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.text == "big file\n" * 1000
+    not_modified = client.get("/static/big.txt", headers={
+        "Accept-Encoding": "gzip", "If-None-Match": response.headers["etag"],
+    })
+    assert not_modified.status_code == 304
+
+
+def test_gzip_refused_with_zero_quality(static_dir):
+    precompress(static_dir, min_size=100)
+    client, static_files = make_client(static_dir)
+    for path in ("/static/style.css", "/static/big.txt"):
+        response = client.get(path, headers={"Accept-Encoding": "gzip;q=0, identity"})
+        assert "content-encoding" not in response.headers
+        assert response.headers["vary"] == "Accept-Encoding"
+    assert list(static_files.cache) == ["style.css"]
@@ -0,0 +1,43 @@
+import json
+
+import pytest
+
+from streaming import JsonArraySplitter, NDJSONSplitter, StreamFormatError
+
+
+def split(splitter, raw, chunk_size):
+    records = []
+    for start in range(0, len(raw), chunk_size):
+        records += splitter.feed(raw[start:start + chunk_size])
+    return records + splitter.close()
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 1000])
+def test_json_array_splitter(chunk_size):
+    items = [{"name": "a\\\"]},[", "tags": ["x", {"y": "\\\\"}]}, "s,]", 3.5, None, [[]], {}]
+    records = split(JsonArraySplitter(1000), json.dumps(items).encode(), chunk_size)
+    assert [number for number, _ in records] == list(range(1, len(items) + 1))
+    assert [json.loads(raw) for _, raw in records] == items
+
+
+@pytest.mark.parametrize("raw", [b"", b"{}", b"[1,]", b"[,1]", b"[1] 2", b"[1", b"[1}]", b"[1][2]"])
+def test_json_array_splitter_rejects_malformed_body(raw):
+    with pytest.raises(StreamFormatError):
+        split(JsonArraySplitter(1000), raw, 2)
+
+
+def test_ndjson_splitter_keeps_line_numbers():
+    records = split(NDJSONSplitter(1000), b'{"a": 1}\n\n {"b": 2}\n{"c": 3}', 3)
+    assert records == [(1, b'{"a": 1}'), (3, b'{"b": 2}'), (4, b'{"c": 3}')]
+
+
+def test_ndjson_splitter_limits_line_length():
+    with pytest.raises(StreamFormatError):
+        NDJSONSplitter(10).feed(b"1" * 11)
+    # строка целиком в одном куске, в том числе вместе с началом из прошлого куска
+    with pytest.raises(StreamFormatError, match="Line 2 "):
+        NDJSONSplitter(10).feed(b"1\n" + b"1" * 11 + b"\n2")
+    splitter = NDJSONSplitter(10)
+    assert splitter.feed(b"1" * 6) == []
+    with pytest.raises(StreamFormatError, match="Line 1 "):
+        splitter.feed(b"1" * 6 + b"\n")
@@ -0,0 +1,23 @@
+import logging
+
+from time_formatter import LocalTimeFormatter
+
+
+def make_record(created: float) -> logging.LogRecord:
+    record = logging.LogRecord("app", logging.INFO, "", 0, "message", None, None)
+    record.created = created
+    record.msecs = (created - int(created)) * 1000
+    return record
+
+
+def test_time_follows_daylight_saving_change():
+    formatter = LocalTimeFormatter(datefmt="%H:%M:%S %Z", tz_name="America/New_York")
+    # 10 марта 2024 года в 2:00 по Нью-Йорку часы переведены на час вперед
+    assert formatter.formatTime(make_record(1710053999.5), formatter.datefmt) == "01:59:59 EST"
+    assert formatter.formatTime(make_record(1710054000.5), formatter.datefmt) == "03:00:00 EDT"
+
+
+def test_milliseconds_differ_within_cached_second():
+    formatter = LocalTimeFormatter(datefmt="%H:%M:%S.{msecs} %Z", tz_name="Europe/Moscow")
+    assert formatter.formatTime(make_record(1700000000.25), formatter.datefmt) == "01:13:20.250 MSK"
+    assert formatter.formatTime(make_record(1700000000.5), formatter.datefmt) == "01:13:20.500 MSK"
@@ -0,0 +1,156 @@
+import asyncio
+import hashlib
+
+import pytest
+
+from blob_store import BlobStore, parse_content_hashes
+from database import env_settings
+from uploads import StoredFile
+
+
+@pytest.fixture
+def uploads_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(env_settings.UPLOADS, "DIR", tmp_path / "uploads")
+    return tmp_path / "uploads"
+
+
+def test_files_are_written_to_disk_with_digests(pytest_client, uploads_dir):
+    content = b"x" * 200_000
+    response = pytest_client.post("/files/", files=[("files", ("a.bin", content)), ("files", ("b.txt", b"hello"))])
+    assert response.status_code == 200
+    body = response.json()
+    assert body["file_sizes"] == [200_000, 5]
+    assert body["files"][0]["sha256"] == hashlib.sha256(content).hexdigest()
+    assert (uploads_dir / body["files"][0]["path"]).read_bytes() == content
+
+
+def test_too_large_file_is_rejected_and_removed(pytest_client, uploads_dir, monkeypatch):
+    monkeypatch.setattr(env_settings.UPLOADS, "MAX_FILE_SIZE", 1000)
+    response = pytest_client.post("/files/", files=[("files", ("a.bin", b"x" * 1001))])
+    assert response.status_code == 413
+    assert list(uploads_dir.iterdir()) == []
+
+
+def test_truncated_body_is_rejected_and_removed(pytest_client, uploads_dir):
+    body = b'--b\r\nContent-Disposition: form-data; name="files"; filename="a.bin"\r\n\r\n' + b"x" * 1000
+    response = pytest_client.post("/files/", content=body, headers={"Content-Type": "multipart/form-data; boundary=b"})
+    assert response.status_code == 400
+    assert list(uploads_dir.iterdir()) == []
+
+
+def test_large_urlencoded_form_is_rejected(db_client, uploads_dir, monkeypatch):
+    monkeypatch.setattr(env_settings.UPLOADS, "MAX_FIELD_SIZE", 100)
+    sha256 = db_client.post("/uploadfiles/", files=[("files", ("a.txt", b"a"))]).json()["files"][0]["sha256"]
+    headers = {"X-Content-SHA256": f"file={sha256}, fileb={sha256}"}
+    assert db_client.post("/files2/", data={"token": "x" * 100}, headers=headers).status_code == 200
+    # каждое поле в пределах лимита, но вся форма больше нескольких полей
+    fields = {"token": "x"} | {f"field{index}": "x" * 100 for index in range(20)}
+    assert db_client.post("/files2/", data=fields, headers=headers).status_code == 413
+
+
+def test_form_fields_are_required(db_client, uploads_dir):
+    files = [("file", ("a.txt", b"a")), ("fileb", ("b.txt", b"b", "text/plain"))]
+    assert db_client.post("/files2/", files=files).status_code == 422
+    assert list(uploads_dir.iterdir()) == []
+    response = db_client.post("/files2/", files=files, data={"token": "secret"})
+    assert response.json()["token"] == "secret"
+    assert response.json()["fileb_content_type"] == "text/plain"
+
+
+def blob_files(uploads_dir):
+    return [path for path in (uploads_dir / "blobs").rglob("*") if path.is_file()]
+
+
+def test_repeated_upload_is_stored_once(db_client, uploads_dir):
+    first = db_client.post("/uploadfiles/", files=[("files", ("a.bin", b"same"))]).json()["files"][0]
+    second = db_client.post("/uploadfiles/", files=[("files", ("b.bin", b"same"))]).json()["files"][0]
+    assert (first["deduplicated"], second["deduplicated"]) == (False, True)
+    assert first["sha256"] == second["sha256"] == hashlib.sha256(b"same").hexdigest()
+    assert [path.read_bytes() for path in blob_files(uploads_dir)] == [b"same"]
+    # временные файлы загрузок перенесены в хранилище или удалены
+    assert [path.name for path in uploads_dir.iterdir()] == ["blobs"]
+
+
+def test_stored_content_is_referenced_by_hash(db_client, uploads_dir):
+    file_sha256 = db_client.post("/uploadfiles/", files=[("files", ("a.txt", b"a"))]).json()["files"][0]["sha256"]
+    fileb_sha256 = db_client.post("/uploadfiles/", files=[("files", ("b.txt", b"b"))]).json()["files"][0]["sha256"]
+    headers = {"X-Content-SHA256": f"file={file_sha256}, fileb={fileb_sha256}"}
+
+    # без файлов в теле форма может быть обычной urlencoded
+    response = db_client.post("/files2/", data={"token": "secret"}, headers=headers)
+    assert response.status_code == 200
+    assert response.json() == {
+        "file_size": 1,
+        "file_sha256": file_sha256,
+        "token": "secret",
+        "fileb_content_type": "application/octet-stream",
+        "fileb_sha256": fileb_sha256,
+    }
+    response = db_client.post("/files2/", files=[("file", ("a.txt", b"a"))], data={"token": "secret"}, headers={
+        "X-Content-SHA256": f"fileb={fileb_sha256}",
+    })
+    assert response.json()["file_sha256"] == file_sha256
+    response = db_client.post("/uploadfiles/", headers={"X-Content-SHA256": f"files={file_sha256}"})
+    assert response.json()["files"][0]["size"] == 1
+    assert len(blob_files(uploads_dir)) == 2
+
+
+def test_failed_upload_releases_references(db_client, uploads_dir):
+    sha256 = db_client.post("/uploadfiles/", files=[("files", ("a.txt", b"a"))]).json()["files"][0]["sha256"]
+    missing = hashlib.sha256(b"missing").hexdigest()
+
+    # нет поля token, затем неизвестный хэш: ссылки откатываются, а сохраненный файл остается
+    assert db_client.post("/files2/", headers={"X-Content-SHA256": f"file={sha256}, fileb={sha256}"}).status_code == 422
+    response = db_client.post("/uploadfiles/", headers={"X-Content-SHA256": f"a={sha256}, b={missing}"})
+    assert response.status_code == 422
+    assert len(blob_files(uploads_dir)) == 1
+    # осталась только ссылка от первой загрузки
+    assert db_client.delete(f"/uploadfiles/{sha256}").status_code == 200
+    assert blob_files(uploads_dir) == []
+
+
+def test_store_error_rolls_back_upload(db_client, uploads_dir, monkeypatch):
+    store = BlobStore.store
+
+    async def failing_store(self, redis, stored_file):
+        if stored_file.filename == "b.txt":
+            raise OSError("disk is full")
+        return await store(self, redis, stored_file)
+
+    monkeypatch.setattr(BlobStore, "store", failing_store)
+    files = [("files", ("a.txt", b"a")), ("files", ("b.txt", b"b")), ("files", ("c.txt", b"c"))]
+    with pytest.raises(OSError):
+        db_client.post("/uploadfiles/", files=files)
+    # первый файл уже перенесен в хранилище, его ссылка снята вместе с блобом, остальные временные файлы удалены
+    assert blob_files(uploads_dir) == []
+    assert [path.name for path in uploads_dir.iterdir()] == ["blobs"]
+
+
+def test_blob_is_removed_with_last_reference(db_client, uploads_dir):
+    for _ in range(2):
+        sha256 = db_client.post("/uploadfiles/", files=[("files", ("a.txt", b"a"))]).json()["files"][0]["sha256"]
+
+    assert db_client.delete(f"/uploadfiles/{sha256}").json() == {"sha256": sha256, "status": "released"}
+    assert len(blob_files(uploads_dir)) == 1
+    assert db_client.delete(f"/uploadfiles/{sha256}").status_code == 200
+    assert blob_files(uploads_dir) == []
+    assert db_client.delete(f"/uploadfiles/{sha256}").status_code == 404
+
+
+def test_invalid_digest_is_not_stored(tmp_path):
+    temp_file = tmp_path / "upload"
+    temp_file.write_bytes(b"partial")
+    stored_file = StoredFile(field_name="files", filename="a.txt", content_type="text/plain", path=temp_file)
+    # пустой хэш указывал бы на сам каталог хранилища, проверка идет до обращения к Redis
+    with pytest.raises(ValueError):
+        asyncio.run(BlobStore(tmp_path / "blobs").store(None, stored_file))
+    assert temp_file.read_bytes() == b"partial"
+    with pytest.raises(AssertionError):
+        BlobStore(tmp_path / "blobs").blob_path("")
+
+
+def test_content_hashes_header_is_parsed():
+    sha256 = hashlib.sha256(b"a").hexdigest()
+    assert parse_content_hashes(f"file={sha256.upper()}, fileb={sha256}") == [("file", sha256), ("fileb", sha256)]
+    with pytest.raises(ValueError):
+        parse_content_hashes("file=abc")